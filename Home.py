@@ -4,18 +4,44 @@ AI Contract Clause Builder - Assignment 2
 
 import streamlit as st
 import os
+import uuid
 from pathlib import Path
-from io import BytesIO
 from datetime import datetime
-from docx import Document
-from openai import OpenAI
-import traceback
+from functools import partial
+from contextlib import nullcontext
 from dotenv import load_dotenv
 
-# Load backend .env (API Key + Backend Password); override=True so file wins over system env
-_backend_env = Path(__file__).resolve().parent / "backend" / ".env"
-if _backend_env.exists():
-    load_dotenv(_backend_env, override=True)
+import threading
+
+from backend.jobs import JobQueue, AdmissionError, QUEUED, RUNNING, FAILED, CANCELLED
+from backend.llm import describe_api_error, get_offline_backend, get_provider_pool
+from backend.output_budget import output_budgets
+from backend.singleflight import single_flight
+from backend.budget import default_deadline_seconds
+from backend.documents import read_uploaded_files
+from backend.doc_store import DocumentStore, DocumentQuotaExceeded, SessionHandle
+from backend.library import ClauseLibrary, document_hashes, library_enabled
+from backend.pipeline import run_clause_pipeline, estimate_ai_calls, preload_dependencies
+from backend.contract import run_contract_pipeline, estimate_contract_calls, MAX_CONTRACT_CLAUSES
+from backend.tracing import Tracer, span
+
+
+@st.cache_resource
+def load_backend_env():
+    """
+    Load backend .env (API Key + Backend Password) once per server process
+    
+    override=True so file wins over system env. Cached because Streamlit
+    re-executes this script on every widget change; os.environ keeps the
+    values for later reruns. Restart the server after editing the file.
+    """
+    backend_env = Path(__file__).resolve().parent / "backend" / ".env"
+    if backend_env.exists():
+        load_dotenv(backend_env, override=True)
+    return True
+
+
+load_backend_env()
 
 # ============================================================================
 #
@@ -26,15 +52,24 @@ def get_api_key_from_sidebar():
     Get API key from sidebar
     
     Features:
-    1. If user passed backend password: use OPENAI_API_KEY from backend .env
-    2. Else: environment variable (for production)
-    3. Fallback: user input (for local testing)
+    1. Replay / synthetic LLM backend (LLM_BACKEND): no key needed
+    2. If user passed backend password: use OPENAI_API_KEY from backend .env
+    3. Else: environment variable (for production)
+    4. Fallback: user input (for local testing)
     
     Returns:
         str: OpenAI API key, None if not provided
     """
     st.sidebar.header("API Configuration")
     
+    # Offline backend: responses come from a cassette or are generated locally
+    offline = get_offline_backend()
+    if offline is not None and not offline.needs_network:
+        st.sidebar.info(f"Offline LLM backend: {offline.mode} (no API calls are made)")
+        return os.getenv("OPENAI_API_KEY") or "offline"
+    if offline is not None:
+        st.sidebar.caption(f"Recording AI responses to {offline.cassette.path}")
+    
     # Backend password unlocked: use server API key from backend/.env
     if st.session_state.get("backend_verified") and os.getenv("OPENAI_API_KEY"):
         st.sidebar.success("Using server API key (unlocked with backend password)")
@@ -62,362 +97,463 @@ def get_api_key_from_sidebar():
     return key
 
 
-def call_openai_chat(messages, api_key, model="gpt-4o-mini", temperature=0.2, max_tokens=1000):
+# How often the job view (a fragment) reruns to pick up new events while a job is in progress.
+# 0 disables in-page polling (the load-test harness drives reruns itself).
+JOB_POLL_SECONDS = float(os.getenv("JOB_POLL_SECONDS", "1.0"))
+
+
+@st.cache_resource
+def get_job_queue():
     """
-    OpenAI Chat API
-    
+    Process-wide job queue shared by all sessions
     
-    1. 
-    2. 
-    3. 
-    4. AI Call times
+    Returns:
+        JobQueue: Worker pool sized from JOB_WORKERS / JOB_QUEUE_LIMIT / JOB_SESSION_LIMIT
+    """
+    # Warm the openai / python-docx imports off the script thread
+    threading.Thread(target=preload_dependencies, name="preload-dependencies", daemon=True).start()
+    return JobQueue.from_env()
+
+
+@st.cache_resource
+def get_clause_library():
+    """
+    Process-wide clause library (SQLite at CLAUSE_LIBRARY_PATH), or None when CLAUSE_LIBRARY=0
+    """
+    return ClauseLibrary() if library_enabled() else None
+
+
+@st.cache_resource
+def get_document_store():
+    """
+    Process-wide document store sized from DOC_STORE_SESSION_MB / DOC_STORE_MEMORY_MB
+    """
+    return DocumentStore.from_env()
+
+
+def get_session_id():
+    """
+    Stable id for this browser session (used for per-session admission control)
+    """
+    if "session_id" not in st.session_state:
+        st.session_state.session_id = uuid.uuid4().hex
+    return st.session_state.session_id
+
+
+def store_uploaded_documents(uploaded_files):
+    """
+    Put this session's uploads into the shared document store
     
     Args:
-        messages: 
-        api_key: API
-        model: 
-        temperature: 0-2
-        max_tokens: token
+        uploaded_files: Streamlit UploadedFile list
         
     Returns:
-        str: AI
+        list: Document references for the run parameters
     """
+    store = get_document_store()
+    session_id = get_session_id()
+    if "document_store_handle" not in st.session_state:
+        # Releases the session's documents when the session ends
+        st.session_state.document_store_handle = SessionHandle(store, session_id)
     try:
-        # AI Call times
-        if 'ai_call_count' not in st.session_state:
-            st.session_state.ai_call_count = 0
-        st.session_state.ai_call_count += 1
-        
-        # OpenAI API Configuration
-        client = OpenAI(
-            api_key=api_key,
-            base_url="https://api.openai.com/v1"
-        )
-        resp = client.chat.completions.create(
-            model=model,
-            messages=messages,
-            temperature=temperature,
-            max_tokens=max_tokens,
-            timeout=60  # 60
-        )
-        
-        return resp.choices[0].message.content.strip()
-        
-    except Exception as e:
-        error_type = type(e).__name__
-        
-        # 
-        if "AuthenticationError" in error_type:
-            st.error("**API Authentication Failed**\n\nPlease check your OpenAI API key.")
-        elif "RateLimitError" in error_type:
-            st.error(" **API**\n\n\n- \n- API\n- ")
-        elif "timeout" in str(e).lower():
-            st.error(" ****\n\nAPI")
-        else:
-            st.error(f" **API**\n\n: {error_type}\n: {str(e)}")
-        
-        # 
-        with st.expander(" View Detailed Error InformationFor debugging"):
-            st.code(traceback.format_exc())
-        
-        st.stop()  # 
+        return store.put_session_documents(session_id, read_uploaded_files(uploaded_files))
+    except DocumentQuotaExceeded as e:
+        st.error(f" {e}")
+        st.stop()
 
 
-def extract_text_from_uploaded_files(uploaded_files):
+def render_job_event(event):
     """
+    Render one pipeline event published by a job
     
+    Args:
+        event: Event dict from backend.pipeline
+    """
+    kind = event["type"]
     
+    if kind == "heading":
+        st.markdown(event["text"])
     
-    1. 
-    2. 
-    3. 
+    elif kind == "library_start":
+        st.markdown("## Starting from Library Clause")
+        st.info(f"Reusing clause #{event['id']} from the clause library - Steps 1-4 skipped")
+        st.code(event["clause"], language="text")
     
-    Args:
-        uploaded_files: Streamlit
-        
-    Returns:
-        list: 
-    """
-    texts = []
-    failed_files = []
-    
-    for uploaded in uploaded_files:
-        try:
-            if uploaded.name.lower().endswith(".docx"):
-                # Word
-                doc = Document(uploaded)
-                text = "\n".join([p.text for p in doc.paragraphs])
-            elif uploaded.name.lower().endswith((".txt", ".md")):
-                # 
-                content = uploaded.getvalue()
-                try:
-                    text = content.decode("utf-8")
-                except:
-                    text = content.decode("latin-1")
-            else:
-                # 
-                content = uploaded.getvalue()
-                try:
-                    text = content.decode("utf-8")
-                except:
-                    text = content.decode("latin-1")
-            
-            # 
-            if text.strip():
-                texts.append({"filename": uploaded.name, "text": text})
-            else:
-                failed_files.append(f"{uploaded.name} ()")
-                
-        except Exception as e:
-            failed_files.append(f"{uploaded.name} (: {str(e)})")
+    elif kind == "call":
+        st.info(f" AI Call #{event['number']}: {event['label']}")
+        st.session_state.ai_call_count = event["number"]
     
-    # 
-    if failed_files:
-        st.warning(f" \n" + "\n".join([f"- {f}" for f in failed_files]))
+    elif kind == "objective":
+        st.success(" Objective Analysis")
+        st.markdown(event["interpretation"])
     
-    return texts
-
-
-def ai_enhanced_retrieve(texts, query, api_key, top_k=3):
-    """
-    AIRAG
+    elif kind == "upload_warnings":
+        st.warning(f" \n" + "\n".join([f"- {f}" for f in event["failed_files"]]))
     
+    elif kind == "dedup":
+        st.info(
+            f"Removed {event['removed']} duplicate passage(s) out of {event['passages']} "
+            f"(~{event['tokens_removed']} tokens) before building prompts"
+        )
+        with st.expander("View Duplicate Passages"):
+            for dup in event["duplicates"]:
+                st.markdown(f"**Found in:** {', '.join(dup['files'])}")
+                st.code(dup["passage"], language="text")
+    
+    elif kind == "docs_summary":
+        with st.expander(" View Uploaded Document Preview"):
+            st.code(event["preview"], language="text", wrap_lines=True, height=200)
+        st.success(" Document summary completed")
+        st.markdown(event["summary"])
+    
+    elif kind == "retrieved":
+        if event["documents"]:
+            st.success(f" Found {len(event['documents'])} relevant document segment(s)")
+            with st.expander(" View Retrieved Relevant Segments"):
+                for r in event["documents"]:
+                    st.markdown(f"** {r['filename']}**")
+                    st.code(r['text'], language="text")
+        else:
+            st.info("ℹ Found")
+    
+    elif kind == "knowledge_pack":
+        st.success(f" Reference material from knowledge packs: {', '.join(event['packs'])} (research call skipped)")
+        for passage in event["passages"]:
+            with st.expander(f" {passage['pack']} - {passage['heading']}"):
+                st.text(passage["text"])
+    
+    elif kind == "legal_research":
+        st.success(" Legal research completed")
+        st.markdown(event["research"])
+    
+    elif kind == "budget":
+        st.warning(f"⏱ Running low on time: skipped {event['skipped']} to finish within the time limit")
+    
+    elif kind == "truncated":
+        if event["complete"]:
+            st.caption(
+                f"The {event['step'] or 'AI'} response reached its {event['max_tokens']}-token limit; "
+                f"the rest was fetched with {event['continuations']} continuation request(s)"
+            )
+        else:
+            st.warning(
+                f"The {event['step'] or 'AI'} response was still cut off after {event['continuations']} "
+                "continuation request(s) and may be incomplete"
+            )
     
-    1. AI
-    2. 
-    3. Lab 2RAG
+    elif kind == "constraints":
+        st.success(" Analysis completed")
+        st.markdown(event["constraints"])
     
-    Args:
-        texts: 
-        query: 
-        api_key: API
-        top_k: top k
-        
-    Returns:
-        list: 
-    """
-    if not texts:
-        return []
+    elif kind == "initial_clause":
+        st.success(" Initial clause drafting completed")
+        st.markdown("### Initial Clause Version")
+        st.code(event["clause"], language="text")
+        if event["notes"]:
+            with st.expander("View Drafting Notes"):
+                st.markdown(event["notes"])
+    
+    elif kind == "review":
+        st.success(f"Review {event['round']} completed")
+        if event["structured"]:
+            col1, col2 = st.columns([1, 1])
+            
+            with col1:
+                st.markdown("**Revised Clause**")
+                st.code(event["clause"], language="text")
+            
+            with col2:
+                st.markdown("**Revision Notes**")
+                if event["notes"]:
+                    st.markdown(event["notes"])
+                else:
+                    st.info("No specific changes documented")
+        else:
+            st.markdown("**Revised Clause**")
+            st.code(event["clause"], language="text")
+        
+        if event.get("mode") == "edits" and event.get("edits") is not None:
+            st.caption(f"Edits-only review: {event['edits']} subclause edit(s) applied")
+        if event.get("mode") == "panel":
+            merged = "one merge call (conflicting edits)" if event["merged_by_model"] else "merged locally"
+            st.caption(f"Specialist panel: {len(event['findings'])} reviewers in parallel, {merged}")
+            with st.expander("Findings per reviewer"):
+                for finding in event["findings"]:
+                    st.markdown(f"**{finding['reviewer']}** ({finding['edits']} edit(s))")
+                    st.markdown(finding["notes"] or "- No issues found")
+        if event.get("diff"):
+            with st.expander(f"Changes in review {event['round']}"):
+                st.code(event["diff"], language="diff")
+        elif "diff" in event:
+            st.caption("No changes in this round")
+    
+    elif kind == "final":
+        st.success(" review completed")
+        st.markdown("###  Final Clause")
+        st.code(event["clause"], language="text")
+        st.download_button(
+            label=" DownloadWord",
+            data=event["docx"],
+            file_name=f"AI_{datetime.now().strftime('%Y%m%d_%H%M%S')}.docx",
+            mime="application/vnd.openxmlformats-officedocument.wordprocessingml.document",
+            type="primary"
+        )
     
-    # token
-    doc_snippets = []
-    for i, item in enumerate(texts):
-        snippet = item['text'][:800]  # 800
-        doc_snippets.append(f"[{i}] : {item['filename']}\n: {snippet}")
+    elif kind == "contract_start":
+        st.markdown(f"## Contract Mode: {len(event['titles'])} Clauses")
+        st.info("Documents, summary and research are prepared once; clauses are drafted and reviewed in parallel")
     
-    combined_docs = "\n\n".join(doc_snippets)
+    elif kind == "clause_failed":
+        st.error(describe_api_error(event["error_type"], event["message"]))
     
-    # AI
-    retrieval_prompt = f"""
-
-{query}
-
-
-{combined_docs}
-
- {top_k} 
-
-1. 
-2. 
-
-"No relevant documents"
-
-
-X: 
-"""
+    elif kind == "contract_checks":
+        if event["issues"]:
+            st.warning(f"Cross-reference and defined-term check: {len(event['issues'])} issue(s) to review")
+            for issue in event["issues"]:
+                where = f"Clause {issue['clause']}: " if issue["clause"] else ""
+                st.markdown(f"- {where}{issue['message']}")
+        else:
+            st.success("Cross-references and defined terms are consistent")
     
-    try:
-        retrieval_result = call_openai_chat(
-            [
-                {"role": "system", "content": ""},
-                {"role": "user", "content": retrieval_prompt}
-            ],
-            api_key,
-            temperature=0.1
-        )
+    elif kind == "evaluation":
+        st.success(" Quality Assessment")
+        st.markdown(event["evaluation"])
+    
+    elif kind == "complete":
+        st.markdown("---")
+        st.markdown("###  Generation Statistics")
         
-        # 
-        relevant_indices = []
-        for i in range(len(texts)):
-            if f"{i}" in retrieval_result or f"[{i}]" in retrieval_result:
-                relevant_indices.append(i)
+        col1, col2, col3, col4 = st.columns(4)
         
-        # 
-        return [texts[i] for i in relevant_indices[:top_k]]
+        with col1:
+            st.metric("AI Call times", event["ai_calls"])
+        
+        with col2:
+            st.metric("Step", 7)
+        
+        with col3:
+            st.metric(" times", event["num_refinements"])
         
-    except:
-        # AI
-        return simple_retrieve(texts, query, top_k)
+        with col4:
+            st.metric("Uploaded Documents", event["documents"])
+        
+        if event.get("tokens_saved"):
+            st.caption(f"Duplicate passage removal saved ~{event['tokens_saved']} prompt tokens in this run")
+        if event.get("clauses"):
+            st.caption(f"{event['clauses']} clauses drafted in {event['elapsed']:.0f} s")
+    
+    elif kind == "trace":
+        summary = event["summary"]
+        with st.expander("Run Trace"):
+            st.caption(
+                f"Trace saved to {event['path']} (open it in chrome://tracing or ui.perfetto.dev); "
+                "the page's rendering of this run is added once it has been shown"
+            )
+            labels = {"llm": "AI calls (network)", "python": "Python helpers", "render": "Page rendering"}
+            shown = [(label, summary["categories"][c]) for c, label in labels.items() if c in summary["categories"]]
+            columns = st.columns(len(shown) + 1)
+            columns[0].metric("Run", f"{summary['wall_ms'] / 1000:.1f} s")
+            for column, (label, ms) in zip(columns[1:], shown):
+                column.metric(label, f"{ms / 1000:.1f} s")
+            st.dataframe(summary["top"], hide_index=True)
+            if event["profile_top"]:
+                st.markdown(f"**cProfile** (most own time; full stats in {event['profile_path']})")
+                st.dataframe(event["profile_top"], hide_index=True)
+
+
+def submit_run(params, api_key, job_queue):
+    """
+    Enqueue a clause run for this session and remember its job id
+    
+    Args:
+        params: Pipeline parameters (see backend.pipeline.run_clause_pipeline, or
+            backend.contract.run_contract_pipeline when they hold "objectives")
+        api_key: OpenAI API key
+        job_queue: JobQueue to submit to
+    """
+    # Shorter runs first so quick clauses are not stuck behind long ones
+    if "objectives" in params:
+        pipeline = run_contract_pipeline
+        priority = estimate_contract_calls(
+            len(params["objectives"]), params["num_refinements"], bool(params["documents"]),
+            review_mode=params.get("review_mode", "auto")
+        )
+    else:
+        pipeline = run_clause_pipeline
+        priority = estimate_ai_calls(
+            params["num_refinements"], bool(params["documents"]), from_library=bool(params.get("start_from")),
+            review_mode=params.get("review_mode", "auto")
+        )
+    target = partial(
+        pipeline, params, api_key,
+        library=get_clause_library(), document_store=get_document_store()
+    )
+    tracer = None
+    if params.get("trace"):
+        tracer = Tracer("contract" if "objectives" in params else "clause", profile=params.get("profile", False))
+        target = tracer.bind(target)
+    # The run keeps its documents even if the session uploads a new set meanwhile
+    store = get_document_store()
+    holder_id = f"run:{uuid.uuid4().hex}"
+    store.hold_documents(holder_id, params["documents"])
+    st.session_state.pop("job_payloads", None)
+    try:
+        st.session_state.job_id = job_queue.submit(
+            target, session_id=get_session_id(), priority=priority,
+            on_finished=lambda job: store.release_session(holder_id)
+        )
+    except AdmissionError as e:
+        store.release_session(holder_id)
+        st.error(f" {e}")
+        st.stop()
+    st.session_state.job_tracer = (st.session_state.job_id, tracer)
 
 
-def simple_retrieve(texts, query, top_k=3):
+def render_library_matches(matches, params, api_key, job_queue):
     """
+    Offer close matches from the clause library before a run starts
     
+    Args:
+        matches: Entries from ClauseLibrary.find_similar
+        params: The pending run's parameters
+        api_key: OpenAI API key
+        job_queue: JobQueue to submit to
+    """
+    st.markdown("## Similar Clauses in the Library")
+    st.info(
+        "Clauses drafted earlier for a similar objective were found. Start from one of them to skip "
+        f"Steps 1-4 and run only the {params['num_refinements']} review round(s), or draft from scratch."
+    )
     
-    AI
+    for match in matches:
+        score = f"{match['score']}/100" if match["score"] is not None else "not assessed"
+        with st.expander(
+            f"#{match['id']} - {match['similarity']:.0%} similar - {match['jurisdiction'] or 'No jurisdiction'}"
+            f" - {match['style']} - score {score}"
+        ):
+            st.markdown(f"**Objective:** {match['objective']}")
+            st.code(match["clause"], language="text")
+            if st.button("Start from this clause", key=f"library_use_{match['id']}"):
+                params["start_from"] = {"id": match["id"], "clause": match["clause"]}
+                submit_run(params, api_key, job_queue)
+                del st.session_state["pending_run"]
+                st.rerun()
+    
+    if st.button("Draft from scratch", key="library_skip_btn"):
+        submit_run(params, api_key, job_queue)
+        del st.session_state["pending_run"]
+        st.rerun()
+
+
+def render_job(job, job_queue):
     """
-    q_words = set([w.lower() for w in query.split() if len(w) > 3])
-    scored = []
+    Render everything a job has published so far
     
-    for item in texts:
-        words = set([w.lower().strip('.,;:\n') for w in item['text'].split() if len(w) > 3])
-        overlap = len(q_words & words)
-        scored.append((overlap, item))
+    Args:
+        job: backend.jobs.Job
+        job_queue: JobQueue the job belongs to
+        
+    Returns:
+        bool: True while the job is still queued or running (page should poll)
+    """
+    progress_bar = st.progress(0)
+    status_text = st.empty()
+    
+    if job.status == QUEUED:
+        status_text.info(f"⏳ Waiting for a free worker - position {job_queue.position(job.id)} in queue...")
+        if st.button("Cancel", key="cancel_job_btn"):
+            job_queue.cancel(job.id)
+            st.rerun()
+        return True
+    
+    # A traced run also records how long the page takes to render each event
+    traced_job, tracer = st.session_state.get("job_tracer", (None, None))
+    tracer = tracer if traced_job == job.id else None
+    
+    # Word file and previews the queue handed over once the finished job was rendered
+    payload_job, payloads = st.session_state.get("job_payloads", (None, {}))
+    payloads = payloads if payload_job == job.id else {}
+    
+    clause_tabs = None
+    # Contract mode: the shared context is prepared before any clause and goes above the clause tabs
+    shared_context = None
+    with tracer.activate() if tracer is not None else nullcontext():
+        for index, event in enumerate(job.events_since(0)):
+            if index in payloads:
+                event = dict(event, **payloads[index])
+            with span(f"render.{event['type']}", "render"):
+                if event["type"] == "progress":
+                    status_text.info(f"⏳ Progress: {event['current']}/{event['total']} - {event['message']}")
+                    progress_bar.progress(event["current"] / event["total"])
+                elif event["type"] == "contract_start":
+                    render_job_event(event)
+                    shared_context = st.container()
+                    clause_tabs = st.tabs([f"{i}. {title}" for i, title in enumerate(event["titles"], start=1)])
+                elif "clause_index" in event and clause_tabs is not None:
+                    # Contract mode: clause events go to that clause's tab
+                    shared_context = None
+                    with clause_tabs[event["clause_index"]]:
+                        render_job_event(event)
+                else:
+                    with shared_context if shared_context is not None else nullcontext():
+                        render_job_event(event)
+                    if event["type"] == "complete":
+                        status_text.success(f" StepTotal AI calls: {event['ai_calls']}  times")
+                        progress_bar.progress(1.0)
+    
+    if tracer is not None and job.status not in (QUEUED, RUNNING):
+        # Rendered once in full: save the trace with the rendering spans and stop recording
+        tracer.save()
+        st.session_state.job_tracer = (None, None)
+    
+    if job.finished:
+        # Keep the bulky payloads with this session instead of in the shared queue
+        trimmed = job_queue.trim(job.id)
+        if trimmed:
+            st.session_state.job_payloads = (job.id, trimmed)
+    
+    if job.status == RUNNING:
+        if job.cancel_event.is_set():
+            status_text.warning("Cancelling...")
+        elif st.button("Cancel", key="cancel_job_btn"):
+            # Aborts the in-flight AI call; the job ends as cancelled
+            job_queue.cancel(job.id)
+            st.rerun()
+        return True
+    
+    if job.status == FAILED:
+        st.error(describe_api_error(job.error["type"], job.error["message"]))
+        with st.expander(" View Detailed Error InformationFor debugging"):
+            st.code(job.error["traceback"])
+    elif job.status == CANCELLED:
+        status_text.warning("Run cancelled")
+    elif st.session_state.get("celebrated_job") != job.id:
+        # 
+        st.session_state.celebrated_job = job.id
+        st.balloons()
     
-    scored.sort(reverse=True, key=lambda x: x[0])
-    return [item for score, item in scored[:top_k] if score > 0]
+    return False
 
 
-def create_docx(clause_text, metadata):
+def render_job_view(job_queue, polling):
     """
-    Create a professional Word document with proper legal formatting
+    Job section of the page, run as a fragment
+    
+    While the job is in progress the fragment reruns every JOB_POLL_SECONDS
+    on its own, so polling redraws only the job's events, not the whole page.
     
     Args:
-        clause_text: The clause content
-        metadata: Document metadata (timestamp, objective, etc.)
-        
-    Returns:
-        BytesIO: Document binary stream
+        job_queue: JobQueue the session's job belongs to
+        polling: Whether this fragment was set up to poll (job in progress)
     """
-    from docx.shared import Pt, RGBColor
-    from docx.enum.text import WD_ALIGN_PARAGRAPH
-    
-    doc = Document()
-    
-    # Title - Professional Legal Document Style
-    title = doc.add_heading(level=1)
-    title_run = title.add_run("CONTRACT CLAUSE")
-    title_run.font.name = 'Times New Roman'
-    title_run.font.size = Pt(16)
-    title_run.font.bold = True
-    title.alignment = WD_ALIGN_PARAGRAPH.CENTER
-    
-    doc.add_paragraph()  # Spacing
-    
-    # Document Information Section
-    info_heading = doc.add_heading("DOCUMENT INFORMATION", level=2)
-    info_heading.runs[0].font.name = 'Times New Roman'
-    info_heading.runs[0].font.size = Pt(12)
-    
-    # Metadata table-style layout
-    info_para = doc.add_paragraph()
-    info_para.add_run("Date Generated: ").bold = True
-    info_para.add_run(f"{metadata.get('timestamp', 'N/A')}")
-    for run in info_para.runs:
-        run.font.name = 'Times New Roman'
-        run.font.size = Pt(11)
-    
-    info_para = doc.add_paragraph()
-    info_para.add_run("Drafting Objective: ").bold = True
-    info_para.add_run(f"{metadata.get('objective', 'N/A')}")
-    for run in info_para.runs:
-        run.font.name = 'Times New Roman'
-        run.font.size = Pt(11)
-    
-    info_para = doc.add_paragraph()
-    info_para.add_run("Jurisdiction: ").bold = True
-    info_para.add_run(f"{metadata.get('jurisdiction', 'Not specified')}")
-    for run in info_para.runs:
-        run.font.name = 'Times New Roman'
-        run.font.size = Pt(11)
-    
-    info_para = doc.add_paragraph()
-    info_para.add_run("Drafting Style: ").bold = True
-    info_para.add_run(f"{metadata.get('style', 'N/A')}")
-    for run in info_para.runs:
-        run.font.name = 'Times New Roman'
-        run.font.size = Pt(11)
-    
-    doc.add_paragraph()  # Spacing
-    
-    # Clause Content Section
-    clause_heading = doc.add_heading("CLAUSE PROVISIONS", level=2)
-    clause_heading.runs[0].font.name = 'Times New Roman'
-    clause_heading.runs[0].font.size = Pt(12)
-    
-    doc.add_paragraph()  # Spacing before clause
-    
-    # Add clause text with proper formatting (remove all markdown and LaTeX artifacts)
-    import re
-    
-    # Function to clean LaTeX formatting
-    def clean_latex(text):
-        # Remove display math delimiters \[ \]
-        text = re.sub(r'\\\[(.*?)\\\]', r'\1', text, flags=re.DOTALL)
-        # Remove inline math delimiters \( \)
-        text = re.sub(r'\\\((.*?)\\\)', r'\1', text, flags=re.DOTALL)
-        # Remove $$ $$ delimiters
-        text = re.sub(r'\$\$(.*?)\$\$', r'\1', text, flags=re.DOTALL)
-        # Remove $ $ delimiters
-        text = re.sub(r'\$(.*?)\$', r'\1', text)
-        # Replace LaTeX commands with readable text
-        text = text.replace(r'\text{', '').replace('}', '')
-        text = text.replace(r'\times', '×')
-        text = text.replace(r'\%', '%')
-        # Replace \frac{a}{b} with (a / b)
-        text = re.sub(r'\\frac\{([^}]*)\}\{([^}]*)\}', r'(\1 / \2)', text)
-        # Remove remaining backslashes
-        text = text.replace('\\', '')
-        return text
-    
-    # Split into lines and process each
-    lines = clause_text.split('\n')
-    
-    for line in lines:
-        if not line.strip():
-            continue  # Skip empty lines
-            
-        # Remove markdown formatting
-        clean_line = line.replace("**", "").replace("*", "")
-        # Remove markdown headers but keep the text
-        clean_line = re.sub(r'^#{1,6}\s+', '', clean_line)
-        # Clean LaTeX formatting
-        clean_line = clean_latex(clean_line)
-        
-        # Check if this looks like a header (was markdown header or is short and looks like title)
-        if line.startswith('#'):
-            # This was a markdown header - make it a sub-heading in Word
-            heading_para = doc.add_paragraph(clean_line)
-            heading_para.runs[0].bold = True
-            heading_para.runs[0].font.name = 'Times New Roman'
-            heading_para.runs[0].font.size = Pt(11)
-            heading_para.paragraph_format.space_before = Pt(6)
-        else:
-            # Regular paragraph
-            clause_para = doc.add_paragraph(clean_line)
-            clause_para.paragraph_format.line_spacing = 1.15
-            for run in clause_para.runs:
-                run.font.name = 'Times New Roman'
-                run.font.size = Pt(11)
-    
-    doc.add_paragraph()  # Spacing after clause
-    
-    # Professional Disclaimer
-    disclaimer_heading = doc.add_heading("DISCLAIMER", level=2)
-    disclaimer_heading.runs[0].font.name = 'Times New Roman'
-    disclaimer_heading.runs[0].font.size = Pt(12)
-    
-    disclaimer = doc.add_paragraph()
-    disclaimer.add_run(
-        "This document has been generated using artificial intelligence technology "
-        "and is provided for informational purposes only. It does not constitute "
-        "legal advice, and should not be relied upon as such. Users should consult "
-        "with qualified legal professionals before using any content from this document "
-        "in actual legal agreements or contracts. The creators and distributors of this "
-        "tool disclaim all liability for any damages arising from the use of this document."
-    )
-    disclaimer.paragraph_format.line_spacing = 1.15
-    for run in disclaimer.runs:
-        run.font.name = 'Times New Roman'
-        run.font.size = Pt(9)
-        run.font.italic = True
-    
-    # Save to memory
-    bio = BytesIO()
-    doc.save(bio)
-    bio.seek(0)
-    
-    return bio
+    job = job_queue.get(st.session_state.get("job_id")) if st.session_state.get("job_id") else None
+    if job is None:
+        return
+    with st.container():
+        in_progress = render_job(job, job_queue)
+    if polling and not in_progress:
+        # Finished: one full rerun refreshes the sidebar and stops polling
+        st.rerun()
 
 
 # ============================================================================
@@ -502,72 +638,156 @@ api_key = get_api_key_from_sidebar()
 st.sidebar.markdown("---")
 st.sidebar.header("Input Parameters")
 
-# 1. Clause objective
-objective = st.sidebar.text_area(
-    "Clause Drafting Objective",
-    height=120,
-    placeholder="e.g., Limit liability for indirect damages to 20% of contract amount",
-    key="objective_input",
-    help="Clearly describe the purpose and requirements for the clause"
-)
-
-# 2. Jurisdiction
-jurisdiction = st.sidebar.text_input(
-    "Jurisdiction (Optional)",
-    placeholder="e.g., Mainland China / Hong Kong / Singapore",
-    key="jurisdiction_input",
-    help="Different jurisdictions may have different legal requirements"
-)
-
-# 3. File upload
-uploaded_files = st.sidebar.file_uploader(
-    "Upload Reference Documents (Optional)",
-    accept_multiple_files=True,
-    type=['txt', 'docx', 'md'],
-    key="upload_input",
-    help="Upload relevant contracts, cases, or reference documents (TXT, DOCX, MD)"
-)
-
-if uploaded_files:
-    st.sidebar.success(f"Uploaded {len(uploaded_files)} file(s)")
-
-# 4. Drafting style
-firm_style = st.sidebar.selectbox(
-    "Drafting Style",
-    ["Plain English", "Legal Formal", "Balanced (Legal but Readable)"],
-    index=2,
-    key="style_input",
-    help="Select the language style for the clause"
-)
-
-# 5. Review iterations
-num_refinements = st.sidebar.slider(
-    "Number of Automated Reviews",
-    min_value=1,
-    max_value=4,
-    value=2,
-    key="refinement_slider",
-    help="Number of automated review and refinement iterations (higher = better quality, longer time)"
-)
-
-st.sidebar.markdown("---")
-
-# Run button
-run_button = st.sidebar.button(
-    "Generate Clause",
-    type="primary",
-    use_container_width=True,
-    key="run_button"
-)
+# Inputs live in a form so typing, sliding and uploading do not rerun the
+# whole page; values are sent together when "Generate Clause" is pressed.
+with st.sidebar.form("clause_form", border=False):
+    # 0. Single clause or full contract
+    drafting_mode = st.radio(
+        "Drafting Mode",
+        ["Single clause", "Full contract"],
+        horizontal=True,
+        key="mode_input",
+        help="Full contract: enter one clause objective per line; shared research is done once and clauses are drafted in parallel"
+    )
+    
+    # 1. Clause objective
+    objective = st.text_area(
+        "Clause Drafting Objective",
+        height=120,
+        placeholder="e.g., Limit liability for indirect damages to 20% of contract amount",
+        key="objective_input",
+        help="Clearly describe the purpose and requirements for the clause (Full contract: one clause objective per line)"
+    )
+    
+    # 2. Jurisdiction
+    jurisdiction = st.text_input(
+        "Jurisdiction (Optional)",
+        placeholder="e.g., Mainland China / Hong Kong / Singapore",
+        key="jurisdiction_input",
+        help="Different jurisdictions may have different legal requirements"
+    )
+    
+    # 3. File upload
+    uploaded_files = st.file_uploader(
+        "Upload Reference Documents (Optional)",
+        accept_multiple_files=True,
+        type=['txt', 'docx', 'md'],
+        key="upload_input",
+        help="Upload relevant contracts, cases, or reference documents (TXT, DOCX, MD)"
+    )
+    
+    if uploaded_files:
+        st.success(f"Uploaded {len(uploaded_files)} file(s)")
+    
+    # 4. Drafting style
+    firm_style = st.selectbox(
+        "Drafting Style",
+        ["Plain English", "Legal Formal", "Balanced (Legal but Readable)"],
+        index=2,
+        key="style_input",
+        help="Select the language style for the clause"
+    )
+    
+    # 5. Review iterations
+    num_refinements = st.slider(
+        "Number of Automated Reviews",
+        min_value=1,
+        max_value=4,
+        value=2,
+        key="refinement_slider",
+        help="Number of automated review and refinement iterations (higher = better quality, longer time)"
+    )
+    
+    # 6. Review mode
+    review_mode_label = st.selectbox(
+        "Review Mode",
+        ["Auto", "Full rewrite", "Edits only", "Specialist panel"],
+        index=0,
+        key="review_mode_input",
+        help="Edits only: reviewers return changes per numbered subclause instead of rewriting the whole clause (faster for long clauses). Auto switches to edits for long clauses. Specialist panel: enforceability, clarity, risk and consistency reviewers work in parallel and their findings are merged once, replacing the review rounds."
+    )
+    
+    # 7. Time limit
+    time_limit = st.slider(
+        "Time Limit (minutes)",
+        min_value=1,
+        max_value=15,
+        value=max(1, min(15, round(default_deadline_seconds() / 60))),
+        key="time_limit_slider",
+        help="Upper bound on the run time. When time runs low, remaining reviews and the quality assessment are skipped and the best clause so far is returned."
+    )
+    
+    # 8. Diagnostics
+    with st.expander("Diagnostics"):
+        trace_run = st.checkbox(
+            "Trace this run",
+            key="trace_input",
+            help="Record how long each step, AI call and helper takes (and the page's rendering) to a Chrome trace file"
+        )
+        profile_run = st.checkbox(
+            "Profile with cProfile",
+            key="profile_input",
+            help="Also profile the run's Python code (implies tracing; slows the run down)"
+        )
+    
+    st.markdown("---")
+    
+    # Run button
+    run_button = st.form_submit_button(
+        "Generate Clause",
+        type="primary",
+        use_container_width=True,
+        key="run_button"
+    )
 
 # Display statistics
 if 'ai_call_count' in st.session_state:
     st.sidebar.info(f"AI Calls in Current Session: {st.session_state.ai_call_count}")
 
+# Provider pool health (only when LLM_ENDPOINTS is configured)
+provider_pool = get_provider_pool()
+if provider_pool is not None:
+    with st.sidebar.expander("LLM Endpoints"):
+        st.dataframe(provider_pool.stats(), hide_index=True)
+
+# Adaptive output limits per step (once runs have been observed)
+output_budget_stats = output_budgets.stats()
+if output_budget_stats:
+    with st.sidebar.expander("AI Output Limits"):
+        st.dataframe(output_budget_stats, hide_index=True)
+
+# Identical AI calls from concurrent sessions answered by one request
+single_flight_stats = single_flight.stats()
+if single_flight_stats["coalesced"]:
+    st.sidebar.caption(
+        f"{single_flight_stats['coalesced']} identical AI call(s) shared an in-flight request "
+        f"({single_flight_stats['calls']} sent to the API)"
+    )
+
+# Document store memory gauges
+with st.sidebar.expander("Memory"):
+    store_stats = get_document_store().stats()
+    st.progress(
+        min(1.0, store_stats["memory_bytes"] / store_stats["memory_quota"]),
+        text=f"Documents in memory: {store_stats['memory_bytes'] / 2**20:.1f} / {store_stats['memory_quota'] / 2**20:.0f} MB"
+    )
+    session_bytes = get_document_store().session_bytes(get_session_id())
+    st.progress(
+        min(1.0, session_bytes / store_stats["session_quota"]),
+        text=f"This session: {session_bytes / 2**20:.1f} / {store_stats['session_quota'] / 2**20:.0f} MB"
+    )
+    st.caption(
+        f"{store_stats['documents']} document(s) across {store_stats['sessions']} session(s); "
+        f"{store_stats['spilled_documents']} spilled to disk ({store_stats['spilled_bytes'] / 2**20:.1f} MB)"
+        + (f"; process RSS {store_stats['process_rss'] / 2**20:.0f} MB" if store_stats["process_rss"] else "")
+    )
+
 # ============================================================================
 # 
 # ============================================================================
 
+job_queue = get_job_queue()
+
 if run_button:
     # AI Call
     st.session_state.ai_call_count = 0
@@ -577,479 +797,59 @@ if run_button:
         st.error(" Please enter your OpenAI API key in the sidebar")
         st.stop()
     
-    if not objective or len(objective.strip()) < 10:
+    contract_mode = drafting_mode == "Full contract"
+    objectives = [line.strip() for line in (objective or "").splitlines() if line.strip()]
+    
+    if contract_mode:
+        if not 2 <= len(objectives) <= MAX_CONTRACT_CLAUSES:
+            st.error(f" Full contract mode needs 2-{MAX_CONTRACT_CLAUSES} clause objectives, one per line")
+            st.stop()
+        if any(len(o) < 10 for o in objectives):
+            st.error(" Please provide a clear objective (at least 10 characters) on every line")
+            st.stop()
+    elif not objective or len(objective.strip()) < 10:
         st.error(" Please provide a clear clause objectiveat least10 characters")
         st.stop()
     
-    # 
-    progress_container = st.container()
-    
-    with progress_container:
-        # 
-        progress_bar = st.progress(0)
-        status_text = st.empty()
-        
-        # Step7Step + num_refinementsStep
-        total_steps = 7 + num_refinements
-        current_step = 0
-        
-        # ====================================================================
-        # Step 1: 
-        # ====================================================================
-        current_step += 1
-        status_text.info(f"⏳ Progress: {current_step}/{total_steps} - Analyzing your objective...")
-        progress_bar.progress(current_step / total_steps)
-        
-        st.markdown("## Step 1: Objective Analysis")
-        st.info(f" AI Call #{st.session_state.ai_call_count + 1}: Interpret drafting objective")
-        
-        with st.spinner("..."):
-            interpretation = call_openai_chat(
-                [
-                    {"role": "system", "content": ""},
-                    {"role": "user", "content": f"""5
-
-****: {objective}
-
-****: {jurisdiction or 'Not specified'}
-
-****: {firm_style}
-
-
-1. 
-2. 
-3. 
-4. 
-5. 
-"""}
-                ],
-                api_key
-            )
-        
-        st.success(" Objective Analysis")
-        st.markdown(interpretation)
-        
-        # ====================================================================
-        # Step 2: 
-        # ====================================================================
-        current_step += 1
-        status_text.info(f"⏳ Progress: {current_step}/{total_steps} - Processing documents...")
-        progress_bar.progress(current_step / total_steps)
-        
-        st.markdown("## Step 2: Document Analysis and Legal Research")
-        
-        texts = extract_text_from_uploaded_files(uploaded_files) if uploaded_files else []
-        
-        if texts:
-            # Uploaded Documents
-            st.info(f" AI Call #{st.session_state.ai_call_count + 1}: Summarize uploaded documents")
-            
-            combined_preview = "\n\n".join([
-                f"--- {t['filename']} ---\n{t['text'][:1500]}"  # 1500
-                for t in texts
-            ])
-            
-            with st.expander(" View Uploaded Document Preview"):
-                st.text_area("Document Content Preview", combined_preview, height=200, key="docs_preview")
-            
-            with st.spinner("Summarizing documents..."):
-                docs_summary = call_openai_chat(
-                    [
-                        {"role": "system", "content": ""},
-                        {"role": "user", "content": f"""
-
-****: {objective}
-
-****:
-{combined_preview}
-
-
-1. 
-2. 
-3. 
-4. 
-"""}
-                    ],
-                    api_key
-                )
-            
-            st.success(" Document summary completed")
-            st.markdown(docs_summary)
-            
-            # AIRAG
-            st.info(f" AI Call #{st.session_state.ai_call_count + 1}: Intelligent retrieval of relevant segments")
-            
-            with st.spinner("Retrieving relevant content..."):
-                retrieved = ai_enhanced_retrieve(texts, objective, api_key, top_k=3)
-            
-            if retrieved:
-                st.success(f" Found {len(retrieved)} relevant document segment(s)")
-                with st.expander(" View Retrieved Relevant Segments"):
-                    for r in retrieved:
-                        st.markdown(f"** {r['filename']}**")
-                        st.code(r['text'][:500], language="text")
-            else:
-                st.info("ℹ Found")
-        else:
-            # Uploaded DocumentsConduct legal background researchAI Call times
-            st.info(f" AI Call #{st.session_state.ai_call_count + 1}: Conduct legal background research")
-            
-            with st.spinner("Researching relevant legal background..."):
-                legal_research = call_openai_chat(
-                    [
-                        {"role": "system", "content": ""},
-                        {"role": "user", "content": f"""
-
-****: {objective}
-****: {jurisdiction or ''}
-
-
-1. 
-2. 
-3. 
-4. 
-"""}
-                    ],
-                    api_key
-                )
-            
-            st.success(" Legal research completed")
-            st.markdown(legal_research)
-            
-            docs_summary = f"(Uploaded Documents)\n\n\n{legal_research}"
-            retrieved = []
-        
-        # ====================================================================
-        # Step 3: 
-        # ====================================================================
-        current_step += 1
-        status_text.info(f"⏳ Progress: {current_step}/{total_steps} - Analyzing constraints...")
-        progress_bar.progress(current_step / total_steps)
-        
-        st.markdown("## Step 3: Constraints and Risk Analysis")
-        st.info(f" AI Call #{st.session_state.ai_call_count + 1}: Analyze constraints and legal risks")
-        
-        # 
-        evidence_block = "\n\n".join([
-            f"From {r['filename']}\n{r['text'][:1000]}"
-            for r in retrieved
-        ]) if retrieved else "(No relevant documents)"
-        
-        with st.spinner("Analyzing constraints..."):
-            constraints = call_openai_chat(
-                [
-                    {"role": "system", "content": ""},
-                    {"role": "user", "content": f"""
-
-****: {objective}
-
-****: {jurisdiction or ''}
-
-****: {docs_summary}
-
-****: {evidence_block}
-
-
-
-**A. **
-3-5
-
-**B. **
-2-3
-
-**C. **
-3-5
-
-**D. **
-
-"""}
-                ],
-                api_key
-            )
-        
-        st.success(" Analysis completed")
-        st.markdown(constraints)
-        
-        # ====================================================================
-        # Step 4: Draft Initial Clause
-        # ====================================================================
-        current_step += 1
-        status_text.info(f"⏳ Progress: {current_step}/{total_steps} - Drafting clause...")
-        progress_bar.progress(current_step / total_steps)
-        
-        st.markdown("## Step 4: Draft Initial Clause")
-        st.info(f" AI Call #{st.session_state.ai_call_count + 1}: Draft initial clause version")
-        
-        with st.spinner("Drafting clause..."):
-            initial_clause = call_openai_chat(
-                [
-                    {"role": "system", "content": "You are an experienced contract lawyer. CRITICAL: Use PLAIN TEXT only - NO LaTeX (no \\frac, \\text, \\[, \\]). For math use: (A / B) format"},
-                    {"role": "user", "content": f"""
-
-****: {objective}
-
-****: {constraints}
-
-****: {firm_style}
-
-****:
-1. 
-2. 
-3. 
-4. 
-
-
-
-
-
-
-Drafting Notes
-• 1: ...
-• 2: ...
-• 3: ...
-"""}
-                ],
-                api_key,
-                max_tokens=1500
-            )
-        
-        st.success(" Initial clause drafting completed")
-        
-        # Parse and display initial clause
-        if "Drafting Notes" in initial_clause:
-            parts = initial_clause.split("Drafting Notes")
-            clause_part = parts[0].strip()
-            explanation_part = parts[1].strip() if len(parts) > 1 else ""
-            
-            st.markdown("### Initial Clause Version")
-            st.code(clause_part, language="text")
-            
-            if explanation_part:
-                with st.expander("View Drafting Notes"):
-                    st.markdown(explanation_part)
-        else:
-            clause_part = initial_clause
-            st.markdown("### Initial Clause Version")
-            st.code(initial_clause, language="text")
-        
-        # ====================================================================
-        # Step 5: Review and Refinement
-        # ====================================================================
-        st.markdown("## Step 5: Review and Refinement")
-        
-        current_clause = clause_part if "Drafting Notes" in initial_clause else initial_clause
-        
-        for i in range(num_refinements):
-            current_step += 1
-            status_text.info(f"⏳ Progress: {current_step}/{total_steps} - Conducting review {i+1}...")
-            progress_bar.progress(current_step / total_steps)
-            
-            st.markdown(f"### Review Round {i+1}")
-            st.info(f" AI Call #{st.session_state.ai_call_count + 1}: Review and refine clause")
-            
-            with st.spinner(f"Conducting review  {i+1} ..."):
-                review = call_openai_chat(
-                    [
-                        {"role": "system", "content": "You are a professional contract lawyer conducting a thorough review of legal clauses."},
-                        {"role": "user", "content": f"""
-Please review and refine the following contract clause.
-
-**Drafting Objective**: {objective}
-
-**Current Clause**:
-{current_clause}
-
-**Review Requirements**:
-1. Check legal completeness and accuracy
-2. Improve language clarity and precision
-3. Ensure enforceability under relevant jurisdiction
-4. Add necessary qualifications or exceptions
-5. Optimize structure and readability
-
-**Output Format** (IMPORTANT - Follow this exact format):
-
-[Revised Clause]
-(Complete revised clause text here)
-
-[Revision Notes]
-- First improvement description (what was changed and why)
-- Second improvement description  
-- Third improvement description
-(Use bullet points with dashes, NOT numbered lists like "1.", "2." etc.)
-"""}
-                    ],
-                    api_key,
-                    max_tokens=1500
-                )
-            
-            # Parse review result - handle both [Revised Clause] and Revised Clause formats
-            if "Revised Clause" in review or "[Revised Clause]" in review:
-                # Try to split by Revision Notes (with or without brackets)
-                if "[Revision Notes]" in review:
-                    parts = review.split("[Revision Notes]")
-                elif "Revision Notes" in review:
-                    parts = review.split("Revision Notes")
-                else:
-                    parts = [review, ""]
-                
-                # Extract revised clause (remove format markers)
-                revised_clause = parts[0].replace("[Revised Clause]", "").replace("Revised Clause", "").strip()
-                # Remove any remaining brackets or parenthetical instructions
-                revised_clause = revised_clause.replace("(Complete revised clause text here)", "").strip()
-                
-                changes = parts[1].strip() if len(parts) > 1 else ""
-                # Remove instruction text from changes
-                changes = changes.replace("(Use bullet points with dashes, NOT numbered lists like \"1.\", \"2.\" etc.)", "").strip()
-                
-                st.success(f"Review {i+1} completed")
-                
-                col1, col2 = st.columns([1, 1])
-                
-                with col1:
-                    st.markdown("**Revised Clause**")
-                    st.code(revised_clause, language="text")
-                
-                with col2:
-                    st.markdown("**Revision Notes**")
-                    if changes:
-                        st.markdown(changes)
-                    else:
-                        st.info("No specific changes documented")
-                
-                current_clause = revised_clause
-            else:
-                # Fallback: use entire review result as the revised clause
-                st.success(f"Review {i+1} completed")
-                st.markdown("**Revised Clause**")
-                st.code(review, language="text")
-                current_clause = review
-        
-        # ====================================================================
-        # Step 6: Final Version
-        # ====================================================================
-        current_step += 1
-        status_text.info(f"⏳ Progress: {current_step}/{total_steps} - Generating final version...")
-        progress_bar.progress(current_step / total_steps)
-        
-        st.markdown("## Step 6: Final Version")
-        st.success(" review completed")
-        
-        st.markdown("###  Final Clause")
-        st.code(current_clause, language="text")
-        
-        # Word
-        metadata = {
-            "timestamp": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
-            "objective": objective,
-            "jurisdiction": jurisdiction or "Not specified",
-            "style": firm_style,
-            "ai_calls": st.session_state.ai_call_count
-        }
-        
-        docx_bio = create_docx(current_clause, metadata)
-        
-        st.download_button(
-            label=" DownloadWord",
-            data=docx_bio,
-            file_name=f"AI_{datetime.now().strftime('%Y%m%d_%H%M%S')}.docx",
-            mime="application/vnd.openxmlformats-officedocument.wordprocessingml.document",
-            type="primary"
-        )
-        
-        # ====================================================================
-        # Step 7: Quality Assessment
-        # ====================================================================
-        current_step += 1
-        status_text.info(f"⏳ Progress: {current_step}/{total_steps} - Assessing quality...")
-        progress_bar.progress(current_step / total_steps)
-        
-        st.markdown("## Step 7: Quality Assessment")
-        st.info(f" AI Call #{st.session_state.ai_call_count + 1}: Assess clause quality")
-        
-        with st.spinner("Assess clause quality..."):
-            evaluation = call_openai_chat(
-                [
-                    {"role": "system", "content": "You are a senior legal expert conducting quality assessment of contract clauses."},
-                    {"role": "user", "content": f"""
-Please assess the quality of the following contract clause.
-
-**Drafting Objective**: {objective}
-
-**Final Clause**:
-{current_clause}
-
-**Assessment Requirements**:
-Please score the clause from the following 10 dimensions (10 points each, total 100 points):
-
-1. Objective Achievement - Does it fulfill the drafting objective?
-2. Legal Validity - Is it legally sound and compliant?
-3. Language Clarity - Is the wording clear and unambiguous?
-4. Logical Rigor - Is the structure logical and coherent?
-5. Enforceability - Can it be effectively enforced?
-6. Risk Control - Does it adequately address potential risks?
-7. Professionalism - Does it meet professional legal standards?
-8. Completeness - Are all necessary elements included?
-9. Applicability - Is it practical and applicable?
-10. Overall Quality - Overall assessment
-
-**Output Format** (IMPORTANT - Follow exactly):
+    params = {
+        "objective": objective,
+        "jurisdiction": jurisdiction,
+        "firm_style": firm_style,
+        "num_refinements": num_refinements,
+        "review_mode": {
+            "Auto": "auto", "Full rewrite": "full", "Edits only": "edits", "Specialist panel": "panel"
+        }[review_mode_label],
+        "deadline_seconds": time_limit * 60,
+        "documents": store_uploaded_documents(uploaded_files),
+        "trace": trace_run or profile_run,
+        "profile": profile_run
+    }
+    
+    if contract_mode:
+        del params["objective"]
+        params["objectives"] = objectives
+    
+    # Look for close matches in the clause library before Step 1
+    library = get_clause_library()
+    matches = [] if contract_mode or library is None else library.find_similar(
+        objective, jurisdiction, firm_style, document_hashes(params["documents"])
+    )
+    if matches:
+        st.session_state.pending_run = {"params": params, "matches": matches}
+    else:
+        st.session_state.pop("pending_run", None)
+        submit_run(params, api_key, job_queue)
 
-[Scoring]
-1. Objective Achievement: X/10
-2. Legal Validity: X/10
-3. Language Clarity: X/10
-4. Logical Rigor: X/10
-5. Enforceability: X/10
-6. Risk Control: X/10
-7. Professionalism: X/10
-8. Completeness: X/10
-9. Applicability: X/10
-10. Overall Quality: X/10
-Total Score: XX/100
+pending_run = st.session_state.get("pending_run")
+if pending_run:
+    render_library_matches(pending_run["matches"], pending_run["params"], api_key, job_queue)
 
-[Strengths]
-• Strength 1
-• Strength 2
-• Strength 3
+job = job_queue.get(st.session_state.get("job_id")) if st.session_state.get("job_id") else None
 
-[Areas for Improvement]
-• Suggestion 1
-• Suggestion 2
-• Suggestion 3
-"""}
-                ],
-                api_key
-            )
-        
-        st.success(" Quality Assessment")
-        st.markdown(evaluation)
-        
-        # ====================================================================
-        # 
-        # ====================================================================
-        status_text.success(f" StepTotal AI calls: {st.session_state.ai_call_count}  times")
-        progress_bar.progress(1.0)
-        
-        # 
-        st.markdown("---")
-        st.markdown("###  Generation Statistics")
-        
-        col1, col2, col3, col4 = st.columns(4)
-        
-        with col1:
-            st.metric("AI Call times", st.session_state.ai_call_count)
-        
-        with col2:
-            st.metric("Step", 7)
-        
-        with col3:
-            st.metric(" times", num_refinements)
-        
-        with col4:
-            st.metric("Uploaded Documents", len(texts) if texts else 0)
-        
-        # 
-        st.balloons()
+if job is not None:
+    # Only the job fragment reruns while polling for new events
+    polling = not job.finished and JOB_POLL_SECONDS > 0
+    st.fragment(render_job_view, run_every=JOB_POLL_SECONDS if polling else None)(job_queue, polling)
 
 # ============================================================================
 # 
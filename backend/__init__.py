@@ -0,0 +1,6 @@
+"""
+Backend for the AI Contract Clause Builder
+
+Everything in this package runs without Streamlit so that clause generation
+can happen on worker threads, outside the page's script execution.
+"""
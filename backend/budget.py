@@ -0,0 +1,102 @@
+"""
+Per-run time budget and cancellation
+
+A run gets a deadline (RUN_DEADLINE_SECONDS, default 300, counted from the
+moment a worker starts it) and a cancel event set by the page's Cancel
+button. Every model call is given a timeout carved out of what is left:
+enough for itself while still reserving the expected duration of the calls
+that must follow it. The pipeline asks ``can_afford`` before optional work
+(review rounds, the quality assessment) and skips it when the budget is
+running low, so a run returns the best clause so far instead of overrunning.
+
+In-flight calls are aborted as soon as the run is cancelled or the deadline
+passes (see backend.llm.call_openai_chat), raising RunCancelled or
+DeadlineExceeded.
+"""
+
+import os
+import time
+
+# Assumed duration of a model call before the run has timed any of its own
+DEFAULT_CALL_ESTIMATE = 20.0
+# Per-call ceiling (the previous fixed timeout) and floor
+MAX_CALL_TIMEOUT = 60.0
+MIN_CALL_TIMEOUT = 5.0
+
+
+class RunCancelled(Exception):
+    """Raised inside a run once the user has cancelled it."""
+
+
+class DeadlineExceeded(Exception):
+    """Raised inside a run once its time budget is used up."""
+
+
+def default_deadline_seconds():
+    """Run deadline from RUN_DEADLINE_SECONDS (0 = no deadline)."""
+    return float(os.getenv("RUN_DEADLINE_SECONDS", "300"))
+
+
+class RunBudget:
+    """
+    Time budget and cancel signal of one run
+
+    Args:
+        seconds: Total seconds for the run (None or 0 = unlimited)
+        cancel_event: threading.Event set when the run should stop
+    """
+
+    def __init__(self, seconds=None, cancel_event=None):
+        self.started = time.monotonic()
+        self.deadline = self.started + seconds if seconds else None
+        self.cancel_event = cancel_event
+        self._call_seconds = []
+
+    @property
+    def cancelled(self):
+        return self.cancel_event is not None and self.cancel_event.is_set()
+
+    def remaining(self):
+        """Seconds left, or None without a deadline."""
+        if self.deadline is None:
+            return None
+        return max(0.0, self.deadline - time.monotonic())
+
+    def check(self):
+        """Raise RunCancelled / DeadlineExceeded if the run must stop."""
+        if self.cancelled:
+            raise RunCancelled("Run cancelled")
+        if self.deadline is not None and time.monotonic() >= self.deadline:
+            raise DeadlineExceeded(f"Run exceeded its {self.deadline - self.started:.0f} s time limit")
+
+    def call_estimate(self):
+        """Expected seconds per call: mean of this run's calls so far."""
+        if not self._call_seconds:
+            return DEFAULT_CALL_ESTIMATE
+        return sum(self._call_seconds) / len(self._call_seconds)
+
+    def record_call(self, seconds):
+        self._call_seconds.append(seconds)
+
+    def can_afford(self, calls, reserved_calls=0):
+        """
+        Whether ``calls`` more calls fit while keeping ``reserved_calls`` in reserve
+        """
+        remaining = self.remaining()
+        if remaining is None:
+            return not self.cancelled
+        return remaining >= self.call_estimate() * (calls + reserved_calls)
+
+    def call_timeout(self, reserved_calls=0):
+        """
+        Timeout for the next call, leaving time for ``reserved_calls`` after it
+
+        Raises:
+            RunCancelled / DeadlineExceeded: The run must stop now
+        """
+        self.check()
+        remaining = self.remaining()
+        if remaining is None:
+            return MAX_CALL_TIMEOUT
+        share = remaining - self.call_estimate() * reserved_calls
+        return max(min(MIN_CALL_TIMEOUT, remaining), min(MAX_CALL_TIMEOUT, share))
@@ -0,0 +1,467 @@
+"""
+Contract mode: draft a whole agreement from a list of clause objectives
+
+Drafting an agreement clause by clause repeats the same document
+extraction, summary and research in every run. Contract mode does that
+shared work once:
+
+1. Shared context (once): extract and deduplicate the documents, then
+   either summarise them (one call) or use a knowledge pack / one research
+   call for the agreement as a whole. Reference segments for each clause
+   are picked from the shared texts locally (simple_retrieve), not with a
+   retrieval call per clause.
+2. Per clause, up to ``max_parallel`` at a time (CONTRACT_PARALLEL_CLAUSES,
+   default 4) on a shared thread pool: constraints (Step 3), initial draft
+   (Step 4) and the review rounds (Step 5), using the same prompts as a
+   single-clause run.
+3. Assembly (local): clauses are renumbered in order, then cross-references
+   and defined terms are checked across the whole agreement, and one .docx
+   is built with create_docx.
+
+Steps 1 (objective analysis) and 7 (quality assessment) are not run per
+clause; the local checks take the place of the assessment.
+
+Clause events carry a ``clause_index``; events without one belong to the
+agreement as a whole. Extra event types: "contract_start" (clause titles),
+"clause_failed" and "contract_checks".
+"""
+
+import os
+import re
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from datetime import datetime
+
+from backend.llm import call_openai_chat
+from backend.budget import RunBudget, RunCancelled, DeadlineExceeded, default_deadline_seconds
+from backend.documents import extract_text_from_uploaded_files, create_docx
+from backend.retrieval import simple_retrieve
+from backend.library import document_hashes
+from backend.dedup import deduplicate_passages, estimate_tokens
+from backend.knowledge import lookup_knowledge
+from backend.diff_review import use_edits_mode
+from backend.tracing import propagate, span, step, traced
+from backend.pipeline import (
+    build_combined_preview, build_evidence_block, split_drafting_notes,
+    summarize_documents, research_legal_background, analyze_constraints, draft_initial_clause,
+    run_full_review, run_edits_review, run_panel_review, review_calls,
+)
+
+MAX_CONTRACT_CLAUSES = 20
+
+_executor = None
+_executor_lock = threading.Lock()
+
+# "Clause 4.2", "Section 3", "clauses 2.1" ...
+CROSS_REFERENCE_PATTERN = re.compile(r"\b(?:Clause|Section|Article|Paragraph)s?\s+(\d+(?:\.\d+)*)", re.IGNORECASE)
+# Quoted Title Case phrase: "Confidential Information", “Contract Price”
+DEFINITION_PATTERN = re.compile(r"[\"“]((?:[A-Z][\w-]*)(?:\s+(?:of|and|the|[A-Z][\w-]*))*)[\"”]")
+# Title Case phrase of 2-4 words after an article, e.g. "the Completion Date"
+TERM_USE_PATTERN = re.compile(r"\b(?:the|any|such|each|all)\s+((?:[A-Z][a-z]+)(?:\s+[A-Z][a-z]+){1,3})\b")
+# Numbered line label: "3.", "3.1", "3.1.2"
+LABEL_PATTERN = re.compile(r"^(\s*)(\d+(?:\.\d+)*)(\.?)(\s+)")
+
+
+def get_clause_executor():
+    """
+    Process-wide thread pool for clause drafting (CONTRACT_THREADS, default 8)
+
+    Long-lived threads keep their event loop and HTTP connections (see
+    backend.llm) from one contract run to the next.
+    """
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=int(os.getenv("CONTRACT_THREADS", "8")), thread_name_prefix="contract-clause"
+            )
+        return _executor
+
+
+def estimate_contract_calls(num_clauses, num_refinements, has_documents, review_mode="auto"):
+    """
+    Number of AI calls a contract run will make (used for queue priority)
+
+    Returns:
+        int: Shared summary / research call plus constraints, draft and reviews per clause
+    """
+    return 1 + num_clauses * (2 + review_calls(num_refinements, review_mode))
+
+
+def clause_title(objective, length=40):
+    """Short display title for a clause objective."""
+    objective = objective.strip()
+    return objective if len(objective) <= length else objective[:length - 3].rstrip() + "..."
+
+
+def lookup_agreement_knowledge(objectives, jurisdiction=""):
+    """
+    Knowledge-pack passages for a whole agreement, only if packs cover every clause
+
+    Each objective is looked up on its own: a pack matching one clause
+    (e.g. confidentiality) says nothing about the others (payment, IP), so
+    the research call is only skipped when every clause is covered.
+
+    Returns:
+        dict: {"packs", "passages"} combined over the clauses, or None
+    """
+    lookups = [lookup_knowledge(objective, jurisdiction) for objective in objectives]
+    if not lookups or not all(lookups):
+        return None
+    packs = list(dict.fromkeys(pack for lookup in lookups for pack in lookup["packs"]))
+    passages = list({
+        (p["pack"], p["heading"]): p for lookup in lookups for p in lookup["passages"]
+    }.values())
+    return {"packs": packs, "passages": passages}
+
+
+def renumber_clause(text, number):
+    """
+    Renumber a clause drafted on its own so it becomes clause ``number``
+
+    Two drafting shapes are handled: a numbered heading with numbered
+    subclauses ("1. Title", "1.1 ...") is moved to ``number`` ("4. Title",
+    "4.1 ..."), including references to its own subclauses; an unnumbered
+    heading with a numbered list ("Title", "1. ...") becomes "4. Title",
+    "4.1 ...".
+
+    Returns:
+        str: The renumbered clause text
+    """
+    lines = text.strip().split("\n")
+    first = LABEL_PATTERN.match(lines[0]) if lines else None
+
+    if first and "." not in first.group(2):
+        own = first.group(2)
+
+        def relabel(match):
+            parts = match.group(2).split(".")
+            if parts[0] != own:
+                return match.group(0)
+            return f"{match.group(1)}{'.'.join([str(number)] + parts[1:])}{match.group(3)}{match.group(4)}"
+
+        def rereference(match):
+            parts = match.group(1).split(".")
+            if parts[0] != own:
+                return match.group(0)
+            return match.group(0)[:match.start(1) - match.start(0)] + ".".join([str(number)] + parts[1:])
+
+        return "\n".join(CROSS_REFERENCE_PATTERN.sub(rereference, LABEL_PATTERN.sub(relabel, line)) for line in lines)
+
+    def relabel_item(match):
+        return f"{match.group(1)}{number}.{match.group(2)}{match.group(4)}"
+
+    body = [LABEL_PATTERN.sub(relabel_item, line) for line in lines[1:]]
+    return "\n".join([f"{number}. {lines[0].strip()}"] + body) if lines else f"{number}."
+
+
+@traced()
+def check_contract(clauses):
+    """
+    Check cross-references and defined terms across an assembled agreement
+
+    Args:
+        clauses: Renumbered clause texts, in order (clause k is clauses[k - 1])
+
+    Returns:
+        list: Issues [{"clause": number, "kind": "cross_reference" | "duplicate_definition" |
+        "undefined_term", "message": str}, ...]
+    """
+    issues = []
+    labels = set()
+    definitions = {}  # term -> [clause numbers]
+    for number, text in enumerate(clauses, start=1):
+        for line in text.split("\n"):
+            match = LABEL_PATTERN.match(line)
+            if match:
+                labels.add(match.group(2))
+        for term in DEFINITION_PATTERN.findall(text):
+            clause_numbers = definitions.setdefault(term, [])
+            if number not in clause_numbers:
+                clause_numbers.append(number)
+
+    for number, text in enumerate(clauses, start=1):
+        for reference in sorted(set(CROSS_REFERENCE_PATTERN.findall(text))):
+            if reference not in labels:
+                issues.append({
+                    "clause": number,
+                    "kind": "cross_reference",
+                    "message": f"Refers to Clause {reference}, which does not exist in the agreement",
+                })
+
+    for term, clause_numbers in definitions.items():
+        if len(clause_numbers) > 1:
+            issues.append({
+                "clause": clause_numbers[1],
+                "kind": "duplicate_definition",
+                "message": f'"{term}" is defined in clauses {", ".join(map(str, clause_numbers))}; keep one definition',
+            })
+
+    defined = {term.lower() for term in definitions}
+    undefined = {}  # term -> [clause numbers using it]
+    for number, text in enumerate(clauses, start=1):
+        # Headings are Title Case by design
+        body = "\n".join(text.split("\n")[1:])
+        for term in sorted(set(TERM_USE_PATTERN.findall(body))):
+            if term.lower() not in defined:
+                undefined.setdefault(term, []).append(number)
+    for term, clause_numbers in undefined.items():
+        issues.append({
+            "clause": clause_numbers[0],
+            "kind": "undefined_term",
+            "message": f'"{term}" (clauses {", ".join(map(str, clause_numbers))}) is capitalised like a '
+                       "defined term but is not defined in the agreement",
+        })
+    return issues
+
+
+def run_contract_pipeline(params, api_key, emit, library=None, cancel_event=None, document_store=None):
+    """
+    Draft a full agreement (see module docstring)
+
+    Args:
+        params: dict with objectives (list of clause objectives), jurisdiction,
+            firm_style, num_refinements, documents and optionally review_mode,
+            deadline_seconds and max_parallel
+        api_key: OpenAI API key
+        emit: Callback receiving one event dict per displayable result
+        library: ClauseLibrary to save each finished clause to (optional)
+        cancel_event: threading.Event that cancels the run when set
+        document_store: DocumentStore holding the documents (see run_clause_pipeline)
+
+    Returns:
+        dict: clauses, contract, issues, metadata, ai_calls
+    """
+    objectives = params["objectives"]
+    jurisdiction = params.get("jurisdiction", "")
+    firm_style = params["firm_style"]
+    num_refinements = params["num_refinements"]
+    uploaded_files = params.get("documents") or []
+    review_mode = params.get("review_mode", "auto")
+    max_parallel = params.get("max_parallel") or int(os.getenv("CONTRACT_PARALLEL_CLAUSES", "4"))
+
+    started = time.monotonic()
+    budget = RunBudget(params.get("deadline_seconds", default_deadline_seconds()), cancel_event)
+    calls = {"count": 0}
+    state_lock = threading.Lock()
+    tokens_saved = 0
+
+    def call(messages, **kwargs):
+        with state_lock:
+            calls["count"] += 1
+        call_started = time.monotonic()
+        result = call_openai_chat(
+            messages, api_key, timeout=budget.call_timeout(), budget=budget,
+            on_truncated=lambda info: emit({"type": "truncated", **info}), **kwargs
+        )
+        budget.record_call(time.monotonic() - call_started)
+        return result
+
+    def announce(label, clause_index=None):
+        with state_lock:
+            number = calls["count"] + 1
+        event = {"type": "call", "number": number, "label": label}
+        if clause_index is not None:
+            event["clause_index"] = clause_index
+        emit(event)
+
+    # The specialist panel is a single review stage
+    review_rounds = 1 if review_mode == "panel" else num_refinements
+    total_steps = 2 + len(objectives) * (2 + review_rounds)
+    progress_state = {"current": 0}
+
+    def progress(message):
+        with state_lock:
+            progress_state["current"] += 1
+            current = min(progress_state["current"], total_steps)
+        emit({"type": "progress", "current": current, "total": total_steps, "message": message})
+
+    emit({"type": "contract_start", "titles": [clause_title(o) for o in objectives]})
+
+    # ====================================================================
+    # Shared context: documents, summary / research (once per agreement)
+    # ====================================================================
+    step("Shared context")
+    progress("Preparing shared context...")
+    emit({"type": "heading", "text": "## Shared Context"})
+
+    agreement_objective = "Draft an agreement with the following clauses:\n" + "\n".join(
+        f"{i}. {o}" for i, o in enumerate(objectives, start=1)
+    )
+
+    if document_store is not None:
+        texts, failed_files = document_store.load_texts(uploaded_files)
+    else:
+        texts, failed_files = extract_text_from_uploaded_files(uploaded_files)
+    if failed_files:
+        emit({"type": "upload_warnings", "failed_files": failed_files})
+
+    original_texts = texts
+    texts, dedup_report = deduplicate_passages(texts)
+    if dedup_report["removed"]:
+        emit({"type": "dedup", **dedup_report})
+
+    knowledge = None if texts else lookup_agreement_knowledge(objectives, jurisdiction)
+    if texts:
+        announce("Summarize uploaded documents")
+        combined_preview = build_combined_preview(texts)
+        tokens_saved += (
+            estimate_tokens(build_combined_preview(original_texts)) - estimate_tokens(combined_preview)
+        )
+        docs_summary = summarize_documents(call, agreement_objective, combined_preview)
+        emit({"type": "docs_summary", "preview": combined_preview, "summary": docs_summary})
+    elif knowledge:
+        emit({"type": "knowledge_pack", **knowledge})
+        docs_summary = f"(Knowledge packs: {', '.join(knowledge['packs'])})\n\n" + "\n\n".join(
+            f"From {p['pack']}\n{p['text']}" for p in knowledge["passages"]
+        )
+    else:
+        announce("Conduct legal background research")
+        legal_research = research_legal_background(call, agreement_objective, jurisdiction)
+        emit({"type": "legal_research", "research": legal_research})
+        docs_summary = f"(Uploaded Documents)\n\n\n{legal_research}"
+
+    # ====================================================================
+    # Per clause: constraints, draft, reviews (bounded parallelism)
+    # ====================================================================
+    def draft_clause(index):
+        objective = objectives[index]
+
+        def clause_emit(event):
+            emit(dict(event, clause_index=index))
+
+        retrieved = simple_retrieve(texts, objective, top_k=3) if texts else []
+        if retrieved:
+            clause_emit({
+                "type": "retrieved",
+                "documents": [{"filename": r["filename"], "text": r["text"][:500]} for r in retrieved],
+            })
+
+        announce("Analyze constraints and legal risks", index)
+        constraints = analyze_constraints(call, objective, jurisdiction, docs_summary, build_evidence_block(retrieved))
+        clause_emit({"type": "constraints", "constraints": constraints})
+        progress(f"Clause {index + 1}: constraints analysed")
+
+        announce("Draft initial clause version", index)
+        clause_part, explanation_part = split_drafting_notes(
+            draft_initial_clause(call, objective, constraints, firm_style)
+        )
+        clause_emit({"type": "initial_clause", "clause": clause_part, "notes": explanation_part})
+        progress(f"Clause {index + 1}: drafted")
+
+        current_clause = clause_part
+        reviews = 0
+        for i in range(review_rounds):
+            if not budget.can_afford(1):
+                break
+            clause_emit({"type": "heading", "text": f"### Review Round {i+1}"})
+            try:
+                if review_mode == "panel":
+                    current_clause = run_panel_review(
+                        call, objective, jurisdiction, firm_style, constraints, current_clause, i + 1,
+                        clause_emit, lambda label: announce(label, index)
+                    )
+                elif use_edits_mode(current_clause, review_mode):
+                    announce("Review clause (edits only)", index)
+                    current_clause = run_edits_review(call, objective, current_clause, i + 1, clause_emit)
+                else:
+                    announce("Review and refine clause", index)
+                    current_clause = run_full_review(call, objective, current_clause, i + 1, clause_emit)
+            except DeadlineExceeded:
+                break
+            reviews += 1
+            progress(f"Clause {index + 1}: review {i + 1} completed")
+
+        if reviews < review_rounds:
+            clause_emit({"type": "budget", "skipped": f"{review_rounds - reviews} review round(s)"})
+        return current_clause, reviews
+
+    def draft_clause_safely(index):
+        try:
+            with span(f"Clause {index + 1}", "step"):
+                return draft_clause(index)
+        except RunCancelled:
+            raise
+        except Exception as e:
+            # One failed clause does not sink the agreement
+            emit({"type": "clause_failed", "clause_index": index, "error_type": type(e).__name__, "message": str(e)})
+            return e
+
+    # At most max_parallel clauses of this run in flight at once
+    executor = get_clause_executor()
+    draft_clause_safely = propagate(draft_clause_safely)
+    outcomes = [None] * len(objectives)
+    waiting = list(range(len(objectives)))
+    running = {}
+    try:
+        while waiting or running:
+            while waiting and len(running) < max(1, max_parallel):
+                index = waiting.pop(0)
+                running[executor.submit(draft_clause_safely, index)] = index
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                outcomes[running.pop(future)] = future.result()
+    except (RunCancelled, DeadlineExceeded):
+        # Nothing of the run may keep going once it is reported: clauses still
+        # queued on the shared pool are dropped, running ones stop at their
+        # next check of the shared budget
+        for future in running:
+            future.cancel()
+        wait(running)
+        raise
+
+    drafted = [(i, o) for i, o in enumerate(outcomes) if not isinstance(o, Exception)]
+    if not drafted:
+        raise outcomes[0]
+
+    # ====================================================================
+    # Assembly: renumber, check, export
+    # ====================================================================
+    step("Assembly")
+    progress("Assembling agreement...")
+    emit({"type": "heading", "text": "## Agreement"})
+
+    clauses = [renumber_clause(clause, number) for number, (_, (clause, _)) in enumerate(drafted, start=1)]
+    issues = check_contract(clauses)
+    issues += [
+        {"clause": None, "kind": "missing_clause",
+         "message": f'"{clause_title(objectives[i])}" could not be drafted ({type(o).__name__}) and is not included'}
+        for i, o in enumerate(outcomes) if isinstance(o, Exception)
+    ]
+    emit({"type": "contract_checks", "issues": issues})
+
+    contract_text = "\n\n".join(clauses)
+    metadata = {
+        "timestamp": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+        "objective": f"Agreement of {len(clauses)} clauses: " + "; ".join(clause_title(objectives[i]) for i, _ in drafted),
+        "jurisdiction": jurisdiction or "Not specified",
+        "style": firm_style,
+        "ai_calls": calls["count"]
+    }
+    docx_bytes = create_docx(contract_text, metadata).getvalue()
+    emit({"type": "final", "clause": contract_text, "docx": docx_bytes})
+
+    if library is not None:
+        hashes = document_hashes(uploaded_files)
+        for clause_index, (clause, _) in drafted:
+            library.add(objectives[clause_index], jurisdiction, firm_style, clause, doc_hashes=hashes)
+
+    reviews_done = min(reviews for _, (_, reviews) in drafted)
+    emit({
+        "type": "complete",
+        "ai_calls": calls["count"],
+        "num_refinements": reviews_done,
+        "documents": len(texts),
+        "tokens_saved": tokens_saved,
+        "clauses": len(clauses),
+        "elapsed": time.monotonic() - started,
+    })
+
+    return {
+        "clauses": clauses,
+        "contract": contract_text,
+        "issues": issues,
+        "metadata": metadata,
+        "ai_calls": calls["count"]
+    }
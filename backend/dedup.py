@@ -0,0 +1,200 @@
+"""
+Near-duplicate passage elimination across uploaded documents
+
+Users often upload several versions of the same precedent, or guides that
+repeat the same standard lists. Before the documents are summarised
+(Step 2) and quoted as evidence (Step 3), each document is split into
+passages (blank-line separated paragraphs, or lines for text without blank
+lines such as extracted .docx paragraphs) and every passage that is
+identical or nearly identical to one seen earlier is dropped, so it is only
+paid for once in every prompt.
+
+Near-duplicates are found with MinHash + LSH: each passage is reduced to the
+set of its word 5-gram shingles, a 32-value MinHash signature is computed,
+and passages sharing any of the 8 signature bands become candidate pairs.
+Candidates are confirmed with the exact Jaccard similarity of their shingle
+sets (``threshold``, default 0.8). The first occurrence is kept and remembers
+every file the passage appeared in (provenance).
+"""
+
+import itertools
+import random
+import re
+import zlib
+
+from backend.tracing import traced
+
+SHINGLE_SIZE = 5
+NUM_PERMUTATIONS = 32
+BANDS = 8
+ROWS_PER_BAND = NUM_PERMUTATIONS // BANDS
+
+_PRIME = (1 << 61) - 1
+_rng = random.Random(20240611)
+_PERMUTATIONS = [(_rng.randrange(1, _PRIME), _rng.randrange(0, _PRIME)) for _ in range(NUM_PERMUTATIONS)]
+
+
+def estimate_tokens(text):
+    """Rough token count for English prompt text (~4 characters per token)."""
+    return len(text) // 4
+
+
+def passage_spans(text):
+    """
+    Locate the passages of a document
+
+    Passages are blank-line separated paragraphs. Text without any blank
+    line (.docx text is extracted one paragraph per line) is split into
+    lines instead, so a Word document does not become a single passage.
+
+    Returns:
+        list: (start, end) offsets of each passage in ``text``, surrounding whitespace excluded
+    """
+    spans = []
+    start = 0
+    for separator in re.finditer(r"\r?\n\s*\r?\n", text):
+        _add_span(spans, text, start, separator.start())
+        start = separator.end()
+    _add_span(spans, text, start, len(text))
+    if len(spans) == 1 and "\n" in text[spans[0][0]:spans[0][1]]:
+        first, last = spans[0]
+        spans = []
+        for line in re.finditer(r"[^\n]+", text[first:last]):
+            _add_span(spans, text, first + line.start(), first + line.end())
+    return spans
+
+
+def _add_span(spans, text, start, end):
+    segment = text[start:end]
+    stripped = segment.strip()
+    if stripped:
+        start += len(segment) - len(segment.lstrip())
+        spans.append((start, start + len(stripped)))
+
+
+def split_passages(text):
+    """Split a document into passages (see passage_spans)."""
+    return [text[start:end] for start, end in passage_spans(text)]
+
+
+def _normalise(passage):
+    return re.findall(r"[a-z0-9]+", passage.lower())
+
+
+def shingles(words):
+    """Hashed word ``SHINGLE_SIZE``-grams of a passage."""
+    if len(words) < SHINGLE_SIZE:
+        return {zlib.crc32(" ".join(words).encode("utf-8"))}
+    return {
+        zlib.crc32(" ".join(words[i:i + SHINGLE_SIZE]).encode("utf-8"))
+        for i in range(len(words) - SHINGLE_SIZE + 1)
+    }
+
+
+def minhash(shingle_set):
+    """MinHash signature of a shingle set."""
+    return [min((a * h + b) % _PRIME for h in shingle_set) for a, b in _PERMUTATIONS]
+
+
+def jaccard(a, b):
+    return len(a & b) / len(a | b) if a and b else 0.0
+
+
+@traced()
+def deduplicate_passages(texts, threshold=0.8, min_words=8):
+    """
+    Drop passages that duplicate an earlier passage (in any uploaded document)
+
+    Args:
+        texts: [{"filename", "text"}, ...] as returned by extract_text_from_uploaded_files.
+            Documents from the document store also carry "passages", the
+            passage_spans computed when they were added, and are not split again
+        threshold: Jaccard similarity of shingle sets above which passages are duplicates
+        min_words: Shorter passages (headings, list labels) are always kept
+
+    Returns:
+        tuple: (deduplicated texts, report). Each document carries "source", its
+        position in ``texts`` (versions of a document often share a filename),
+        and "passages", the spans of its passages.
+        Documents left with nothing but short passages (headings) are dropped.
+        report = {
+            "passages": total passages seen,
+            "removed": passages dropped,
+            "tokens_removed": estimated tokens dropped from the documents,
+            "duplicates": [{"passage": preview, "files": [kept in, also in, ...]}, ...]
+        }
+    """
+    kept = []          # (shingle set, provenance dict) of kept passages
+    exact = {}         # normalised text -> index into kept
+    buckets = {}       # (band, band signature) -> [index into kept]
+    result = []
+    total = removed = tokens_removed = 0
+
+    for position, item in enumerate(texts):
+        spans = item["passages"] if "passages" in item else passage_spans(item["text"])
+        passages = [item["text"][start:end] for start, end in spans]
+        kept_passages = []
+        kept_content = 0  # kept passages that are not just headings/labels
+        for passage in passages:
+            total += 1
+            words = _normalise(passage)
+            if len(words) < min_words:
+                kept_passages.append(passage)
+                continue
+
+            key = " ".join(words)
+            match = exact.get(key)
+            signature = None
+            if match is None:
+                shingle_set = shingles(words)
+                signature = minhash(shingle_set)
+                candidates = set()
+                for band in range(BANDS):
+                    band_key = (band, tuple(signature[band * ROWS_PER_BAND:(band + 1) * ROWS_PER_BAND]))
+                    candidates.update(buckets.get(band_key, ()))
+                for index in sorted(candidates):
+                    if jaccard(shingle_set, kept[index][0]) >= threshold:
+                        match = index
+                        break
+
+            if match is not None:
+                provenance = kept[match][1]
+                if item["filename"] not in provenance["files"]:
+                    provenance["files"].append(item["filename"])
+                provenance["count"] += 1
+                removed += 1
+                tokens_removed += estimate_tokens(passage)
+                continue
+
+            index = len(kept)
+            kept.append((shingle_set, {"passage": passage[:200], "files": [item["filename"]], "count": 1}))
+            exact[key] = index
+            for band in range(BANDS):
+                band_key = (band, tuple(signature[band * ROWS_PER_BAND:(band + 1) * ROWS_PER_BAND]))
+                buckets.setdefault(band_key, []).append(index)
+            kept_passages.append(passage)
+            kept_content += 1
+
+        if len(kept_passages) == len(passages):
+            # Nothing removed: keep the original text untouched
+            result.append(dict(item, passages=spans, source=position))
+        elif kept_content:
+            text = "\n\n".join(kept_passages)
+            offsets = list(itertools.accumulate(len(p) + 2 for p in kept_passages[:-1]))
+            result.append({
+                "filename": item["filename"],
+                "text": text,
+                "passages": [(start, start + len(p)) for start, p in zip([0] + offsets, kept_passages)],
+                "source": position,
+            })
+
+    report = {
+        "passages": total,
+        "removed": removed,
+        "tokens_removed": tokens_removed,
+        "duplicates": [
+            {"passage": provenance["passage"], "files": provenance["files"]}
+            for _, provenance in kept if provenance["count"] > 1
+        ],
+    }
+    return result, report
@@ -0,0 +1,207 @@
+"""
+Diff-based review rounds for long clauses
+
+In the default review mode every Step 5 round resends the whole clause and
+gets back a full rewrite, so output tokens (and latency) grow with clause
+length and long clauses can be cut off at max_tokens. In edits mode the
+clause is sent as numbered subclauses ([S1], [S2], ...) and the model
+returns only edit commands:
+
+    REPLACE S3: <new text of subclause 3>
+    INSERT AFTER S4: <text of a new subclause>
+    DELETE S5
+
+which are applied locally to rebuild the clause. Output then scales with the
+number of changes, not with the length of the clause.
+
+"auto" mode (the default) only switches to edits once a clause reaches
+DIFF_REVIEW_MIN_CHARS characters (default 1500); short clauses are cheap to
+rewrite and benefit from a full pass.
+"""
+
+import difflib
+import os
+import re
+
+DEFAULT_EDITS_MODE_MIN_CHARS = 1500
+
+EDIT_PATTERN = re.compile(
+    r"^\s*[-•*]?\s*(REPLACE|INSERT AFTER|INSERT BEFORE|DELETE)\s+S(\d+)\s*:?\s*(.*)$",
+    re.IGNORECASE,
+)
+
+# A notes header line: "[Revision Notes]", "Revision Notes:", "**[Revision Notes]**", ...
+# The words inside edit text ("as set out in the revision notes") are not a header
+NOTES_PATTERN = re.compile(r"^[\W_]*revision notes(?:[\]*]+|\s*:|\s*$)[\]*:\s]*(.*)$", re.IGNORECASE)
+
+
+def split_subclauses(clause):
+    """Split a clause into subclauses, one per non-empty line."""
+    return [line.rstrip() for line in clause.split("\n") if line.strip()]
+
+
+def number_subclauses(subclauses):
+    """Render subclauses as ``[S1] text`` lines for the review prompt."""
+    return "\n".join(f"[S{i}] {text}" for i, text in enumerate(subclauses, start=1))
+
+
+def parse_edits(response):
+    """
+    Parse edit commands and revision notes from an edits-mode review
+
+    Args:
+        response: Raw model response
+
+    Returns:
+        tuple: (edits, notes) - edits is a list of (operation, subclause number, text);
+        None instead of a list when the response contains no [Edits] section
+    """
+    if "[Edits]" not in response and not EDIT_PATTERN.search(response.split("\n", 1)[0]):
+        return None, ""
+
+    lines = response.split("[Edits]", 1)[-1].split("\n")
+    notes = ""
+    for index, line in enumerate(lines):
+        # Any form of the notes header ends the edits
+        match = NOTES_PATTERN.match(line)
+        if match:
+            notes = "\n".join([match.group(1)] + lines[index + 1:])
+            lines = lines[:index]
+            break
+
+    edits = []
+    for line in lines:
+        match = EDIT_PATTERN.match(line)
+        if match:
+            operation, number, text = match.groups()
+            edits.append((operation.upper(), int(number), text.strip()))
+        elif line.strip() and edits and edits[-1][0] != "DELETE" and line.strip().upper() != "NONE":
+            # Continuation line of a multi-line replacement / insertion
+            operation, number, text = edits[-1]
+            edits[-1] = (operation, number, f"{text}\n{line.rstrip()}")
+    return edits, notes.strip()
+
+
+def _edit_plan(count, edits):
+    """
+    Group edit commands by the subclause they target
+
+    Returns:
+        tuple: (replaced, deleted, before, after, number of edits applied)
+    """
+    replaced = {}
+    deleted = set()
+    before = {}
+    after = {}
+    applied = 0
+    for operation, number, text in edits:
+        if not 1 <= number <= count:
+            continue
+        if operation == "DELETE":
+            deleted.add(number)
+        elif operation == "REPLACE" and text:
+            replaced[number] = text
+        elif operation == "INSERT AFTER" and text:
+            after.setdefault(number, []).append(text)
+        elif operation == "INSERT BEFORE" and text:
+            before.setdefault(number, []).append(text)
+        else:
+            continue
+        applied += 1
+    return replaced, deleted, before, after, applied
+
+
+def apply_edits(subclauses, edits):
+    """
+    Apply edit commands to a list of subclauses
+
+    Subclause numbers always refer to the numbering that was sent to the
+    model, so edits are applied against the original positions. Edits that
+    reference unknown subclauses are ignored.
+
+    Returns:
+        tuple: (new subclauses, number of edits applied)
+    """
+    replaced, deleted, before, after, applied = _edit_plan(len(subclauses), edits)
+    result = []
+    for number, text in enumerate(subclauses, start=1):
+        result.extend(before.get(number, []))
+        if number not in deleted:
+            result.append(replaced.get(number, text))
+        result.extend(after.get(number, []))
+    return result, applied
+
+
+def edit_clause(clause, edits):
+    """
+    Apply edit commands to a clause in place
+
+    Like apply_edits, with subclauses numbered as by split_subclauses, but
+    only the edited lines change: blank lines between paragraphs and
+    unedited lines are kept exactly as they were. A blank line left doubled
+    by a deleted subclause is dropped.
+
+    Returns:
+        tuple: (new clause text, number of edits applied)
+    """
+    lines = clause.split("\n")
+    count = sum(1 for line in lines if line.strip())
+    replaced, deleted, before, after, applied = _edit_plan(count, edits)
+    if not applied:
+        return clause, 0
+
+    result = []
+    number = 0
+    just_deleted = False
+    for line in lines:
+        if not line.strip():
+            if not (just_deleted and (not result or not result[-1].strip())):
+                result.append(line)
+            just_deleted = False
+            continue
+        number += 1
+        result.extend(before.get(number, []))
+        if number in deleted:
+            just_deleted = not after.get(number)
+        else:
+            result.append(replaced.get(number, line))
+            just_deleted = False
+        result.extend(after.get(number, []))
+    while result and not result[-1].strip() and lines[-1].strip():
+        result.pop()  # Separator of a deleted last subclause
+    return "\n".join(result), applied
+
+
+def clause_diff(old_clause, new_clause):
+    """Unified diff between two versions of a clause (for display)."""
+    return "\n".join(difflib.unified_diff(
+        old_clause.split("\n"),
+        new_clause.split("\n"),
+        fromfile="previous",
+        tofile="revised",
+        lineterm="",
+    ))
+
+
+def edits_mode_min_chars():
+    """Clause length from which "auto" reviews in edits mode (DIFF_REVIEW_MIN_CHARS)."""
+    return int(os.getenv("DIFF_REVIEW_MIN_CHARS", str(DEFAULT_EDITS_MODE_MIN_CHARS)))
+
+
+def use_edits_mode(clause, review_mode="auto", min_chars=None):
+    """
+    Whether a review round should run in edits mode
+
+    Args:
+        clause: Clause about to be reviewed
+        review_mode: "full", "edits" or "auto"
+        min_chars: Clause length from which "auto" uses edits mode
+            (default DIFF_REVIEW_MIN_CHARS)
+    """
+    if review_mode == "edits":
+        return True
+    if review_mode != "auto":
+        return False
+    if min_chars is None:
+        min_chars = edits_mode_min_chars()
+    return len(clause) >= min_chars and len(split_subclauses(clause)) > 1
@@ -0,0 +1,315 @@
+"""
+Bounded-memory document store shared by all sessions
+
+Uploaded documents used to travel with each run as raw bytes: copied into
+the job's parameters (kept for an hour after the job finishes), into the
+pending library-match state, and re-extracted by every run. The store keeps
+one compact copy per distinct document instead:
+
+* Documents are content-addressed (SHA-256 of the upload), so the same
+  precedent uploaded by ten sessions, or re-submitted ten times, is held once.
+* Only the extracted text is kept; the raw upload bytes are dropped after
+  extraction. Runs and session state carry small references
+  ({"id", "name", "sha256", "size"}).
+* The passage offsets of each document (dedup.passage_spans) are computed
+  once when it is added and stay in memory when its text is spilled, so
+  runs do not split the same document again.
+* Each session may reference at most ``session_quota`` bytes of text
+  (DOC_STORE_SESSION_MB); a submission over quota is refused.
+* Text held in memory is capped at ``memory_quota`` bytes (DOC_STORE_MEMORY_MB);
+  beyond that the least recently used documents are spilled to files in a
+  temporary directory (DOC_STORE_SPILL_DIR) and read back on use.
+* A document is dropped as soon as no session or run references it.
+  Sessions release their documents when they submit a new set, when the
+  Streamlit session ends (see SessionHandle) or after ``session_ttl``
+  seconds idle. A submitted run holds its own documents until it finishes,
+  so a session replacing its set does not pull them from under the run.
+"""
+
+import os
+import shutil
+import sys
+import tempfile
+import threading
+import time
+import weakref
+from collections import OrderedDict
+from hashlib import sha256
+
+from backend.dedup import passage_spans
+from backend.documents import extract_text_from_uploaded_files
+
+
+class DocumentQuotaExceeded(Exception):
+    """Raised when a session's documents would exceed its quota."""
+
+
+def _text_bytes(text):
+    # What the str actually occupies in this process
+    return sys.getsizeof(text)
+
+
+def process_rss_bytes():
+    """Resident set size of this process, or None where /proc is unavailable."""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError):
+        return None
+
+
+class SessionHandle:
+    """
+    Session-state token that releases a session's documents when it is garbage collected
+
+    Streamlit drops a session's state when the browser session ends; the
+    handle stored there goes with it and triggers ``release_session``.
+    """
+
+    def __init__(self, store, session_id):
+        self.session_id = session_id
+        weakref.finalize(self, store.release_session, session_id)
+
+
+class DocumentStore:
+    """
+    Content-addressed store of extracted document text with quotas and spill-to-disk
+
+    Args:
+        session_quota: Maximum text bytes referenced by one session
+        memory_quota: Maximum text bytes held in memory before spilling
+        session_ttl: Seconds after which an idle session's documents are released
+        spill_dir: Directory for spilled documents (default: a new temporary directory)
+    """
+
+    def __init__(self, session_quota=20 << 20, memory_quota=128 << 20, session_ttl=3600, spill_dir=None):
+        self.session_quota = session_quota
+        self.memory_quota = memory_quota
+        self.session_ttl = session_ttl
+        self.spill_dir = spill_dir or tempfile.mkdtemp(prefix="clause-docs-")
+        os.makedirs(self.spill_dir, exist_ok=True)
+        if spill_dir is None:
+            weakref.finalize(self, shutil.rmtree, self.spill_dir, True)
+        # doc id -> {"name", "size", "text" (None once spilled), "passages", "path", "sessions"}
+        self._docs = OrderedDict()  # LRU order: oldest first
+        self._sessions = {}  # session / run id -> {"docs": set of doc ids, "touched": time[, "run": True]}
+        self._memory_bytes = 0
+        self._spilled_bytes = 0
+        self._spills = 0
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_env(cls):
+        """Build a store sized from DOC_STORE_SESSION_MB / DOC_STORE_MEMORY_MB / DOC_STORE_SPILL_DIR."""
+        return cls(
+            session_quota=int(float(os.getenv("DOC_STORE_SESSION_MB", "20")) * (1 << 20)),
+            memory_quota=int(float(os.getenv("DOC_STORE_MEMORY_MB", "128")) * (1 << 20)),
+            spill_dir=os.getenv("DOC_STORE_SPILL_DIR") or None,
+        )
+
+    def put_session_documents(self, session_id, uploads):
+        """
+        Replace a session's document set with new uploads
+
+        Text is extracted once per distinct document; documents the session
+        no longer references are released.
+
+        Args:
+            session_id: Owning session
+            uploads: [{"name", "data"}, ...] as returned by read_uploaded_files
+
+        Returns:
+            list: References [{"id", "name", "sha256", "size"} or {"name", "error"}, ...]
+
+        Raises:
+            DocumentQuotaExceeded: The documents exceed the session quota
+        """
+        refs = []
+        new_docs = {}
+        upload_by_id = {}
+        for upload in uploads:
+            doc_id = sha256(upload["data"]).hexdigest()
+            upload_by_id[doc_id] = upload
+            with self._lock:
+                known = self._docs.get(doc_id)
+                size = known["size"] if known else None
+            if known is None:
+                texts, failed_files = extract_text_from_uploaded_files([upload])
+                if failed_files:
+                    refs.append({"name": upload["name"], "error": failed_files[0]})
+                    continue
+                text = texts[0]["text"]
+                size = _text_bytes(text)
+                new_docs[doc_id] = {"name": upload["name"], "size": size, "text": text, "passages": passage_spans(text)}
+            refs.append({"id": doc_id, "name": upload["name"], "sha256": doc_id, "size": size})
+
+        total = sum({ref["id"]: ref["size"] for ref in refs if "id" in ref}.values())
+        if total > self.session_quota:
+            raise DocumentQuotaExceeded(
+                f"The uploaded documents need {total / (1 << 20):.1f} MB of text, more than the "
+                f"{self.session_quota / (1 << 20):.1f} MB allowed per session. Please upload fewer or smaller documents."
+            )
+
+        with self._lock:
+            session = self._sessions.setdefault(session_id, {"docs": set(), "touched": time.time()})
+            for ref in refs:
+                if "id" not in ref:
+                    continue
+                doc = self._docs.get(ref["id"])
+                if doc is None:
+                    if ref["id"] not in new_docs:
+                        # Released by its last other session since it was looked up
+                        texts, _ = extract_text_from_uploaded_files([upload_by_id[ref["id"]]])
+                        text = texts[0]["text"]
+                        new_docs[ref["id"]] = {
+                            "name": ref["name"], "size": ref["size"], "text": text, "passages": passage_spans(text),
+                        }
+                    doc = dict(new_docs[ref["id"]], path=None, sessions=set())
+                    self._docs[ref["id"]] = doc
+                    self._memory_bytes += doc["size"]
+                doc["sessions"].add(session_id)
+                self._docs.move_to_end(ref["id"])
+            previous = session["docs"]
+            session["docs"] = {ref["id"] for ref in refs if "id" in ref}
+            session["touched"] = time.time()
+            for doc_id in previous - session["docs"]:
+                self._unreference(doc_id, session_id)
+            self._spill_over_quota()
+            self._expire_idle_sessions()
+        return refs
+
+    def hold_documents(self, holder_id, refs):
+        """
+        Keep documents referenced by ``holder_id`` (e.g. a run) until ``release_session(holder_id)``
+
+        Documents already released are skipped; load_texts reports them as expired.
+
+        Args:
+            holder_id: Holder, distinct from every session id
+            refs: References returned by put_session_documents
+        """
+        with self._lock:
+            holder = self._sessions.setdefault(holder_id, {"docs": set(), "touched": time.time(), "run": True})
+            for ref in refs:
+                doc = self._docs.get(ref.get("id"))
+                if doc is not None:
+                    doc["sessions"].add(holder_id)
+                    holder["docs"].add(ref["id"])
+
+    def load_texts(self, refs):
+        """
+        Texts for a run, in the shape of extract_text_from_uploaded_files
+
+        Returns:
+            tuple: (texts, failed_files) - texts is a list of {"filename", "text", "passages"},
+            "passages" being the passage offsets computed when the document was added
+        """
+        texts = []
+        failed_files = []
+        for ref in refs:
+            if "error" in ref:
+                failed_files.append(ref["error"])
+                continue
+            text, passages = self._load(ref["id"])
+            if text is None:
+                failed_files.append(f"{ref['name']} (expired - please upload it again)")
+            else:
+                texts.append({"filename": ref["name"], "text": text, "passages": passages})
+        return texts, failed_files
+
+    def text(self, doc_id):
+        """Text of a document (read back from disk if spilled), or None if released."""
+        return self._load(doc_id)[0]
+
+    def _load(self, doc_id):
+        # (text, passages) of a document, (None, None) if released
+        with self._lock:
+            doc = self._docs.get(doc_id)
+            if doc is None:
+                return None, None
+            self._docs.move_to_end(doc_id)
+            for session_id in doc["sessions"]:
+                self._sessions[session_id]["touched"] = time.time()
+            if doc["text"] is not None:
+                return doc["text"], doc["passages"]
+            path = doc["path"]
+            passages = doc["passages"]
+        try:
+            with open(path, encoding="utf-8", newline="") as f:
+                return f.read(), passages
+        except OSError:
+            return None, None  # Released while being read
+
+    def release_session(self, session_id):
+        """Drop a session's references; documents no one references are deleted."""
+        with self._lock:
+            session = self._sessions.pop(session_id, None)
+            if session is None:
+                return
+            for doc_id in session["docs"]:
+                self._unreference(doc_id, session_id)
+
+    def session_bytes(self, session_id):
+        """Text bytes referenced by a session (counted against its quota)."""
+        with self._lock:
+            session = self._sessions.get(session_id)
+            if session is None:
+                return 0
+            return sum(self._docs[doc_id]["size"] for doc_id in session["docs"])
+
+    def stats(self):
+        """Memory gauges for display."""
+        with self._lock:
+            return {
+                "documents": len(self._docs),
+                "sessions": sum(1 for s in self._sessions.values() if not s.get("run")),
+                "memory_bytes": self._memory_bytes,
+                "memory_quota": self.memory_quota,
+                "spilled_documents": sum(1 for d in self._docs.values() if d["text"] is None),
+                "spilled_bytes": self._spilled_bytes,
+                "spills": self._spills,
+                "session_quota": self.session_quota,
+                "process_rss": process_rss_bytes(),
+            }
+
+    def _unreference(self, doc_id, session_id):
+        # Caller holds self._lock
+        doc = self._docs.get(doc_id)
+        if doc is None:
+            return
+        doc["sessions"].discard(session_id)
+        if doc["sessions"]:
+            return
+        del self._docs[doc_id]
+        if doc["text"] is None:
+            self._spilled_bytes -= doc["size"]
+            try:
+                os.remove(doc["path"])
+            except OSError:
+                pass
+        else:
+            self._memory_bytes -= doc["size"]
+
+    def _spill_over_quota(self):
+        # Caller holds self._lock; least recently used documents go first
+        for doc_id, doc in self._docs.items():
+            if self._memory_bytes <= self.memory_quota:
+                break
+            if doc["text"] is None:
+                continue
+            path = os.path.join(self.spill_dir, f"{doc_id}.txt")
+            with open(path, "w", encoding="utf-8", newline="") as f:
+                f.write(doc["text"])
+            doc["text"] = None
+            doc["path"] = path
+            self._memory_bytes -= doc["size"]
+            self._spilled_bytes += doc["size"]
+            self._spills += 1
+
+    def _expire_idle_sessions(self):
+        # Caller holds self._lock; backstop for sessions whose end was not observed
+        cutoff = time.time() - self.session_ttl
+        for session_id in [s for s, info in self._sessions.items() if info["touched"] < cutoff]:
+            session = self._sessions.pop(session_id)
+            for doc_id in session["docs"]:
+                self._unreference(doc_id, session_id)
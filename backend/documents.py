@@ -0,0 +1,225 @@
+"""
+Document handling: text extraction from uploads and Word export
+
+python-docx is imported inside the functions that need it so that loading
+this module (and the page) stays cheap.
+"""
+
+import re
+from io import BytesIO
+
+from backend.tracing import traced
+
+
+def read_uploaded_files(uploaded_files):
+    """
+    Snapshot Streamlit uploads into plain dicts
+    
+    UploadedFile objects belong to the browser session, so they are copied
+    to bytes before a job is handed to a worker thread.
+    
+    Args:
+        uploaded_files: Streamlit UploadedFile list
+        
+    Returns:
+        list: [{"name": str, "data": bytes}, ...]
+    """
+    return [{"name": f.name, "data": f.getvalue()} for f in uploaded_files or []]
+
+
+@traced()
+def extract_text_from_uploaded_files(uploaded_files):
+    """
+    Extract plain text from uploaded documents
+    
+    1. .docx files are parsed with python-docx
+    2. .txt / .md (and anything else) are decoded as UTF-8, then latin-1
+    3. Empty or unreadable files are reported back instead of raised
+    
+    Args:
+        uploaded_files: list of {"name": str, "data": bytes}
+        
+    Returns:
+        tuple: (texts, failed_files) - texts is a list of {"filename", "text"}
+    """
+    texts = []
+    failed_files = []
+    
+    for uploaded in uploaded_files:
+        try:
+            if uploaded["name"].lower().endswith(".docx"):
+                # Word
+                from docx import Document
+                doc = Document(BytesIO(uploaded["data"]))
+                text = "\n".join([p.text for p in doc.paragraphs])
+            else:
+                # .txt / .md / other
+                content = uploaded["data"]
+                try:
+                    text = content.decode("utf-8")
+                except UnicodeDecodeError:
+                    text = content.decode("latin-1")
+            
+            # 
+            if text.strip():
+                texts.append({"filename": uploaded["name"], "text": text})
+            else:
+                failed_files.append(f"{uploaded['name']} ()")
+                
+        except Exception as e:
+            failed_files.append(f"{uploaded['name']} (: {str(e)})")
+    
+    return texts, failed_files
+
+
+@traced()
+def create_docx(clause_text, metadata):
+    """
+    Create a professional Word document with proper legal formatting
+    
+    Args:
+        clause_text: The clause content
+        metadata: Document metadata (timestamp, objective, etc.)
+        
+    Returns:
+        BytesIO: Document binary stream
+    """
+    from docx import Document
+    from docx.shared import Pt, RGBColor
+    from docx.enum.text import WD_ALIGN_PARAGRAPH
+    
+    doc = Document()
+    
+    # Title - Professional Legal Document Style
+    title = doc.add_heading(level=1)
+    title_run = title.add_run("CONTRACT CLAUSE")
+    title_run.font.name = 'Times New Roman'
+    title_run.font.size = Pt(16)
+    title_run.font.bold = True
+    title.alignment = WD_ALIGN_PARAGRAPH.CENTER
+    
+    doc.add_paragraph()  # Spacing
+    
+    # Document Information Section
+    info_heading = doc.add_heading("DOCUMENT INFORMATION", level=2)
+    info_heading.runs[0].font.name = 'Times New Roman'
+    info_heading.runs[0].font.size = Pt(12)
+    
+    # Metadata table-style layout
+    info_para = doc.add_paragraph()
+    info_para.add_run("Date Generated: ").bold = True
+    info_para.add_run(f"{metadata.get('timestamp', 'N/A')}")
+    for run in info_para.runs:
+        run.font.name = 'Times New Roman'
+        run.font.size = Pt(11)
+    
+    info_para = doc.add_paragraph()
+    info_para.add_run("Drafting Objective: ").bold = True
+    info_para.add_run(f"{metadata.get('objective', 'N/A')}")
+    for run in info_para.runs:
+        run.font.name = 'Times New Roman'
+        run.font.size = Pt(11)
+    
+    info_para = doc.add_paragraph()
+    info_para.add_run("Jurisdiction: ").bold = True
+    info_para.add_run(f"{metadata.get('jurisdiction', 'Not specified')}")
+    for run in info_para.runs:
+        run.font.name = 'Times New Roman'
+        run.font.size = Pt(11)
+    
+    info_para = doc.add_paragraph()
+    info_para.add_run("Drafting Style: ").bold = True
+    info_para.add_run(f"{metadata.get('style', 'N/A')}")
+    for run in info_para.runs:
+        run.font.name = 'Times New Roman'
+        run.font.size = Pt(11)
+    
+    doc.add_paragraph()  # Spacing
+    
+    # Clause Content Section
+    clause_heading = doc.add_heading("CLAUSE PROVISIONS", level=2)
+    clause_heading.runs[0].font.name = 'Times New Roman'
+    clause_heading.runs[0].font.size = Pt(12)
+    
+    doc.add_paragraph()  # Spacing before clause
+    
+    # Add clause text with proper formatting (remove all markdown and LaTeX artifacts)
+    
+    # Function to clean LaTeX formatting
+    def clean_latex(text):
+        # Remove display math delimiters \[ \]
+        text = re.sub(r'\\\[(.*?)\\\]', r'\1', text, flags=re.DOTALL)
+        # Remove inline math delimiters \( \)
+        text = re.sub(r'\\\((.*?)\\\)', r'\1', text, flags=re.DOTALL)
+        # Remove $$ $$ delimiters
+        text = re.sub(r'\$\$(.*?)\$\$', r'\1', text, flags=re.DOTALL)
+        # Remove $ $ delimiters
+        text = re.sub(r'\$(.*?)\$', r'\1', text)
+        # Replace LaTeX commands with readable text
+        text = text.replace(r'\text{', '').replace('}', '')
+        text = text.replace(r'\times', '×')
+        text = text.replace(r'\%', '%')
+        # Replace \frac{a}{b} with (a / b)
+        text = re.sub(r'\\frac\{([^}]*)\}\{([^}]*)\}', r'(\1 / \2)', text)
+        # Remove remaining backslashes
+        text = text.replace('\\', '')
+        return text
+    
+    # Split into lines and process each
+    lines = clause_text.split('\n')
+    
+    for line in lines:
+        if not line.strip():
+            continue  # Skip empty lines
+            
+        # Remove markdown formatting
+        clean_line = line.replace("**", "").replace("*", "")
+        # Remove markdown headers but keep the text
+        clean_line = re.sub(r'^#{1,6}\s+', '', clean_line)
+        # Clean LaTeX formatting
+        clean_line = clean_latex(clean_line)
+        
+        # Check if this looks like a header (was markdown header or is short and looks like title)
+        if line.startswith('#'):
+            # This was a markdown header - make it a sub-heading in Word
+            heading_para = doc.add_paragraph(clean_line)
+            heading_para.runs[0].bold = True
+            heading_para.runs[0].font.name = 'Times New Roman'
+            heading_para.runs[0].font.size = Pt(11)
+            heading_para.paragraph_format.space_before = Pt(6)
+        else:
+            # Regular paragraph
+            clause_para = doc.add_paragraph(clean_line)
+            clause_para.paragraph_format.line_spacing = 1.15
+            for run in clause_para.runs:
+                run.font.name = 'Times New Roman'
+                run.font.size = Pt(11)
+    
+    doc.add_paragraph()  # Spacing after clause
+    
+    # Professional Disclaimer
+    disclaimer_heading = doc.add_heading("DISCLAIMER", level=2)
+    disclaimer_heading.runs[0].font.name = 'Times New Roman'
+    disclaimer_heading.runs[0].font.size = Pt(12)
+    
+    disclaimer = doc.add_paragraph()
+    disclaimer.add_run(
+        "This document has been generated using artificial intelligence technology "
+        "and is provided for informational purposes only. It does not constitute "
+        "legal advice, and should not be relied upon as such. Users should consult "
+        "with qualified legal professionals before using any content from this document "
+        "in actual legal agreements or contracts. The creators and distributors of this "
+        "tool disclaim all liability for any damages arising from the use of this document."
+    )
+    disclaimer.paragraph_format.line_spacing = 1.15
+    for run in disclaimer.runs:
+        run.font.name = 'Times New Roman'
+        run.font.size = Pt(9)
+        run.font.italic = True
+    
+    # Save to memory
+    bio = BytesIO()
+    doc.save(bio)
+    bio.seek(0)
+    
+    return bio
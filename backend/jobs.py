@@ -0,0 +1,283 @@
+"""
+Job queue and bounded worker pool
+
+Clause generation runs as a job on a fixed number of worker threads instead
+of inside the Streamlit script. The page submits a job, keeps the job id in
+session state and renders whatever events the job has published so far on
+each rerun, so a run survives browser disconnects and the number of runs
+hitting the API at once is capped by ``max_workers`` no matter how many tabs
+are open.
+
+Capacity is configured through environment variables (see backend/.env.example):
+
+    JOB_WORKERS        concurrent runs (default 2)
+    JOB_QUEUE_LIMIT    queued runs accepted before new ones are rejected (default 16)
+    JOB_SESSION_LIMIT  unfinished runs allowed per browser session (default 1)
+"""
+
+import itertools
+import os
+import queue
+import threading
+import time
+import traceback
+import uuid
+
+from backend.budget import RunCancelled
+
+QUEUED = "queued"
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+CANCELLED = "cancelled"
+
+FINISHED_STATES = (DONE, FAILED, CANCELLED)
+
+# Bulky event fields a finished job stops holding once its page has taken them
+# (see JobQueue.trim): the Word file and the document preview
+TRIMMED_FIELDS = ("docx", "preview")
+
+
+class AdmissionError(Exception):
+    """Raised when a job is refused because the queue or the session is at its limit."""
+
+
+class Job:
+    """
+    One submitted run
+
+    Events are appended by the worker and read by the page; ``events_since``
+    returns a snapshot so readers never see a list that is being mutated.
+    ``sequence`` is the submission order the queue breaks priority ties with.
+    """
+
+    def __init__(self, target, session_id, priority, on_finished=None, sequence=0):
+        self.id = uuid.uuid4().hex
+        self.target = target
+        self.on_finished = on_finished
+        self.session_id = session_id
+        self.priority = priority
+        self.sequence = sequence
+        self.status = QUEUED
+        self.result = None
+        self.error = None
+        self.created_at = time.time()
+        self.started_at = None
+        self.finished_at = None
+        self.cancel_event = threading.Event()
+        self._events = []
+        self._lock = threading.Lock()
+
+    def publish(self, event):
+        """Append one pipeline event (called from the worker thread)."""
+        with self._lock:
+            self._events.append(event)
+
+    def events_since(self, index=0):
+        """Return the events published from ``index`` onwards."""
+        with self._lock:
+            return list(self._events[index:])
+
+    def trim(self):
+        """
+        Drop the TRIMMED_FIELDS from the events
+
+        Returns:
+            dict: {event index: {field: value}} of what was dropped
+        """
+        removed = {}
+        with self._lock:
+            for index, event in enumerate(self._events):
+                payload = {field: event[field] for field in TRIMMED_FIELDS if field in event}
+                if payload:
+                    # Replaced rather than edited: readers may still hold the old dict
+                    self._events[index] = {k: v for k, v in event.items() if k not in payload}
+                    removed[index] = payload
+        return removed
+
+    @property
+    def finished(self):
+        return self.status in FINISHED_STATES
+
+
+class JobQueue:
+    """
+    Priority queue of jobs served by a bounded pool of worker threads
+
+    Lower ``priority`` values run first; jobs with equal priority run in
+    submission order. Admission control rejects a submission when
+    ``max_queued`` jobs are already waiting or when the session already has
+    ``max_per_session`` unfinished jobs.
+    """
+
+    def __init__(self, max_workers=2, max_queued=16, max_per_session=1, retention_seconds=3600):
+        self.max_workers = max_workers
+        self.max_queued = max_queued
+        self.max_per_session = max_per_session
+        self.retention_seconds = retention_seconds
+        self._queue = queue.PriorityQueue()
+        self._jobs = {}
+        self._lock = threading.Lock()
+        self._sequence = itertools.count()
+        self._workers = []
+        for i in range(max_workers):
+            worker = threading.Thread(target=self._worker, name=f"clause-job-worker-{i}", daemon=True)
+            worker.start()
+            self._workers.append(worker)
+
+    @classmethod
+    def from_env(cls):
+        """Build a queue sized from JOB_WORKERS / JOB_QUEUE_LIMIT / JOB_SESSION_LIMIT."""
+        return cls(
+            max_workers=int(os.getenv("JOB_WORKERS", "2")),
+            max_queued=int(os.getenv("JOB_QUEUE_LIMIT", "16")),
+            max_per_session=int(os.getenv("JOB_SESSION_LIMIT", "1")),
+        )
+
+    def submit(self, target, session_id=None, priority=0, on_finished=None):
+        """
+        Enqueue a run
+
+        Args:
+            target: Callable ``target(emit, cancel_event=...)``; its return value
+                becomes ``job.result``. It should stop by raising RunCancelled once
+                ``cancel_event`` is set
+            session_id: Owner of the job, used for the per-session limit
+            priority: Lower runs first
+            on_finished: Called with the job once it is done, failed or
+                cancelled (also when cancelled before it started)
+
+        Returns:
+            str: Job id
+
+        Raises:
+            AdmissionError: Queue full or session limit reached
+        """
+        with self._lock:
+            self._purge_finished()
+            waiting = sum(1 for j in self._jobs.values() if j.status == QUEUED)
+            if waiting >= self.max_queued:
+                raise AdmissionError(
+                    f"The server is busy ({waiting} runs waiting). Please try again in a moment."
+                )
+            if session_id is not None:
+                active = sum(
+                    1 for j in self._jobs.values()
+                    if j.session_id == session_id and not j.finished
+                )
+                if active >= self.max_per_session:
+                    raise AdmissionError(
+                        "A clause is already being generated in this session. "
+                        "Wait for it to finish or cancel it first."
+                    )
+            job = Job(target, session_id, priority, on_finished, sequence=next(self._sequence))
+            self._jobs[job.id] = job
+            self._queue.put((priority, job.sequence, job))
+        return job.id
+
+    def get(self, job_id):
+        """Return the job with this id, or None if unknown or purged."""
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def position(self, job_id):
+        """1-based place of a queued job in the run order, 0 if it is not waiting."""
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is None or job.status != QUEUED:
+                return 0
+            # Same key as the priority queue, so this is the order workers take jobs in
+            key = (job.priority, job.sequence)
+            return 1 + sum(
+                1 for j in self._jobs.values()
+                if j.status == QUEUED and (j.priority, j.sequence) < key
+            )
+
+    def cancel(self, job_id):
+        """
+        Cancel a job
+
+        A queued job is cancelled at once. A running job is signalled through
+        ``job.cancel_event``; it aborts its in-flight call and ends as
+        CANCELLED shortly after.
+
+        Returns:
+            bool: True if the job was (or is being) cancelled
+        """
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is None or job.finished:
+                return False
+            job.cancel_event.set()
+            cancelled_queued = job.status == QUEUED
+            if cancelled_queued:
+                job.status = CANCELLED
+                job.finished_at = time.time()
+        if cancelled_queued:
+            self._finish(job)
+        return True
+
+    def trim(self, job_id):
+        """
+        Hand the bulky payloads of a finished job over to its page
+
+        A finished job is kept for ``retention_seconds`` so its page can show
+        it again, but the .docx bytes and document previews need not stay in
+        the shared queue that long: once the page has rendered the finished
+        job it keeps them in its own session state and the job drops them.
+
+        Returns:
+            dict: {event index: {field: value}} removed from the job's events;
+            empty if the job is unknown, unfinished or already trimmed
+        """
+        job = self.get(job_id)
+        if job is None or not job.finished:
+            return {}
+        return job.trim()
+
+    def stats(self):
+        """Counts of jobs by state plus the configured capacity."""
+        with self._lock:
+            counts = {state: 0 for state in (QUEUED, RUNNING, DONE, FAILED, CANCELLED)}
+            for job in self._jobs.values():
+                counts[job.status] += 1
+        counts["workers"] = self.max_workers
+        counts["queue_limit"] = self.max_queued
+        return counts
+
+    def _purge_finished(self):
+        # Caller holds self._lock
+        cutoff = time.time() - self.retention_seconds
+        for job_id in [j.id for j in self._jobs.values() if j.finished and j.finished_at < cutoff]:
+            del self._jobs[job_id]
+
+    def _worker(self):
+        while True:
+            _, _, job = self._queue.get()
+            with self._lock:
+                if job.status != QUEUED:
+                    continue  # Cancelled while waiting
+                job.status = RUNNING
+                job.started_at = time.time()
+            try:
+                job.result = job.target(job.publish, cancel_event=job.cancel_event)
+                status = DONE
+            except RunCancelled:
+                status = CANCELLED
+            except Exception as e:
+                job.error = {
+                    "type": type(e).__name__,
+                    "message": str(e),
+                    "traceback": traceback.format_exc(),
+                }
+                status = FAILED
+            job.finished_at = time.time()
+            job.status = status
+            self._finish(job)
+
+    def _finish(self, job):
+        if job.on_finished is not None:
+            try:
+                job.on_finished(job)
+            except Exception:
+                traceback.print_exc()
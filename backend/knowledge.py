@@ -0,0 +1,289 @@
+"""
+Jurisdiction knowledge packs: local reference material for Step 2
+
+Without uploaded documents, Step 2 used to spend a model call on generic
+legal background research that is the same for every "Singapore
+confidentiality" request. Knowledge packs answer those requests locally.
+
+Packs are declared in backend/knowledge/manifest.json: each names a source
+text file (e.g. singapore_law_notes.txt), the jurisdictions it is specific
+to (empty = general material) and the clause topics it covers. The sources
+are compiled into a single bundle (backend/knowledge/packs.kpk, or
+KNOWLEDGE_PACK_PATH):
+
+    b"KPK1" | uint32 header length | JSON header | UTF-8 passage text
+
+The header holds the pack metadata, per-passage offsets into the text area
+and an inverted index (term -> [[passage, term frequency], ...]). The file
+is memory-mapped, so passage text is only read when a passage is returned.
+The bundle is rebuilt automatically when it is missing or older than the
+manifest or a source file (or explicitly: python tools/build_knowledge_packs.py).
+
+A pack covers a request when one of its topics appears in the objective
+and, if a jurisdiction is given, at least one matching pack is specific to
+that jurisdiction (general material alone does not replace jurisdiction
+research).
+"""
+
+import json
+import math
+import mmap
+import os
+import re
+import struct
+import tempfile
+import threading
+from collections import Counter
+from pathlib import Path
+
+from backend.dedup import split_passages
+from backend.library import tokenize
+from backend.tracing import traced
+
+KNOWLEDGE_DIR = Path(__file__).resolve().parent / "knowledge"
+MANIFEST_PATH = KNOWLEDGE_DIR / "manifest.json"
+DEFAULT_PACK_PATH = KNOWLEDGE_DIR / "packs.kpk"
+# Pack sources are given relative to the repository root
+SOURCE_ROOT = Path(__file__).resolve().parent.parent
+
+MAGIC = b"KPK1"
+FORMAT_VERSION = 1
+
+_knowledge_base = None
+_knowledge_base_loaded = False
+_knowledge_base_lock = threading.Lock()
+
+
+def _matches(phrases, text):
+    return any(re.search(rf"\b{re.escape(phrase)}\b", text) for phrase in phrases)
+
+
+def section_passages(text):
+    """Blank-line separated passages, with lone heading lines joined to the passage after them."""
+    passages = []
+    heading = ""
+    for passage in split_passages(text):
+        if "\n" not in passage and len(passage) < 80:
+            heading = f"{heading}\n{passage}" if heading else passage
+            continue
+        passages.append(f"{heading}\n{passage}" if heading else passage)
+        heading = ""
+    if heading:
+        passages.append(heading)
+    return passages
+
+
+def build_bundle(manifest_path=MANIFEST_PATH, output_path=DEFAULT_PACK_PATH):
+    """
+    Compile the packs listed in the manifest into one bundle file
+
+    Sources that do not exist are skipped.
+
+    Returns:
+        int: Number of passages written
+    """
+    manifest = json.loads(Path(manifest_path).read_text(encoding="utf-8"))
+    packs = []
+    passages = []    # [pack index, offset, length, heading]
+    lengths = []     # Passage lengths in terms (BM25)
+    index = {}       # term -> [[passage index, term frequency], ...]
+    text = bytearray()
+
+    for pack in manifest["packs"]:
+        source = SOURCE_ROOT / pack["source"]
+        if not source.is_file():
+            continue
+        pack_index = len(packs)
+        packs.append({
+            "name": pack["name"],
+            "source": pack["source"],
+            "jurisdictions": [j.lower() for j in pack.get("jurisdictions", [])],
+            "topics": [t.lower() for t in pack.get("topics", [])],
+        })
+        for passage in section_passages(source.read_text(encoding="utf-8", errors="ignore")):
+            data = passage.encode("utf-8")
+            passage_index = len(passages)
+            passages.append([pack_index, len(text), len(data), passage.split("\n", 1)[0][:80]])
+            text += data
+            terms = Counter(tokenize(passage))
+            lengths.append(sum(terms.values()))
+            for term, count in terms.items():
+                index.setdefault(term, []).append([passage_index, count])
+
+    header = json.dumps({
+        "version": FORMAT_VERSION,
+        "packs": packs,
+        "passages": passages,
+        "lengths": lengths,
+        "index": index,
+    }, separators=(",", ":")).encode("utf-8")
+
+    # Written under a unique name and moved into place, so processes building
+    # the bundle at the same time never leave a mixed file behind
+    output_path = Path(output_path)
+    temp = tempfile.NamedTemporaryFile(
+        dir=output_path.parent, prefix=f".{output_path.name}.", suffix=".tmp", delete=False
+    )
+    try:
+        with temp:
+            temp.write(MAGIC + struct.pack("<I", len(header)) + header + bytes(text))
+        os.chmod(temp.name, 0o644)
+        os.replace(temp.name, output_path)
+    except BaseException:
+        os.unlink(temp.name)
+        raise
+    return len(passages)
+
+
+def bundle_is_stale(path, manifest_path=MANIFEST_PATH):
+    """Whether the bundle is missing or older than its manifest or sources."""
+    path = Path(path)
+    if not path.is_file():
+        return True
+    built = path.stat().st_mtime
+    manifest_path = Path(manifest_path)
+    if manifest_path.stat().st_mtime > built:
+        return True
+    manifest = json.loads(manifest_path.read_text(encoding="utf-8"))
+    for pack in manifest["packs"]:
+        source = SOURCE_ROOT / pack["source"]
+        if source.is_file() and source.stat().st_mtime > built:
+            return True
+    return False
+
+
+class KnowledgeBase:
+    """
+    Read-only view of a compiled knowledge pack bundle
+
+    Args:
+        path: Bundle file written by build_bundle
+    """
+
+    def __init__(self, path):
+        self.path = str(path)
+        with open(self.path, "rb") as f:
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        if self._mmap[:4] != MAGIC:
+            raise ValueError(f"{self.path} is not a knowledge pack bundle")
+        (header_length,) = struct.unpack("<I", self._mmap[4:8])
+        header = json.loads(self._mmap[8:8 + header_length])
+        if header["version"] != FORMAT_VERSION:
+            raise ValueError(f"Unsupported knowledge pack version {header['version']}")
+        self._text_start = 8 + header_length
+        self.packs = header["packs"]
+        self._passages = header["passages"]
+        self._lengths = header["lengths"]
+        self._index = header["index"]
+        self._average_length = sum(self._lengths) / len(self._lengths) if self._lengths else 0.0
+
+    @classmethod
+    def load(cls, path=None):
+        """
+        Open the bundle, rebuilding it first when it is stale
+
+        Returns:
+            KnowledgeBase or None when no manifest exists
+        """
+        path = Path(path or os.getenv("KNOWLEDGE_PACK_PATH") or DEFAULT_PACK_PATH)
+        if not MANIFEST_PATH.is_file():
+            return None
+        if bundle_is_stale(path):
+            build_bundle(output_path=path)
+        return cls(path)
+
+    def passage_text(self, passage_index):
+        _, offset, length, _ = self._passages[passage_index]
+        start = self._text_start + offset
+        return self._mmap[start:start + length].decode("utf-8")
+
+    def covering_packs(self, objective, jurisdiction=""):
+        """
+        Indexes of the packs that cover a request (empty when not covered)
+        """
+        objective = objective.lower()
+        jurisdiction = (jurisdiction or "").strip().lower()
+        matched = [
+            i for i, pack in enumerate(self.packs)
+            if _matches(pack["topics"], objective)
+            and (not pack["jurisdictions"] or (jurisdiction and _matches(pack["jurisdictions"], jurisdiction)))
+        ]
+        if jurisdiction and not any(self.packs[i]["jurisdictions"] for i in matched):
+            return []
+        return matched
+
+    def lookup(self, objective, jurisdiction="", top_k=4, k1=1.2, b=0.75):
+        """
+        Best passages for a request from the packs that cover it
+
+        Args:
+            objective: Drafting objective
+            jurisdiction: Requested jurisdiction ("" = not specified)
+            top_k: Maximum passages returned
+
+        Returns:
+            dict: {"packs": [pack names], "passages": [{"pack", "heading", "text"}, ...]},
+            or None when no pack covers the request
+        """
+        packs = set(self.covering_packs(objective, jurisdiction))
+        if not packs:
+            return None
+
+        # BM25 over the passages of the covering packs
+        scores = Counter()
+        candidates = [i for i, p in enumerate(self._passages) if p[0] in packs]
+        for term in set(tokenize(f"{objective} {jurisdiction}")):
+            postings = [(i, tf) for i, tf in self._index.get(term, ()) if self._passages[i][0] in packs]
+            if not postings:
+                continue
+            idf = math.log(1 + (len(candidates) - len(postings) + 0.5) / (len(postings) + 0.5))
+            for i, tf in postings:
+                norm = k1 * (1 - b + b * self._lengths[i] / (self._average_length or 1))
+                scores[i] += idf * tf * (k1 + 1) / (tf + norm)
+
+        ranked = [i for i, _ in scores.most_common(top_k)]
+        # Fill up with the packs' opening passages when few terms matched
+        for i in candidates:
+            if len(ranked) >= top_k:
+                break
+            if i not in ranked:
+                ranked.append(i)
+
+        return {
+            "packs": [self.packs[i]["name"] for i in sorted(packs)],
+            "passages": [
+                {
+                    "pack": self.packs[self._passages[i][0]]["name"],
+                    "heading": self._passages[i][3],
+                    "text": self.passage_text(i),
+                }
+                for i in ranked
+            ],
+        }
+
+
+def get_knowledge_base():
+    """
+    Process-wide knowledge base, loaded (and built if needed) on first use
+
+    Returns:
+        KnowledgeBase or None when packs are unavailable
+    """
+    global _knowledge_base, _knowledge_base_loaded
+    with _knowledge_base_lock:
+        if not _knowledge_base_loaded:
+            try:
+                _knowledge_base = KnowledgeBase.load()
+            except (OSError, ValueError):
+                _knowledge_base = None  # Step 2 falls back to the research call
+            _knowledge_base_loaded = True
+        return _knowledge_base
+
+
+@traced()
+def lookup_knowledge(objective, jurisdiction=""):
+    """
+    Reference passages covering a request, or None (see KnowledgeBase.lookup)
+    """
+    knowledge_base = get_knowledge_base()
+    return knowledge_base.lookup(objective, jurisdiction) if knowledge_base else None
@@ -0,0 +1,209 @@
+"""
+Clause library: persistent store of finished clauses with similarity lookup
+
+Every run drafted from scratch is saved to SQLite together with its objective,
+jurisdiction, drafting style, quality score and the hashes of the documents
+it was drafted from. Before a new run the page asks the library for close
+matches so the user can start from a prior clause (skipping Steps 1-4)
+instead of drafting from scratch.
+
+Lookup is two-stage so it stays in the millisecond range with tens of
+thousands of clauses: an FTS5 full-text index over the objectives returns
+the best BM25 candidates for the query's most selective terms (document
+frequencies come from an fts5vocab table), which are then re-ranked in
+Python by cosine similarity of their full term vectors plus small bonuses
+for the same jurisdiction, style and source documents.
+
+The database lives at CLAUSE_LIBRARY_PATH (default backend/clause_library.db).
+Set CLAUSE_LIBRARY=0 to turn the library off: nothing is saved and every
+run drafts from scratch.
+"""
+
+import hashlib
+import json
+import math
+import os
+import re
+import sqlite3
+import threading
+import time
+from collections import Counter
+from pathlib import Path
+
+DEFAULT_LIBRARY_PATH = Path(__file__).resolve().parent / "clause_library.db"
+
+STOPWORDS = {
+    "the", "and", "for", "with", "from", "that", "this", "any", "all", "are", "not",
+    "shall", "may", "its", "their", "such", "into", "under", "than", "per", "each",
+}
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS clauses (
+    id INTEGER PRIMARY KEY,
+    created_at REAL NOT NULL,
+    objective TEXT NOT NULL,
+    jurisdiction TEXT NOT NULL,
+    style TEXT NOT NULL,
+    clause TEXT NOT NULL,
+    score INTEGER,
+    doc_hashes TEXT NOT NULL
+);
+CREATE VIRTUAL TABLE IF NOT EXISTS clauses_fts USING fts5(objective, tokenize = 'unicode61');
+CREATE VIRTUAL TABLE IF NOT EXISTS clauses_vocab USING fts5vocab(clauses_fts, 'row');
+"""
+
+# Only the rarest query terms are used to pull FTS candidates; common terms
+# match most of the library and would make BM25 rank thousands of rows
+CANDIDATE_TERMS = 4
+
+
+def library_enabled():
+    """Whether finished clauses are saved and offered for reuse (CLAUSE_LIBRARY, default on)."""
+    return os.getenv("CLAUSE_LIBRARY", "1") != "0"
+
+
+def tokenize(text):
+    """Lower-case content words of ``text`` (stopwords and short words removed)."""
+    return [w for w in re.findall(r"[a-z0-9]+", text.lower()) if len(w) > 2 and w not in STOPWORDS]
+
+
+def cosine_similarity(a, b):
+    """Cosine similarity of two term-count Counters."""
+    if not a or not b:
+        return 0.0
+    dot = sum(count * b[term] for term, count in a.items() if term in b)
+    norm = math.sqrt(sum(c * c for c in a.values())) * math.sqrt(sum(c * c for c in b.values()))
+    return dot / norm if norm else 0.0
+
+
+def document_hashes(documents):
+    """
+    SHA-256 of each uploaded document's bytes, sorted
+
+    Args:
+        documents: list of {"name", "data"} uploads or DocumentStore references
+            (which carry the hash as "sha256"; unreadable uploads have none)
+    """
+    return sorted(
+        d["sha256"] if "sha256" in d else hashlib.sha256(d["data"]).hexdigest()
+        for d in documents or [] if "sha256" in d or "data" in d
+    )
+
+
+def parse_total_score(evaluation):
+    """Extract ``Total Score: XX/100`` from a Step 7 assessment, or None."""
+    match = re.search(r"Total Score:\s*(\d+)\s*/\s*100", evaluation or "")
+    return int(match.group(1)) if match else None
+
+
+class ClauseLibrary:
+    """
+    SQLite-backed clause library (safe to share between threads)
+
+    Args:
+        path: Database file; created on first use
+    """
+
+    def __init__(self, path=None):
+        self.path = str(path or os.getenv("CLAUSE_LIBRARY_PATH") or DEFAULT_LIBRARY_PATH)
+        self._local = threading.local()
+        self._write_lock = threading.Lock()
+        with self._connect() as conn:
+            conn.executescript(SCHEMA)
+
+    def _connect(self):
+        # One connection per thread; sqlite3 connections are not shareable
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=10)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA journal_mode=WAL")
+            self._local.conn = conn
+        return conn
+
+    def add(self, objective, jurisdiction, style, clause, score=None, doc_hashes=()):
+        """
+        Store a finished clause
+
+        Returns:
+            int: Id of the new library entry
+        """
+        with self._write_lock, self._connect() as conn:
+            cursor = conn.execute(
+                "INSERT INTO clauses (created_at, objective, jurisdiction, style, clause, score, doc_hashes) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (time.time(), objective, jurisdiction or "", style, clause, score, json.dumps(list(doc_hashes))),
+            )
+            conn.execute(
+                "INSERT INTO clauses_fts (rowid, objective) VALUES (?, ?)",
+                (cursor.lastrowid, objective),
+            )
+            return cursor.lastrowid
+
+    def get(self, clause_id):
+        """Return one entry as a dict, or None."""
+        row = self._connect().execute("SELECT * FROM clauses WHERE id = ?", (clause_id,)).fetchone()
+        return self._row_to_dict(row) if row else None
+
+    def count(self):
+        return self._connect().execute("SELECT COUNT(*) FROM clauses").fetchone()[0]
+
+    def find_similar(self, objective, jurisdiction="", style="", doc_hashes=(), limit=3,
+                     min_similarity=0.45, candidates=50):
+        """
+        Find prior clauses drafted for a similar objective
+
+        Args:
+            objective: New drafting objective
+            jurisdiction, style: Preferred (not required) matches
+            doc_hashes: Hashes of the new run's documents (see document_hashes)
+            limit: Maximum matches returned
+            min_similarity: Cut-off on the final similarity (0-1)
+            candidates: FTS candidates re-ranked
+
+        Returns:
+            list: Entry dicts with an added "similarity", best first
+        """
+        terms = sorted(set(tokenize(objective)))
+        if not terms:
+            return []
+        conn = self._connect()
+        placeholders = ",".join("?" * len(terms))
+        frequencies = dict(conn.execute(
+            f"SELECT term, doc FROM clauses_vocab WHERE term IN ({placeholders})", terms
+        ).fetchall())
+        selective = sorted((t for t in terms if t in frequencies), key=frequencies.get)[:CANDIDATE_TERMS]
+        if not selective:
+            return []
+        query = " OR ".join(f'"{t}"' for t in selective)
+        # Rank inside the FTS index first, then join only the top candidates
+        rows = conn.execute(
+            "SELECT c.* FROM (SELECT rowid FROM clauses_fts WHERE clauses_fts MATCH ? "
+            "ORDER BY rank LIMIT ?) f JOIN clauses c ON c.id = f.rowid",
+            (query, candidates),
+        ).fetchall()
+
+        query_vector = Counter(tokenize(objective))
+        doc_hashes = sorted(doc_hashes)
+        matches = []
+        for row in rows:
+            entry = self._row_to_dict(row)
+            similarity = cosine_similarity(query_vector, Counter(tokenize(entry["objective"])))
+            if jurisdiction and entry["jurisdiction"].strip().lower() == jurisdiction.strip().lower():
+                similarity += 0.05
+            if style and entry["style"] == style:
+                similarity += 0.03
+            if doc_hashes and entry["doc_hashes"] == doc_hashes:
+                similarity += 0.05
+            entry["similarity"] = min(1.0, similarity)
+            if entry["similarity"] >= min_similarity:
+                matches.append(entry)
+
+        matches.sort(key=lambda m: (m["similarity"], m["score"] or 0), reverse=True)
+        return matches[:limit]
+
+    @staticmethod
+    def _row_to_dict(row):
+        entry = dict(row)
+        entry["doc_hashes"] = json.loads(entry["doc_hashes"])
+        return entry
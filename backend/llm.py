@@ -0,0 +1,273 @@
+"""
+LLM call layer
+
+Plain (Streamlit-free) wrapper around the OpenAI Chat API. Errors are raised
+to the caller; the page turns them into user-facing messages.
+"""
+
+import asyncio
+import os
+import threading
+from functools import lru_cache
+
+from backend.providers import ProviderPool
+from backend.offline import OfflineBackend
+from backend.output_budget import output_budgets
+from backend.singleflight import fingerprint, single_flight, single_flight_enabled
+from backend.tracing import span
+
+# Overridable with OPENAI_BASE_URL (e.g. a local mock server for load tests)
+OPENAI_BASE_URL = "https://api.openai.com/v1"
+DEFAULT_MODEL = "gpt-4o-mini"
+
+
+_pool = None
+_pool_loaded = False
+_pool_lock = threading.Lock()
+
+_offline = None
+_offline_loaded = False
+_offline_lock = threading.Lock()
+
+# How often an in-flight call checks for cancellation / its deadline
+CANCEL_POLL_SECONDS = 0.1
+
+# Continuation requests made for a response that stopped on max_tokens
+MAX_CONTINUATIONS = 2
+CONTINUE_PROMPT = (
+    "Your previous answer was cut off. Continue exactly where it stopped, "
+    "without repeating any text already written and without any preamble."
+)
+
+# Each worker thread keeps its own event loop and async clients: async
+# clients hold connections bound to the loop they were created on
+_thread_state = threading.local()
+
+
+@lru_cache(maxsize=32)
+def get_openai_client(api_key, base_url, max_retries=2):
+    """
+    Shared OpenAI client per (key, endpoint)
+    
+    ``openai`` is imported on first use so the page itself never pays for
+    it, and the client (with its HTTP connection pool) is reused across
+    calls instead of being rebuilt for every request.
+    """
+    from openai import OpenAI
+    
+    return OpenAI(api_key=api_key, base_url=base_url, max_retries=max_retries)
+
+
+def _event_loop():
+    loop = getattr(_thread_state, "loop", None)
+    if loop is None:
+        loop = _thread_state.loop = asyncio.new_event_loop()
+        _thread_state.clients = {}
+    return loop
+
+
+def get_async_openai_client(api_key, base_url, max_retries=2):
+    """
+    Async OpenAI client per (key, endpoint) for the calling thread
+    
+    Used for calls that must be abortable: cancelling the request task
+    closes its connection immediately, which a blocking client cannot do.
+    """
+    _event_loop()
+    key = (api_key, base_url, max_retries)
+    client = _thread_state.clients.get(key)
+    if client is None:
+        from openai import AsyncOpenAI
+        
+        client = _thread_state.clients[key] = AsyncOpenAI(api_key=api_key, base_url=base_url, max_retries=max_retries)
+    return client
+
+
+async def _watch(request, budget):
+    task = asyncio.ensure_future(request)
+    while True:
+        done, _ = await asyncio.wait({task}, timeout=CANCEL_POLL_SECONDS)
+        if done:
+            return task.result()
+        if budget.cancelled or budget.remaining() == 0:
+            task.cancel()
+            try:
+                await task
+            except BaseException:
+                pass
+            budget.check()
+
+
+def run_cancellable(request, budget):
+    """
+    Run a request coroutine on this thread's event loop until it finishes,
+    the run is cancelled or its deadline passes
+    
+    Raises:
+        RunCancelled / DeadlineExceeded: The request was aborted
+    """
+    return _event_loop().run_until_complete(_watch(request, budget))
+
+
+def get_provider_pool():
+    """
+    Process-wide provider pool built from LLM_ENDPOINTS on first use
+    
+    Returns:
+        ProviderPool or None when only the single default endpoint is configured
+    """
+    global _pool, _pool_loaded
+    with _pool_lock:
+        if not _pool_loaded:
+            _pool = ProviderPool.from_env()
+            _pool_loaded = True
+        return _pool
+
+
+def get_offline_backend():
+    """
+    Process-wide record / replay / synthetic backend built from LLM_BACKEND on first use
+    
+    Returns:
+        OfflineBackend or None when calls go to the API as usual
+    """
+    global _offline, _offline_loaded
+    with _offline_lock:
+        if not _offline_loaded:
+            _offline = OfflineBackend.from_env()
+            _offline_loaded = True
+        return _offline
+
+
+def call_openai_chat(messages, api_key, model=DEFAULT_MODEL, temperature=0.2, max_tokens=None,
+                     timeout=60, budget=None, step=None, on_truncated=None):
+    """
+    OpenAI Chat API
+    
+    A response that stops on max_tokens (finish_reason "length") is
+    completed with up to MAX_CONTINUATIONS continuation requests instead of
+    being returned cut off. An identical call already in flight (from any
+    session) is waited for and shared instead of being sent again; see
+    backend/singleflight.py. LLM_BACKEND can record responses to a cassette,
+    replay them or generate synthetic ones; see backend/offline.py.
+    
+    Args:
+        messages: Chat messages (list of {"role", "content"})
+        api_key: OpenAI API key
+        model: Model name
+        temperature: Sampling temperature 0-2
+        max_tokens: Maximum output tokens per request (default: the adaptive
+            budget of ``step``, see backend/output_budget.py)
+        timeout: Seconds before the request times out
+        budget: backend.budget.RunBudget; when given, the call is made with
+            the async client and aborted as soon as the run is cancelled or
+            out of time
+        step: Pipeline step name; its output length is recorded to adapt its budget
+        on_truncated: Called with {"step", "max_tokens", "continuations", "complete"}
+            when the response hit max_tokens
+        
+    Returns:
+        str: AI response text
+    """
+    if max_tokens is None:
+        max_tokens = output_budgets.budget(step)
+    request = {
+        "model": model,
+        "messages": messages,
+        "temperature": temperature,
+        "max_tokens": max_tokens,
+        "timeout": timeout
+    }
+    
+    def create(client_key, base_url, max_retries=2):
+        if budget is None:
+            client = get_openai_client(client_key, base_url, max_retries=max_retries)
+            return client.chat.completions.with_raw_response.create(**request)
+        client = get_async_openai_client(client_key, base_url, max_retries=max_retries)
+        return run_cancellable(client.chat.completions.with_raw_response.create(**request), budget)
+    
+    offline = get_offline_backend()
+    pool = get_provider_pool() if offline is None or offline.needs_network else None
+    use_pool = pool is not None and pool.serves(api_key)
+    base_url = os.getenv("OPENAI_BASE_URL") or OPENAI_BASE_URL
+    
+    def request_api():
+        if use_pool:
+            # Server key: balance across the configured endpoints; the pool
+            # fails over itself, so the client does not retry
+            def send(endpoint):
+                raw = create(endpoint.api_key, endpoint.base_url, max_retries=0)
+                return raw.parse(), raw.headers
+            
+            return pool.call(send)
+        # OpenAI API Configuration
+        return create(api_key, base_url).parse()
+    
+    def complete():
+        if offline is None:
+            return request_api()
+        return offline.complete(request, request_api, budget)
+    
+    def fetch():
+        parts = []
+        output_tokens = 0
+        continuations = 0
+        while True:
+            resp = complete()
+            choice = resp.choices[0]
+            parts.append(choice.message.content or "")
+            output_tokens += resp.usage.completion_tokens if resp.usage else len(parts[-1]) // 4
+            if choice.finish_reason != "length" or continuations == MAX_CONTINUATIONS:
+                break
+            # Cut off: ask for the rest rather than re-running the step
+            continuations += 1
+            request["messages"] = messages + [
+                {"role": "assistant", "content": "".join(parts)},
+                {"role": "user", "content": CONTINUE_PROMPT},
+            ]
+        if step is not None:
+            output_budgets.record(step, output_tokens, continuations > 0 or choice.finish_reason == "length")
+        return "".join(parts).strip(), continuations, choice.finish_reason
+    
+    with span("llm.chat", "llm", step=step, model=model, max_tokens=max_tokens,
+              prompt_chars=sum(len(m["content"]) for m in messages)) as trace:
+        if single_flight_enabled():
+            key = fingerprint(request, "pool" if use_pool else base_url, api_key)
+            (content, continuations, finish_reason), shared = single_flight.do(key, fetch, budget)
+        else:
+            (content, continuations, finish_reason), shared = fetch(), False
+        trace.set(response_chars=len(content), finish_reason=finish_reason, continuations=continuations, shared=shared)
+    
+    if (continuations or finish_reason == "length") and on_truncated is not None:
+        on_truncated({
+            "step": step,
+            "max_tokens": max_tokens,
+            "continuations": continuations,
+            "complete": finish_reason != "length",
+        })
+    return content
+
+
+def describe_api_error(error_type, message):
+    """
+    Turn an API exception into a user-facing markdown message
+    
+    Args:
+        error_type: Exception class name
+        message: Exception message
+        
+    Returns:
+        str: Markdown error message
+    """
+    if "AuthenticationError" in error_type:
+        return "**API Authentication Failed**\n\nPlease check your OpenAI API key."
+    elif "RateLimitError" in error_type:
+        return " **API**\n\n\n- \n- API\n- "
+    elif "CassetteMiss" in error_type:
+        return f"**No Recorded Response**\n\n{message}. Record this run again with LLM_BACKEND=record, or use LLM_BACKEND=synthetic."
+    elif "DeadlineExceeded" in error_type:
+        return "**Time Limit Reached**\n\nThe run used up its time limit before a clause was drafted. Please try again, or allow more time."
+    elif "timeout" in message.lower():
+        return " ****\n\nAPI"
+    else:
+        return f" **API**\n\n: {error_type}\n: {message}"
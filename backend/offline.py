@@ -0,0 +1,323 @@
+"""
+Offline LLM backends: record, replay and synthetic
+
+LLM_BACKEND selects where call_openai_chat gets its responses:
+
+    openai      (default) the configured endpoint(s)
+    record      the configured endpoint(s), and every request/response pair
+                is appended to the cassette with its latency and usage
+    replay      responses are served from the cassette, without network
+                access or an API key
+    synthetic   format-correct responses are generated locally for any prompt
+
+The cassette (LLM_CASSETTE, default backend/llm_cassette.jsonl.gz) holds one
+JSON line per response, gzip-compressed when the path ends in ".gz". It
+stores the request's fingerprint rather than the prompt, so it stays small
+and carries no document text. The fingerprint covers model, temperature and
+messages but not max_tokens, which adapts from run to run (see
+backend/output_budget.py). Identical requests recorded several times are
+replayed in recorded order.
+
+Replay is instant unless LLM_REPLAY_LATENCY_SCALE is set (1 = the recorded
+latency, 0.5 = twice as fast). Synthetic responses take
+LLM_SYNTHETIC_LATENCY seconds and, like real ones, stop on max_tokens with
+finish_reason "length". Waits end early when the run is cancelled or out of
+time, like a real call.
+"""
+
+import gzip
+import hashlib
+import json
+import os
+import threading
+import time
+from datetime import datetime
+from pathlib import Path
+from types import SimpleNamespace
+
+BACKENDS = ("openai", "record", "replay", "synthetic")
+DEFAULT_CASSETTE_PATH = Path(__file__).resolve().parent / "llm_cassette.jsonl.gz"
+
+# How often a simulated call checks for cancellation / its deadline
+WAIT_POLL_SECONDS = 0.1
+
+SAMPLE_CLAUSE = """1. Limitation of Liability
+1.1 Neither party shall be liable for any indirect, special or consequential loss.
+1.2 Each party's aggregate liability shall not exceed 20% of the Contract Price.
+1.3 Nothing in this clause limits liability for fraud, death or personal injury."""
+
+
+class CassetteMiss(LookupError):
+    """Raised in replay mode for a request the cassette holds no response for."""
+
+
+def synthetic_reply(messages):
+    """
+    Build a response in the format the pipeline step expects
+
+    Args:
+        messages: Chat messages of the request
+
+    Returns:
+        str: Response text
+    """
+    if len(messages) > 2 and messages[-2]["role"] == "assistant" and "was cut off" in messages[-1]["content"]:
+        # Continuation request: the rest of the answer to the original prompt
+        written = messages[-2]["content"]
+        full = synthetic_reply(messages[:-2])
+        return full[len(written):] if full.startswith(written) else ""
+
+    system = messages[0]["content"] if messages else ""
+    prompt = messages[-1]["content"] if messages else ""
+
+    if "Please review and refine" in prompt:
+        return (
+            f"[Revised Clause]\n{SAMPLE_CLAUSE}\n\n"
+            "[Revision Notes]\n- Clarified the cap calculation basis\n- Added carve-outs"
+        )
+    if "Merge the reviewers' findings" in prompt:
+        return (
+            f"[Revised Clause]\n{SAMPLE_CLAUSE}\n\n"
+            "[Revision Notes]\n- Combined the reviewers' changes to the cap"
+        )
+    if "**Your Focus**" in prompt:
+        # One distinct finding per specialist so the panel's edits merge locally
+        if "Enforceability reviewer" in prompt:
+            return (
+                "[Edits]\nREPLACE S3: 1.2 Each party's aggregate liability shall not exceed 20% of the "
+                "Contract Price, to the extent permitted by applicable law.\n\n"
+                "[Revision Notes]\n- Made the cap subject to mandatory law"
+            )
+        if "Clarity and Style reviewer" in prompt:
+            return (
+                "[Edits]\nREPLACE S2: 1.1 Neither party shall be liable to the other for any indirect, "
+                "special or consequential loss.\n\n"
+                "[Revision Notes]\n- Named the party the exclusion protects"
+            )
+        if "Risk and Exceptions reviewer" in prompt:
+            return (
+                "[Edits]\nINSERT AFTER S4: 1.4 This clause survives termination of the Contract.\n\n"
+                "[Revision Notes]\n- Added survival"
+            )
+        return "[Edits]\nNONE\n\n[Revision Notes]\n- Consistent with the constraints"
+    if "return ONLY the edits" in prompt:
+        return (
+            "[Edits]\nREPLACE S3: 1.2 Each party's aggregate liability under this Contract shall not exceed "
+            "20% of the Contract Price.\n\n"
+            "[Revision Notes]\n- Tied the cap to liability under this Contract"
+        )
+    if "Please assess the quality" in prompt:
+        scores = "\n".join(f"{i}. Dimension {i}: 8/10" for i in range(1, 11))
+        return (
+            f"[Scoring]\n{scores}\nTotal Score: 80/100\n\n"
+            "[Strengths]\n• Clear cap\n\n[Areas for Improvement]\n• Define Contract Price"
+        )
+    if "experienced contract lawyer" in system:
+        return f"{SAMPLE_CLAUSE}\n\nDrafting Notes\n• 1: Cap follows the objective"
+    if "[0]" in prompt:
+        return "[0]"
+    return "\n".join(f"{i}. Analysis point {i}" for i in range(1, 6))
+
+
+def limit_reply(content, max_tokens):
+    """
+    Cut a synthetic response off at ``max_tokens`` (~4 characters per token)
+
+    Returns:
+        tuple: (content, finish_reason)
+    """
+    if max_tokens and len(content) // 4 > max_tokens:
+        return content[:max_tokens * 4], "length"
+    return content, "stop"
+
+
+def cassette_key(request):
+    """Fingerprint of a request in the cassette (model, temperature and messages)."""
+    payload = json.dumps(
+        {k: request.get(k) for k in ("model", "temperature", "messages")}, sort_keys=True, ensure_ascii=False
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def completion(content, finish_reason, prompt_tokens, completion_tokens):
+    """Response object with the fields call_openai_chat reads from a ChatCompletion."""
+    return SimpleNamespace(
+        choices=[SimpleNamespace(message=SimpleNamespace(content=content), finish_reason=finish_reason)],
+        usage=SimpleNamespace(
+            prompt_tokens=prompt_tokens,
+            completion_tokens=completion_tokens,
+            total_tokens=prompt_tokens + completion_tokens,
+        ),
+    )
+
+
+def wait(seconds, budget=None):
+    """
+    Sleep like an in-flight call of ``seconds``
+
+    Raises:
+        RunCancelled / DeadlineExceeded: The run stopped while waiting
+    """
+    end = time.monotonic() + seconds
+    while True:
+        left = end - time.monotonic()
+        if budget is not None and (budget.cancelled or budget.remaining() == 0):
+            budget.check()
+        if left <= 0:
+            return
+        time.sleep(min(left, WAIT_POLL_SECONDS) if budget is not None else left)
+
+
+class Cassette:
+    """
+    Recorded responses on disk
+
+    Args:
+        path: JSON-lines file (gzip-compressed when it ends in ".gz")
+    """
+
+    def __init__(self, path):
+        self.path = str(path)
+        self._entries = None
+        self._served = {}
+        self._lock = threading.Lock()
+
+    def _open(self, mode):
+        if self.path.endswith(".gz"):
+            return gzip.open(self.path, mode + "t", encoding="utf-8")
+        return open(self.path, mode, encoding="utf-8")
+
+    def load(self):
+        """Recorded entries by request fingerprint, in recorded order."""
+        with self._lock:
+            if self._entries is None:
+                self._entries = {}
+                if os.path.exists(self.path):
+                    with self._open("r") as f:
+                        for line in f:
+                            if line.strip():
+                                entry = json.loads(line)
+                                self._entries.setdefault(entry["key"], []).append(entry)
+            return self._entries
+
+    def lookup(self, request):
+        """
+        Next recorded response to ``request``
+
+        A request recorded n times gets the n recordings in order; the last
+        one is repeated after that.
+
+        Raises:
+            CassetteMiss: Nothing was recorded for the request
+        """
+        key = cassette_key(request)
+        entries = self.load().get(key)
+        if not entries:
+            raise CassetteMiss(f"No recorded response in {self.path} for request {key[:12]}")
+        with self._lock:
+            index = self._served.get(key, 0)
+            self._served[key] = index + 1
+        return entries[min(index, len(entries) - 1)]
+
+    def append(self, request, response, seconds):
+        """
+        Record one response
+
+        Args:
+            request: Request sent (see call_openai_chat)
+            response: ChatCompletion received
+            seconds: Time the request took
+        """
+        choice = response.choices[0]
+        usage = response.usage
+        entry = {
+            "key": cassette_key(request),
+            "model": request.get("model"),
+            "max_tokens": request.get("max_tokens"),
+            "content": choice.message.content or "",
+            "finish_reason": choice.finish_reason,
+            "prompt_tokens": usage.prompt_tokens if usage else 0,
+            "completion_tokens": usage.completion_tokens if usage else 0,
+            "seconds": round(seconds, 3),
+            "recorded_at": datetime.now().isoformat(timespec="seconds"),
+        }
+        line = json.dumps(entry, ensure_ascii=False) + "\n"
+        with self._lock:
+            Path(self.path).parent.mkdir(parents=True, exist_ok=True)
+            with self._open("a") as f:
+                f.write(line)
+            if self._entries is not None:
+                self._entries.setdefault(entry["key"], []).append(entry)
+
+
+class OfflineBackend:
+    """
+    Record, replay or synthetic source of chat responses
+
+    Args:
+        mode: "record", "replay" or "synthetic"
+        cassette_path: Cassette file (record / replay)
+        replay_latency_scale: Factor applied to recorded latencies (0 = instant)
+        synthetic_latency: Seconds each synthetic response takes
+    """
+
+    def __init__(self, mode, cassette_path=None, replay_latency_scale=0.0, synthetic_latency=0.0):
+        if mode not in BACKENDS[1:]:
+            raise ValueError(f"Unknown LLM_BACKEND {mode!r}; expected one of {', '.join(BACKENDS)}")
+        self.mode = mode
+        self.cassette = Cassette(cassette_path or DEFAULT_CASSETTE_PATH)
+        self.replay_latency_scale = replay_latency_scale
+        self.synthetic_latency = synthetic_latency
+
+    @classmethod
+    def from_env(cls):
+        """
+        Backend configured by LLM_BACKEND
+
+        Returns:
+            OfflineBackend or None for the default "openai" backend
+        """
+        mode = (os.getenv("LLM_BACKEND") or "openai").strip().lower()
+        if mode == "openai":
+            return None
+        return cls(
+            mode,
+            cassette_path=os.getenv("LLM_CASSETTE") or None,
+            replay_latency_scale=float(os.getenv("LLM_REPLAY_LATENCY_SCALE", "0")),
+            synthetic_latency=float(os.getenv("LLM_SYNTHETIC_LATENCY", "0")),
+        )
+
+    @property
+    def needs_network(self):
+        """Whether requests still go to the API (and need a key)."""
+        return self.mode == "record"
+
+    def complete(self, request, send, budget=None):
+        """
+        One chat completion for ``request``
+
+        Args:
+            request: Request dict (model, messages, temperature, max_tokens, timeout)
+            send: Function making the real request (used in record mode)
+            budget: backend.budget.RunBudget of the run (simulated waits honour it)
+
+        Returns:
+            ChatCompletion (record) or an object with the same fields
+        """
+        if self.mode == "record":
+            started = time.monotonic()
+            response = send()
+            self.cassette.append(request, response, time.monotonic() - started)
+            return response
+        if self.mode == "replay":
+            entry = self.cassette.lookup(request)
+            if self.replay_latency_scale:
+                wait(entry["seconds"] * self.replay_latency_scale, budget)
+            return completion(
+                entry["content"], entry["finish_reason"], entry["prompt_tokens"], entry["completion_tokens"]
+            )
+        if self.synthetic_latency:
+            wait(self.synthetic_latency, budget)
+        content, finish_reason = limit_reply(synthetic_reply(request["messages"]), request.get("max_tokens"))
+        prompt_tokens = sum(len(m.get("content", "")) for m in request["messages"]) // 4
+        return completion(content, finish_reason, prompt_tokens, len(content) // 4)
@@ -0,0 +1,88 @@
+"""
+Adaptive output budgets (max_tokens) per pipeline step
+
+Every step used to ask for a fixed max_tokens (1000, or 1500 for drafting
+and review), far more than e.g. the objective analysis ever writes, and too
+little for a long clause, which was then silently cut off. The limit is now
+chosen per step from the output lengths observed for that step: the 95th
+percentile of the last ``window`` responses plus headroom, between
+``floor`` and ``ceiling``. Until a step has ``min_samples`` observations
+its previous fixed limit is used.
+
+A response that still stops on the limit is completed with continuation
+requests (see backend.llm.call_openai_chat); the full length is recorded,
+so the step's budget grows and the next run needs no continuation.
+"""
+
+import math
+import threading
+from collections import deque
+
+DEFAULT_MAX_TOKENS = 1000
+# Previous fixed limits of the steps that asked for more or less than the default
+DEFAULT_BUDGETS = {"draft": 1500, "review": 1500, "review_edits": 800}
+
+
+class OutputBudgets:
+    """
+    Observed output lengths and the resulting max_tokens per step
+
+    Args:
+        window: Responses remembered per step
+        min_samples: Observations needed before a step's budget adapts
+        headroom: Factor applied to the 95th percentile
+        floor, ceiling: Bounds of an adapted budget
+    """
+
+    def __init__(self, window=50, min_samples=5, headroom=1.25, floor=256, ceiling=4096):
+        self.window = window
+        self.min_samples = min_samples
+        self.headroom = headroom
+        self.floor = floor
+        self.ceiling = ceiling
+        self._samples = {}
+        self._truncations = {}
+        self._lock = threading.Lock()
+
+    def budget(self, step):
+        """max_tokens for the next request of ``step``."""
+        with self._lock:
+            samples = sorted(self._samples.get(step, ()))
+        if len(samples) < self.min_samples:
+            return DEFAULT_BUDGETS.get(step, DEFAULT_MAX_TOKENS)
+        p95 = samples[min(len(samples) - 1, math.ceil(0.95 * len(samples)) - 1)]
+        return max(self.floor, min(self.ceiling, int(p95 * self.headroom) + 32))
+
+    def record(self, step, output_tokens, truncated=False):
+        """
+        Record the complete output length of one response of ``step``
+
+        Args:
+            step: Step name
+            output_tokens: Tokens generated, including continuations
+            truncated: Whether the response hit its limit (continued or not)
+        """
+        with self._lock:
+            self._samples.setdefault(step, deque(maxlen=self.window)).append(output_tokens)
+            if truncated:
+                self._truncations[step] = self._truncations.get(step, 0) + 1
+
+    def stats(self):
+        """Per-step budget, sample count, largest output and truncations for display."""
+        with self._lock:
+            steps = {step: list(samples) for step, samples in self._samples.items()}
+            truncations = dict(self._truncations)
+        return [
+            {
+                "step": step,
+                "max_tokens": self.budget(step),
+                "responses": len(samples),
+                "largest_output": max(samples),
+                "truncated": truncations.get(step, 0),
+            }
+            for step, samples in sorted(steps.items())
+        ]
+
+
+# Shared by all runs in the process
+output_budgets = OutputBudgets()
@@ -0,0 +1,813 @@
+"""
+Clause generation pipeline (Steps 1-7)
+
+The pipeline never touches Streamlit. It reports what it is doing through
+an ``emit`` callback that receives one event dict per displayable result,
+so the page can render progress from any thread or rerun:
+
+    {"type": "progress", "current": 3, "total": 9, "message": "..."}
+    {"type": "heading", "text": "## Step 3: ..."}
+    {"type": "call", "number": 4, "label": "..."}
+    {"type": "objective" | "docs_summary" | "retrieved" | "knowledge_pack" | "legal_research" |
+             "constraints" | "initial_clause" | "review" | "final" |
+             "evaluation" | "budget" | "truncated" | "complete", ...}
+"""
+
+import threading
+import time
+from datetime import datetime
+
+from backend.llm import call_openai_chat
+from backend.budget import RunBudget, DeadlineExceeded, default_deadline_seconds
+from backend.documents import extract_text_from_uploaded_files, create_docx
+from backend.retrieval import ai_enhanced_retrieve
+from backend.library import document_hashes, parse_total_score
+from backend.dedup import deduplicate_passages, estimate_tokens
+from backend.knowledge import get_knowledge_base, lookup_knowledge
+from backend.tracing import step, traced
+from backend.diff_review import (
+    split_subclauses, number_subclauses, parse_edits, edit_clause, clause_diff, use_edits_mode,
+)
+from backend.review_panel import panel_specialists, run_specialists, find_conflicts, merge_findings, merge_locally
+
+
+def preload_dependencies():
+    """
+    Import the heavy modules a run needs (openai, python-docx) and load the
+    knowledge packs
+
+    Called on a background thread at server start so the first job does not
+    pay the import cost while the page stays responsive.
+    """
+    import openai  # noqa: F401
+    import docx  # noqa: F401
+    get_knowledge_base()
+
+
+def estimate_ai_calls(num_refinements, has_documents, from_library=False, review_mode="auto"):
+    """
+    Number of AI calls a run will make (used for queue priority)
+
+    Args:
+        num_refinements: Number of review rounds
+        has_documents: Whether reference documents were uploaded
+        from_library: Whether the run starts from a clause library entry
+        review_mode: Step 5 review mode ("panel" replaces the rounds with the specialist panel)
+
+    Returns:
+        int: Expected AI call count
+    """
+    reviews = review_calls(num_refinements, review_mode, has_constraints=not from_library)
+    if from_library:
+        return reviews
+    # Objective + Steps 2-4 + reviews + assessment (an upper bound: the
+    # research call is skipped when a knowledge pack covers the request)
+    return 1 + preparation_calls(has_documents) + reviews + 1
+
+
+def preparation_calls(has_documents, knowledge=None):
+    """
+    AI calls of Steps 2-4
+
+    Summary and retrieval of the documents, or the research call when no
+    knowledge pack covers the request, then constraints and the draft.
+
+    Args:
+        has_documents: Whether usable document texts were uploaded
+        knowledge: Knowledge pack lookup result (see lookup_knowledge), if any
+    """
+    if has_documents:
+        return 2 + 2
+    return (0 if knowledge else 1) + 2
+
+
+def review_calls(num_refinements, review_mode, has_constraints=True):
+    """AI calls of Step 5: one per round, or the panel's reviewers plus a possible merge call."""
+    if review_mode == "panel":
+        return len(panel_specialists(has_constraints)) + 1
+    return num_refinements
+
+
+def build_combined_preview(texts):
+    """Step 2 document preview sent for summarisation."""
+    return "\n\n".join([
+        f"--- {t['filename']} ---\n{t['text'][:1500]}"  # 1500
+        for t in texts
+    ])
+
+
+def build_evidence_block(retrieved):
+    """Step 3 evidence quoted from the retrieved documents."""
+    return "\n\n".join([
+        f"From {r['filename']}\n{r['text'][:1000]}"
+        for r in retrieved
+    ]) if retrieved else "(No relevant documents)"
+
+
+def split_drafting_notes(initial_clause):
+    """
+    Split a Step 4 draft into (clause, drafting notes)
+
+    Args:
+        initial_clause: Raw Step 4 response
+
+    Returns:
+        tuple: (clause_part, explanation_part)
+    """
+    if "Drafting Notes" in initial_clause:
+        parts = initial_clause.split("Drafting Notes")
+        clause_part = parts[0].strip()
+        explanation_part = parts[1].strip() if len(parts) > 1 else ""
+        return clause_part, explanation_part
+    return initial_clause, ""
+
+
+@traced()
+def parse_review(review):
+    """
+    Parse a Step 5 review - handles both [Revised Clause] and Revised Clause formats
+
+    Args:
+        review: Raw review response
+
+    Returns:
+        tuple: (revised_clause, changes, structured) - structured is False when
+        the response did not follow the requested format and is used as-is
+    """
+    if "Revised Clause" in review or "[Revised Clause]" in review:
+        # Try to split by Revision Notes (with or without brackets)
+        if "[Revision Notes]" in review:
+            parts = review.split("[Revision Notes]")
+        elif "Revision Notes" in review:
+            parts = review.split("Revision Notes")
+        else:
+            parts = [review, ""]
+
+        # Extract revised clause (remove format markers)
+        revised_clause = parts[0].replace("[Revised Clause]", "").replace("Revised Clause", "").strip()
+        # Remove any remaining brackets or parenthetical instructions
+        revised_clause = revised_clause.replace("(Complete revised clause text here)", "").strip()
+
+        changes = parts[1].strip() if len(parts) > 1 else ""
+        # Remove instruction text from changes
+        changes = changes.replace("(Use bullet points with dashes, NOT numbered lists like \"1.\", \"2.\" etc.)", "").strip()
+
+        return revised_clause, changes, True
+
+    # Fallback: use entire review result as the revised clause
+    return review, "", False
+
+
+def summarize_documents(call, objective, combined_preview):
+    """
+    Step 2 summary of the uploaded documents
+    """
+    return call(
+        [
+            {"role": "system", "content": ""},
+            {"role": "user", "content": f"""
+
+****: {objective}
+
+****:
+{combined_preview}
+
+
+1. 
+2. 
+3. 
+4. 
+"""}
+        ],
+        step="summary"
+    )
+
+
+def research_legal_background(call, objective, jurisdiction):
+    """
+    Step 2 legal background research (used when no documents are uploaded)
+    """
+    return call(
+        [
+            {"role": "system", "content": ""},
+            {"role": "user", "content": f"""
+
+****: {objective}
+****: {jurisdiction or ''}
+
+
+1. 
+2. 
+3. 
+4. 
+"""}
+        ],
+        step="research"
+    )
+
+
+def analyze_constraints(call, objective, jurisdiction, docs_summary, evidence_block):
+    """
+    Step 3 constraints and risk analysis
+    """
+    return call(
+        [
+            {"role": "system", "content": ""},
+            {"role": "user", "content": f"""
+
+****: {objective}
+
+****: {jurisdiction or ''}
+
+****: {docs_summary}
+
+****: {evidence_block}
+
+
+
+**A. **
+3-5
+
+**B. **
+2-3
+
+**C. **
+3-5
+
+**D. **
+
+"""}
+        ],
+        step="constraints"
+    )
+
+
+def draft_initial_clause(call, objective, constraints, firm_style):
+    """
+    Step 4 initial draft (clause plus Drafting Notes; see split_drafting_notes)
+    """
+    return call(
+        [
+            {"role": "system", "content": "You are an experienced contract lawyer. CRITICAL: Use PLAIN TEXT only - NO LaTeX (no \\frac, \\text, \\[, \\]). For math use: (A / B) format"},
+            {"role": "user", "content": f"""
+
+****: {objective}
+
+****: {constraints}
+
+****: {firm_style}
+
+****:
+1. 
+2. 
+3. 
+4. 
+
+
+
+
+
+
+Drafting Notes
+• 1: ...
+• 2: ...
+• 3: ...
+"""}
+        ],
+        step="draft"
+    )
+
+
+@traced()
+def run_full_review(call, objective, current_clause, round_number, emit):
+    """
+    Run one Step 5 review round that rewrites the whole clause
+
+    Returns:
+        str: The revised clause
+    """
+    review = call(
+        [
+            {"role": "system", "content": "You are a professional contract lawyer conducting a thorough review of legal clauses."},
+            {"role": "user", "content": f"""
+Please review and refine the following contract clause.
+
+**Drafting Objective**: {objective}
+
+**Current Clause**:
+{current_clause}
+
+**Review Requirements**:
+1. Check legal completeness and accuracy
+2. Improve language clarity and precision
+3. Ensure enforceability under relevant jurisdiction
+4. Add necessary qualifications or exceptions
+5. Optimize structure and readability
+
+**Output Format** (IMPORTANT - Follow this exact format):
+
+[Revised Clause]
+(Complete revised clause text here)
+
+[Revision Notes]
+- First improvement description (what was changed and why)
+- Second improvement description  
+- Third improvement description
+(Use bullet points with dashes, NOT numbered lists like "1.", "2." etc.)
+"""}
+        ],
+        step="review"
+    )
+
+    revised_clause, changes, structured = parse_review(review)
+    emit({
+        "type": "review", "round": round_number, "clause": revised_clause, "notes": changes,
+        "structured": structured, "mode": "full", "diff": clause_diff(current_clause, revised_clause),
+    })
+    return revised_clause
+
+
+@traced()
+def run_edits_review(call, objective, current_clause, round_number, emit):
+    """
+    Run one Step 5 review round in edits mode
+
+    The clause is sent as numbered subclauses and the model returns only
+    REPLACE / INSERT / DELETE commands, which are applied locally. A
+    response in the full-rewrite format is accepted as well.
+
+    Returns:
+        str: The revised clause
+    """
+    subclauses = split_subclauses(current_clause)
+    review = call(
+        [
+            {"role": "system", "content": "You are a professional contract lawyer conducting a thorough review of legal clauses."},
+            {"role": "user", "content": f"""
+Please review the following contract clause and return ONLY the edits needed.
+
+**Drafting Objective**: {objective}
+
+**Current Clause** (each subclause is labelled [S1], [S2], ...):
+{number_subclauses(subclauses)}
+
+**Review Requirements**:
+1. Check legal completeness and accuracy
+2. Improve language clarity and precision
+3. Ensure enforceability under relevant jurisdiction
+4. Add necessary qualifications or exceptions
+5. Optimize structure and readability
+
+**Output Format** (IMPORTANT - Follow this exact format, one command per line):
+
+[Edits]
+REPLACE S3: (complete new text of subclause 3, without the [S3] label)
+INSERT AFTER S4: (text of a new subclause)
+DELETE S5
+(Write NONE if no edits are needed. Do NOT repeat unchanged subclauses.)
+
+[Revision Notes]
+- First improvement description (what was changed and why)
+- Second improvement description
+(Use bullet points with dashes, NOT numbered lists like "1.", "2." etc.)
+"""}
+        ],
+        step="review_edits"
+    )
+
+    edits, changes = parse_edits(review)
+    if edits is None:
+        # Model ignored the edits format: fall back to the full-rewrite parser
+        revised_clause, changes, structured = parse_review(review)
+        applied = None
+    else:
+        revised_clause, applied = edit_clause(current_clause, edits)
+        structured = True
+
+    emit({
+        "type": "review", "round": round_number, "clause": revised_clause, "notes": changes,
+        "structured": structured, "mode": "edits", "edits": applied,
+        "diff": clause_diff(current_clause, revised_clause),
+    })
+    return revised_clause
+
+
+@traced()
+def run_panel_review(call, objective, jurisdiction, firm_style, constraints, current_clause,
+                     round_number, emit, announce):
+    """
+    Run the Step 5 specialist review panel (see backend/review_panel.py)
+
+    The reviewers run in parallel, so ``call`` must be thread-safe. Their
+    edits are merged locally unless two of them change the same subclause,
+    in which case one merge call applies all findings.
+
+    Returns:
+        str: The revised clause
+    """
+    subclauses = split_subclauses(current_clause)
+    announce("Specialist review panel: " + ", ".join(s["title"] for s in panel_specialists(constraints)))
+    findings = run_specialists(call, objective, jurisdiction, firm_style, constraints, subclauses)
+
+    conflicts = find_conflicts(findings)
+    if conflicts:
+        announce("Merge reviewer findings")
+        revised_clause, changes, structured = parse_review(merge_findings(call, objective, subclauses, findings))
+    else:
+        revised_clause, _ = merge_locally(current_clause, findings)
+        changes = "\n\n".join(f"**{f['reviewer']}**\n{f['notes'] or '- No issues found'}" for f in findings)
+        structured = True
+
+    emit({
+        "type": "review", "round": round_number, "clause": revised_clause, "notes": changes,
+        "structured": structured, "mode": "panel", "merged_by_model": bool(conflicts),
+        "findings": [{"reviewer": f["reviewer"], "edits": len(f["edits"]), "notes": f["notes"]} for f in findings],
+        "diff": clause_diff(current_clause, revised_clause),
+    })
+    return revised_clause
+
+
+def run_clause_pipeline(params, api_key, emit, library=None, cancel_event=None, document_store=None):
+    """
+    Run the full drafting pipeline for one clause
+
+    Args:
+        params: dict with objective, jurisdiction, firm_style, num_refinements
+            and documents (list of {"name", "data"})
+        api_key: OpenAI API key
+        emit: Callback receiving one event dict per displayable result
+        library: ClauseLibrary to save the finished clause to (optional)
+        cancel_event: threading.Event that cancels the run when set
+        document_store: DocumentStore holding the documents; params["documents"]
+            are then its references instead of {"name", "data"} uploads
+
+    params may also carry ``start_from`` ({"id", "clause"}, a clause library
+    entry). The run then skips Steps 1-4 and the quality assessment and only
+    runs the requested review rounds on that clause; the result is not
+    saved to the library again.
+
+    ``review_mode`` ("auto", "full" or "edits") selects how Step 5 rounds
+    are run; see backend/diff_review.py. "auto" (default) switches to edits
+    only once the clause is long. "panel" replaces the rounds with one
+    specialist review panel (see backend/review_panel.py).
+
+    ``deadline_seconds`` (default RUN_DEADLINE_SECONDS) bounds the run; see
+    backend/budget.py. Review rounds and the assessment are skipped when
+    time runs low; RunCancelled / DeadlineExceeded are raised when the run
+    is cancelled or runs out of time before a clause has been drafted.
+
+    Returns:
+        dict: final_clause, evaluation, metadata, ai_calls
+    """
+    objective = params["objective"]
+    jurisdiction = params.get("jurisdiction", "")
+    firm_style = params["firm_style"]
+    num_refinements = params["num_refinements"]
+    uploaded_files = params.get("documents") or []
+    start_from = params.get("start_from")
+    review_mode = params.get("review_mode", "auto")
+
+    # The specialist panel is a single review stage
+    review_rounds = 1 if review_mode == "panel" else num_refinements
+
+    budget = RunBudget(params.get("deadline_seconds", default_deadline_seconds()), cancel_event)
+    calls = {"count": 0}
+    # Without documents, reference material from a knowledge pack replaces the research call
+    knowledge = None if uploaded_files or start_from is not None else lookup_knowledge(objective, jurisdiction)
+    # Calls of Steps 1-4 still ahead, the next one included; every call's
+    # timeout leaves time for the rest
+    mandatory_calls = {
+        "left": 0 if start_from is not None else 1 + preparation_calls(bool(uploaded_files), knowledge)
+    }
+    # Prompt tokens avoided by passage deduplication (Steps 2-3)
+    tokens_saved = 0
+    # Panel reviewers call from several threads at once
+    calls_lock = threading.Lock()
+
+    def call(messages, **kwargs):
+        with calls_lock:
+            calls["count"] += 1
+            mandatory_calls["left"] = max(0, mandatory_calls["left"] - 1)
+            reserved_calls = mandatory_calls["left"]
+        timeout = budget.call_timeout(reserved_calls=reserved_calls)
+        started = time.monotonic()
+        result = call_openai_chat(
+            messages, api_key, timeout=timeout, budget=budget,
+            on_truncated=lambda info: emit({"type": "truncated", **info}), **kwargs
+        )
+        budget.record_call(time.monotonic() - started)
+        return result
+
+    def announce(label):
+        emit({"type": "call", "number": calls["count"] + 1, "label": label})
+
+    # Step7Step + num_refinementsStep
+    total_steps = 7 + review_rounds if start_from is None else review_rounds + 1
+    current_step = 0
+
+    def progress(message):
+        step(message)
+        emit({"type": "progress", "current": current_step, "total": total_steps, "message": message})
+
+    if start_from is not None:
+        # Reuse a prior clause from the library: Steps 1-4 are skipped
+        emit({"type": "library_start", "id": start_from["id"], "clause": start_from["clause"]})
+        clause_part = start_from["clause"]
+        texts = []
+        constraints = ""
+    else:
+        # ====================================================================
+        # Step 1:
+        # ====================================================================
+        current_step += 1
+        progress("Analyzing your objective...")
+
+        emit({"type": "heading", "text": "## Step 1: Objective Analysis"})
+        announce("Interpret drafting objective")
+
+        interpretation = call(
+            [
+                {"role": "system", "content": ""},
+                {"role": "user", "content": f"""5
+
+****: {objective}
+
+****: {jurisdiction or 'Not specified'}
+
+****: {firm_style}
+
+
+1. 
+2. 
+3. 
+4. 
+5. 
+"""}
+            ],
+            step="objective"
+        )
+
+        emit({"type": "objective", "interpretation": interpretation})
+
+        # ====================================================================
+        # Step 2:
+        # ====================================================================
+        current_step += 1
+        progress("Processing documents...")
+
+        emit({"type": "heading", "text": "## Step 2: Document Analysis and Legal Research"})
+
+        if document_store is not None:
+            texts, failed_files = document_store.load_texts(uploaded_files)
+        else:
+            texts, failed_files = extract_text_from_uploaded_files(uploaded_files)
+        if failed_files:
+            emit({"type": "upload_warnings", "failed_files": failed_files})
+
+        # Collapse passages repeated across (versions of) the uploaded documents
+        original_texts = texts
+        texts, dedup_report = deduplicate_passages(texts)
+        if dedup_report["removed"]:
+            emit({"type": "dedup", **dedup_report})
+
+        if uploaded_files and not texts:
+            # None of the uploads could be used
+            knowledge = lookup_knowledge(objective, jurisdiction)
+        with calls_lock:
+            mandatory_calls["left"] = preparation_calls(bool(texts), knowledge)
+
+        if texts:
+            # Uploaded Documents
+            announce("Summarize uploaded documents")
+
+            combined_preview = build_combined_preview(texts)
+            tokens_saved += (
+                estimate_tokens(build_combined_preview(original_texts)) - estimate_tokens(combined_preview)
+            )
+
+            docs_summary = summarize_documents(call, objective, combined_preview)
+
+            emit({"type": "docs_summary", "preview": combined_preview, "summary": docs_summary})
+
+            # AIRAG
+            announce("Intelligent retrieval of relevant segments")
+
+            retrieved = ai_enhanced_retrieve(texts, objective, call, top_k=3)
+
+            emit({
+                "type": "retrieved",
+                "documents": [{"filename": r["filename"], "text": r["text"][:500]} for r in retrieved]
+            })
+        elif knowledge:
+            emit({"type": "knowledge_pack", **knowledge})
+
+            docs_summary = f"(Knowledge packs: {', '.join(knowledge['packs'])})\n\n" + "\n\n".join(
+                f"From {p['pack']}\n{p['text']}" for p in knowledge["passages"]
+            )
+            retrieved = []
+        else:
+            # Uploaded DocumentsConduct legal background researchAI Call times
+            announce("Conduct legal background research")
+
+            legal_research = research_legal_background(call, objective, jurisdiction)
+
+            emit({"type": "legal_research", "research": legal_research})
+
+            docs_summary = f"(Uploaded Documents)\n\n\n{legal_research}"
+            retrieved = []
+
+        # ====================================================================
+        # Step 3:
+        # ====================================================================
+        current_step += 1
+        progress("Analyzing constraints...")
+
+        emit({"type": "heading", "text": "## Step 3: Constraints and Risk Analysis"})
+        announce("Analyze constraints and legal risks")
+
+        #
+        evidence_block = build_evidence_block(retrieved)
+        tokens_saved += estimate_tokens(
+            build_evidence_block([original_texts[r["source"]] for r in retrieved])
+        ) - estimate_tokens(evidence_block)
+
+        constraints = analyze_constraints(call, objective, jurisdiction, docs_summary, evidence_block)
+
+        emit({"type": "constraints", "constraints": constraints})
+
+        # ====================================================================
+        # Step 4: Draft Initial Clause
+        # ====================================================================
+        current_step += 1
+        progress("Drafting clause...")
+
+        emit({"type": "heading", "text": "## Step 4: Draft Initial Clause"})
+        announce("Draft initial clause version")
+
+        initial_clause = draft_initial_clause(call, objective, constraints, firm_style)
+
+        # Parse initial clause
+        clause_part, explanation_part = split_drafting_notes(initial_clause)
+        emit({"type": "initial_clause", "clause": clause_part, "notes": explanation_part})
+
+    # ====================================================================
+    # Step 5: Review and Refinement
+    # ====================================================================
+    emit({"type": "heading", "text": "## Step 5: Review and Refinement"})
+
+    current_clause = clause_part
+    skipped_reviews = 0
+
+    for i in range(review_rounds):
+        if not budget.can_afford(1):
+            # Not enough time left for another round: finish with the clause so far
+            skipped_reviews = review_rounds - i
+            break
+
+        current_step += 1
+        progress(f"Conducting review {i+1}...")
+
+        emit({"type": "heading", "text": f"### Review Round {i+1}"})
+
+        try:
+            if review_mode == "panel":
+                current_clause = run_panel_review(
+                    call, objective, jurisdiction, firm_style, constraints, current_clause, i + 1, emit, announce
+                )
+            elif use_edits_mode(current_clause, review_mode):
+                announce("Review clause (edits only)")
+                current_clause = run_edits_review(call, objective, current_clause, i + 1, emit)
+            else:
+                announce("Review and refine clause")
+                current_clause = run_full_review(call, objective, current_clause, i + 1, emit)
+        except DeadlineExceeded:
+            # Out of time mid-review: keep the clause from the previous round
+            skipped_reviews = review_rounds - i
+            break
+
+    if skipped_reviews:
+        emit({"type": "budget", "skipped": f"{skipped_reviews} review round(s)"})
+
+    # ====================================================================
+    # Step 6: Final Version
+    # ====================================================================
+    current_step += 1
+    progress("Generating final version...")
+
+    emit({"type": "heading", "text": "## Step 6: Final Version"})
+
+    # Word
+    metadata = {
+        "timestamp": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+        "objective": objective,
+        "jurisdiction": jurisdiction or "Not specified",
+        "style": firm_style,
+        "ai_calls": calls["count"]
+    }
+
+    docx_bytes = create_docx(current_clause, metadata).getvalue()
+
+    emit({"type": "final", "clause": current_clause, "docx": docx_bytes})
+
+    evaluation = ""
+    run_assessment = start_from is None
+    if run_assessment and not budget.can_afford(1):
+        emit({"type": "budget", "skipped": "the quality assessment"})
+        run_assessment = False
+
+    if run_assessment:
+        # ====================================================================
+        # Step 7: Quality Assessment
+        # ====================================================================
+        current_step += 1
+        progress("Assessing quality...")
+
+        emit({"type": "heading", "text": "## Step 7: Quality Assessment"})
+        announce("Assess clause quality")
+
+        try:
+            evaluation = call(
+                [
+                    {"role": "system", "content": "You are a senior legal expert conducting quality assessment of contract clauses."},
+                    {"role": "user", "content": f"""
+Please assess the quality of the following contract clause.
+
+**Drafting Objective**: {objective}
+
+**Final Clause**:
+{current_clause}
+
+**Assessment Requirements**:
+Please score the clause from the following 10 dimensions (10 points each, total 100 points):
+
+1. Objective Achievement - Does it fulfill the drafting objective?
+2. Legal Validity - Is it legally sound and compliant?
+3. Language Clarity - Is the wording clear and unambiguous?
+4. Logical Rigor - Is the structure logical and coherent?
+5. Enforceability - Can it be effectively enforced?
+6. Risk Control - Does it adequately address potential risks?
+7. Professionalism - Does it meet professional legal standards?
+8. Completeness - Are all necessary elements included?
+9. Applicability - Is it practical and applicable?
+10. Overall Quality - Overall assessment
+
+**Output Format** (IMPORTANT - Follow exactly):
+
+[Scoring]
+1. Objective Achievement: X/10
+2. Legal Validity: X/10
+3. Language Clarity: X/10
+4. Logical Rigor: X/10
+5. Enforceability: X/10
+6. Risk Control: X/10
+7. Professionalism: X/10
+8. Completeness: X/10
+9. Applicability: X/10
+10. Overall Quality: X/10
+Total Score: XX/100
+
+[Strengths]
+• Strength 1
+• Strength 2
+• Strength 3
+
+[Areas for Improvement]
+• Suggestion 1
+• Suggestion 2
+• Suggestion 3
+"""}
+                ],
+                step="assessment"
+            )
+        except DeadlineExceeded:
+            # Out of time mid-assessment: the clause is already final, keep it
+            emit({"type": "budget", "skipped": "the quality assessment"})
+        else:
+            emit({"type": "evaluation", "evaluation": evaluation})
+
+    # A run started from a library clause is not stored again: it skipped
+    # the assessment and would only add an unscored near-duplicate
+    if library is not None and start_from is None:
+        library.add(
+            objective,
+            jurisdiction,
+            firm_style,
+            current_clause,
+            score=parse_total_score(evaluation),
+            doc_hashes=document_hashes(uploaded_files)
+        )
+
+    emit({
+        "type": "complete",
+        "ai_calls": calls["count"],
+        "num_refinements": review_rounds - skipped_reviews,
+        "documents": len(texts),
+        "tokens_saved": tokens_saved
+    })
+
+    return {
+        "final_clause": current_clause,
+        "evaluation": evaluation,
+        "metadata": metadata,
+        "ai_calls": calls["count"]
+    }
@@ -0,0 +1,263 @@
+"""
+Provider pool: load balancing LLM calls over several endpoints and keys
+
+Configure with LLM_ENDPOINTS in backend/.env, a comma-separated list of
+``base_url|api_key`` pairs (any OpenAI-compatible server works, including
+tools/mock_llm_server.py):
+
+    LLM_ENDPOINTS=https://api.openai.com/v1|sk-team-a, https://api.openai.com/v1|sk-team-b, http://127.0.0.1:8800/v1|local
+
+Each call goes to the available endpoint with the lowest expected latency:
+an EWMA of its recent response times, scaled by the requests it already has
+in flight and by how close it is to its rate limit (read from the
+``x-ratelimit-remaining-requests`` header). An endpoint that fails
+``failure_threshold`` times in a row is taken out of rotation (circuit open)
+for ``cooldown_seconds``, then gets a single trial call (half-open) before
+it is trusted again. A 429 takes it out until the limit resets. Failed
+calls are retried on the next best endpoint.
+"""
+
+import os
+import re
+import threading
+import time
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half-open"
+
+# Errors worth retrying on another endpoint (the request itself was fine)
+RETRYABLE_ERRORS = (
+    "RateLimitError", "APITimeoutError", "APIConnectionError",
+    "InternalServerError", "AuthenticationError", "PermissionDeniedError",
+)
+
+
+# Calls aborted by the run itself (cancel / deadline): not the endpoint's fault
+ABORTED_ERRORS = ("RunCancelled", "DeadlineExceeded")
+
+
+def is_endpoint_fault(error):
+    """
+    Whether an error counts against the endpoint's health
+
+    Retryable errors and 5xx responses do; client errors about the request
+    itself (400 oversized prompt, 404 unknown model, 422, ...) would fail on
+    any endpoint and do not.
+    """
+    if type(error).__name__ in RETRYABLE_ERRORS:
+        return True
+    status = getattr(error, "status_code", None)
+    return isinstance(status, int) and status >= 500
+
+
+class NoEndpointAvailable(Exception):
+    """Raised when every endpoint in the pool is out of rotation."""
+
+
+def parse_reset(value):
+    """
+    Parse an OpenAI rate-limit reset header ("1s", "6m0s", "120ms") to seconds
+    """
+    if not value:
+        return None
+    seconds = 0.0
+    for amount, unit in re.findall(r"([\d.]+)(ms|s|m|h)", value):
+        seconds += float(amount) * {"ms": 0.001, "s": 1, "m": 60, "h": 3600}[unit]
+    return seconds
+
+
+class Endpoint:
+    """
+    One OpenAI-compatible endpoint + key, with its health and latency state
+    """
+
+    def __init__(self, base_url, api_key, name=None):
+        self.base_url = base_url.rstrip("/")
+        self.api_key = api_key
+        self.name = name or f"{re.sub(r'^https?://', '', self.base_url)} …{api_key[-4:]}"
+        self.state = CLOSED
+        self.ewma_latency = None
+        self.in_flight = 0
+        self.consecutive_failures = 0
+        self.opened_until = 0.0
+        self.remaining_requests = None
+        self.requests = 0
+        self.failures = 0
+
+
+class ProviderPool:
+    """
+    Routes chat calls across endpoints by health, latency and remaining quota
+
+    Args:
+        endpoints: list of Endpoint
+        alpha: EWMA smoothing factor for latency
+        failure_threshold: Consecutive failures that open the circuit
+        cooldown_seconds: How long an open circuit stays open
+    """
+
+    def __init__(self, endpoints, alpha=0.3, failure_threshold=3, cooldown_seconds=30.0):
+        self.endpoints = endpoints
+        self.alpha = alpha
+        self.failure_threshold = failure_threshold
+        self.cooldown_seconds = cooldown_seconds
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_env(cls):
+        """
+        Build the pool from LLM_ENDPOINTS
+
+        Returns:
+            ProviderPool or None when LLM_ENDPOINTS is not set
+        """
+        spec = os.getenv("LLM_ENDPOINTS", "").strip()
+        if not spec:
+            return None
+        endpoints = []
+        for entry in spec.split(","):
+            if not entry.strip():
+                continue
+            base_url, _, api_key = entry.strip().partition("|")
+            endpoints.append(Endpoint(base_url.strip(), api_key.strip() or "none"))
+        return cls(endpoints) if endpoints else None
+
+    def serves(self, api_key):
+        """
+        Whether calls made with this key should go through the pool
+
+        The server key (OPENAI_API_KEY) and the pool's own keys are balanced;
+        keys typed in by users are theirs alone and go direct.
+        """
+        return api_key == os.getenv("OPENAI_API_KEY") or any(e.api_key == api_key for e in self.endpoints)
+
+    def _score(self, endpoint):
+        # Unknown latency is treated as fast so new endpoints get traffic
+        score = (endpoint.ewma_latency or 0.0) + 0.001
+        score *= 1 + endpoint.in_flight
+        if endpoint.remaining_requests is not None:
+            score *= 1 + 5 / (endpoint.remaining_requests + 1)
+        return score
+
+    def acquire(self, exclude=()):
+        """
+        Pick the best available endpoint and count the call as in flight
+
+        Raises:
+            NoEndpointAvailable: Every endpoint has an open circuit
+        """
+        with self._lock:
+            now = time.monotonic()
+            candidates = []
+            for endpoint in self.endpoints:
+                if endpoint in exclude:
+                    continue
+                if endpoint.state == OPEN and now >= endpoint.opened_until:
+                    endpoint.state = HALF_OPEN
+                    endpoint.remaining_requests = None
+                if endpoint.state == OPEN:
+                    continue
+                if endpoint.state == HALF_OPEN and endpoint.in_flight:
+                    continue  # Only one trial call at a time
+                candidates.append(endpoint)
+            if not candidates:
+                raise NoEndpointAvailable("All LLM endpoints are temporarily unavailable. Please try again shortly.")
+            endpoint = min(candidates, key=self._score)
+            endpoint.in_flight += 1
+            endpoint.requests += 1
+            return endpoint
+
+    def record_success(self, endpoint, latency, headers=None):
+        with self._lock:
+            endpoint.in_flight -= 1
+            if endpoint.ewma_latency is None:
+                endpoint.ewma_latency = latency
+            else:
+                endpoint.ewma_latency = self.alpha * latency + (1 - self.alpha) * endpoint.ewma_latency
+            endpoint.consecutive_failures = 0
+            endpoint.state = CLOSED
+            remaining = (headers or {}).get("x-ratelimit-remaining-requests")
+            if remaining is not None and remaining.isdigit():
+                endpoint.remaining_requests = int(remaining)
+
+    def release(self, endpoint):
+        """End an aborted call without counting it for or against the endpoint."""
+        with self._lock:
+            endpoint.in_flight -= 1
+
+    def record_failure(self, endpoint, error_type, retry_after=None):
+        with self._lock:
+            endpoint.in_flight -= 1
+            endpoint.failures += 1
+            endpoint.consecutive_failures += 1
+            now = time.monotonic()
+            if error_type in ("AuthenticationError", "PermissionDeniedError"):
+                # Bad key: no point retrying it soon
+                endpoint.state = OPEN
+                endpoint.opened_until = now + self.cooldown_seconds * 10
+            elif error_type == "RateLimitError":
+                # Out of quota: skip until the limit resets
+                endpoint.state = OPEN
+                endpoint.remaining_requests = 0
+                endpoint.opened_until = now + (retry_after or self.cooldown_seconds)
+            elif endpoint.state == HALF_OPEN or endpoint.consecutive_failures >= self.failure_threshold:
+                endpoint.state = OPEN
+                endpoint.opened_until = now + self.cooldown_seconds
+
+    def call(self, send):
+        """
+        Run ``send(endpoint)`` on the best endpoint, failing over on retryable errors
+
+        Args:
+            send: Callable(endpoint) -> (result, response headers)
+
+        Returns:
+            The result of ``send``
+        """
+        tried = []
+        last_error = None
+        for _ in range(max(2, len(self.endpoints))):
+            try:
+                endpoint = self.acquire(exclude=tried if len(tried) < len(self.endpoints) else ())
+            except NoEndpointAvailable:
+                if last_error is not None:
+                    raise last_error
+                raise
+            start = time.monotonic()
+            try:
+                result, headers = send(endpoint)
+            except Exception as e:
+                error_type = type(e).__name__
+                if error_type in ABORTED_ERRORS or not is_endpoint_fault(e):
+                    self.release(endpoint)
+                    raise
+                headers = getattr(getattr(e, "response", None), "headers", None) or {}
+                retry_after = parse_reset(headers.get("x-ratelimit-reset-requests"))
+                if retry_after is None and str(headers.get("retry-after", "")).isdigit():
+                    retry_after = float(headers["retry-after"])
+                self.record_failure(endpoint, error_type, retry_after)
+                if error_type not in RETRYABLE_ERRORS:
+                    raise
+                last_error = e
+                tried.append(endpoint)
+                continue
+            self.record_success(endpoint, time.monotonic() - start, headers)
+            return result
+        raise last_error
+
+    def stats(self):
+        """Per-endpoint state for display."""
+        with self._lock:
+            return [
+                {
+                    "endpoint": e.name,
+                    "state": e.state,
+                    "latency_ms": round(e.ewma_latency * 1000) if e.ewma_latency is not None else None,
+                    "in_flight": e.in_flight,
+                    "requests": e.requests,
+                    "failures": e.failures,
+                    "remaining": e.remaining_requests,
+                }
+                for e in self.endpoints
+            ]
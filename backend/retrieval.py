@@ -0,0 +1,100 @@
+"""
+Retrieval of relevant reference documents for a clause objective
+"""
+
+from backend.budget import RunCancelled, DeadlineExceeded
+from backend.tracing import traced
+
+
+@traced()
+def ai_enhanced_retrieve(texts, query, call, top_k=3):
+    """
+    AIRAG
+    
+    
+    1. AI
+    2. 
+    3. Lab 2RAG
+    
+    Args:
+        texts: 
+        query: 
+        call: Chat function call(messages, **kwargs) -> str
+        top_k: top k
+        
+    Returns:
+        list: 
+    """
+    if not texts:
+        return []
+    
+    # token
+    doc_snippets = []
+    for i, item in enumerate(texts):
+        snippet = item['text'][:800]  # 800
+        doc_snippets.append(f"[{i}] : {item['filename']}\n: {snippet}")
+    
+    combined_docs = "\n\n".join(doc_snippets)
+    
+    # AI
+    retrieval_prompt = f"""
+
+{query}
+
+
+{combined_docs}
+
+ {top_k} 
+
+1. 
+2. 
+
+"No relevant documents"
+
+
+X: 
+"""
+    
+    try:
+        retrieval_result = call(
+            [
+                {"role": "system", "content": ""},
+                {"role": "user", "content": retrieval_prompt}
+            ],
+            temperature=0.1,
+            step="retrieval"
+        )
+        
+        # 
+        relevant_indices = []
+        for i in range(len(texts)):
+            if f"{i}" in retrieval_result or f"[{i}]" in retrieval_result:
+                relevant_indices.append(i)
+        
+        # 
+        return [texts[i] for i in relevant_indices[:top_k]]
+        
+    except (RunCancelled, DeadlineExceeded):
+        raise
+    except Exception:
+        # AI
+        return simple_retrieve(texts, query, top_k)
+
+
+@traced()
+def simple_retrieve(texts, query, top_k=3):
+    """
+    
+    
+    AI
+    """
+    q_words = set([w.lower() for w in query.split() if len(w) > 3])
+    scored = []
+    
+    for item in texts:
+        words = set([w.lower().strip('.,;:\n') for w in item['text'].split() if len(w) > 3])
+        overlap = len(q_words & words)
+        scored.append((overlap, item))
+    
+    scored.sort(reverse=True, key=lambda x: x[0])
+    return [item for score, item in scored[:top_k] if score > 0]
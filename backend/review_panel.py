@@ -0,0 +1,233 @@
+"""
+Specialist review panel for Step 5
+
+Instead of up to four generic review rounds run one after the other, the
+"panel" review mode sends the clause to specialist reviewers at the same
+time:
+
+    enforceability   under the selected jurisdiction
+    clarity          wording, structure and drafting style
+    risk             gaps, exceptions and risk allocation
+    consistency      against the Step 3 constraints (skipped without them)
+
+Each reviewer sees the clause as numbered subclauses and returns only its
+findings, as edit commands (see backend/diff_review.py) plus notes. When the
+reviewers' edits touch different subclauses they are merged locally; when
+two reviewers change or delete the same subclause, one merge call applies
+all findings to the clause. The stage therefore costs one round trip of
+parallel calls, plus one merge call only when findings conflict.
+"""
+
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from backend.budget import RunCancelled, DeadlineExceeded
+from backend.diff_review import number_subclauses, parse_edits, edit_clause
+from backend.tracing import propagate
+
+SPECIALISTS = [
+    {
+        "key": "enforceability",
+        "title": "Enforceability",
+        "focus": "Whether every obligation, remedy and limitation is enforceable under the governing jurisdiction "
+                 "({jurisdiction}): statutory limits, penalty rules, formal requirements and public policy.",
+    },
+    {
+        "key": "clarity",
+        "title": "Clarity and Style",
+        "focus": "Ambiguous wording, undefined or inconsistent terms, sentence structure, numbering and "
+                 "consistency with the {firm_style} drafting style.",
+    },
+    {
+        "key": "risk",
+        "title": "Risk and Exceptions",
+        "focus": "Missing exceptions and carve-outs, loopholes, one-sided risk allocation, caps, "
+                 "survival and the consequences of breach.",
+    },
+    {
+        "key": "consistency",
+        "title": "Consistency with Constraints",
+        "focus": "Whether the clause satisfies every requirement and risk identified in the constraints "
+                 "analysis below, and does not contradict any of them.",
+    },
+]
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def get_review_executor():
+    """
+    Process-wide thread pool for specialist reviewers (REVIEW_PANEL_THREADS, default 8)
+
+    Separate from the contract clause pool: clause workers wait on their
+    reviewers, so sharing one pool could deadlock it.
+    """
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=int(os.getenv("REVIEW_PANEL_THREADS", "8")), thread_name_prefix="review-panel"
+            )
+        return _executor
+
+
+def panel_specialists(constraints):
+    """Specialists taking part (the consistency reviewer needs Step 3 constraints)."""
+    return [s for s in SPECIALISTS if s["key"] != "consistency" or constraints]
+
+
+def review_as_specialist(call, specialist, objective, jurisdiction, firm_style, constraints, subclauses):
+    """
+    One specialist's findings
+
+    Returns:
+        tuple: (edits, notes) as returned by parse_edits; edits is [] when the
+        response did not follow the format
+    """
+    focus = specialist["focus"].format(jurisdiction=jurisdiction or "not specified", firm_style=firm_style)
+    constraints_block = f"\n**Constraints Analysis (Step 3)**:\n{constraints}\n" if specialist["key"] == "consistency" else ""
+    response = call(
+        [
+            {"role": "system", "content": f"You are a contract lawyer on a review panel. Your speciality: {specialist['title']}."},
+            {"role": "user", "content": f"""
+You are the {specialist['title']} reviewer. Review the following contract clause for your speciality ONLY and return ONLY your findings as edits.
+
+**Your Focus**: {focus}
+
+**Drafting Objective**: {objective}
+{constraints_block}
+**Current Clause** (each subclause is labelled [S1], [S2], ...):
+{number_subclauses(subclauses)}
+
+**Output Format** (IMPORTANT - Follow this exact format, one command per line):
+
+[Edits]
+REPLACE S3: (complete new text of subclause 3, without the [S3] label)
+INSERT AFTER S4: (text of a new subclause)
+DELETE S5
+(Write NONE if your speciality raises no issues. Do NOT repeat unchanged subclauses.)
+
+[Revision Notes]
+- One line per finding: the problem and how the edit fixes it
+"""}
+        ],
+        step="review_panel"
+    )
+    edits, notes = parse_edits(response)
+    return edits or [], notes
+
+
+def find_conflicts(findings):
+    """
+    Subclauses that more than one reviewer replaces or deletes in different ways
+
+    Args:
+        findings: [{"reviewer", "edits", "notes"}, ...]
+
+    Returns:
+        list: Conflicting subclause numbers
+    """
+    changes = {}
+    for finding in findings:
+        for operation, number, text in finding["edits"]:
+            if operation in ("REPLACE", "DELETE"):
+                changes.setdefault(number, set()).add((operation, text.strip()))
+    return sorted(number for number, variants in changes.items() if len(variants) > 1)
+
+
+def merge_findings(call, objective, subclauses, findings):
+    """
+    One call applying every reviewer's findings to the clause
+
+    Returns:
+        str: Raw response in the [Revised Clause] / [Revision Notes] format
+    """
+    findings_block = "\n\n".join(
+        f"**{f['reviewer']}**\n" + "\n".join(
+            f"{operation} S{number}" + (f": {text}" if text else "") for operation, number, text in f["edits"]
+        ) + (f"\n{f['notes']}" if f["notes"] else "")
+        for f in findings if f["edits"]
+    )
+    return call(
+        [
+            {"role": "system", "content": "You are a senior contract lawyer consolidating a review panel's findings."},
+            {"role": "user", "content": f"""
+Merge the reviewers' findings into the contract clause below. Where reviewers propose different changes to the same subclause, combine them into one wording that addresses every finding.
+
+**Drafting Objective**: {objective}
+
+**Current Clause** (each subclause is labelled [S1], [S2], ...):
+{number_subclauses(subclauses)}
+
+**Reviewers' Findings**:
+{findings_block}
+
+**Output Format** (IMPORTANT - Follow this exact format):
+
+[Revised Clause]
+(Complete revised clause text here, without the [S1] labels)
+
+[Revision Notes]
+- One line per change made
+(Use bullet points with dashes, NOT numbered lists like "1.", "2." etc.)
+"""}
+        ],
+        step="review_merge"
+    )
+
+
+def run_specialists(call, objective, jurisdiction, firm_style, constraints, subclauses):
+    """
+    Fan the clause out to the panel's specialists at the same time
+
+    Args:
+        call: Chat function call(messages, **kwargs) -> str (must be thread-safe)
+        objective, jurisdiction, firm_style: Run parameters
+        constraints: Step 3 constraints ("" or None skips the consistency reviewer)
+        subclauses: Clause split with split_subclauses
+
+    Returns:
+        list: [{"reviewer", "edits", "notes"}, ...] in panel order
+
+    Raises:
+        RunCancelled / DeadlineExceeded: The run stopped while reviewers were working
+    """
+    executor = get_review_executor()
+    review = propagate(review_as_specialist)
+    futures = [
+        (specialist, executor.submit(
+            review, call, specialist, objective, jurisdiction, firm_style, constraints, subclauses
+        ))
+        for specialist in panel_specialists(constraints)
+    ]
+
+    findings = []
+    aborted = None
+    for specialist, future in futures:
+        try:
+            edits, notes = future.result()
+        except (RunCancelled, DeadlineExceeded) as e:
+            aborted = aborted or e
+            continue
+        except Exception as e:
+            # One reviewer failing does not sink the panel
+            edits, notes = [], f"- Reviewer unavailable ({type(e).__name__})"
+        findings.append({"reviewer": specialist["title"], "edits": edits, "notes": notes})
+    if aborted is not None:
+        raise aborted
+    return findings
+
+
+def merge_locally(clause, findings):
+    """
+    Apply every reviewer's edits (identical edits once) to the clause
+
+    Only valid when find_conflicts reports none.
+
+    Returns:
+        tuple: (revised clause text, number of edits applied)
+    """
+    edits = list(dict.fromkeys(edit for finding in findings for edit in finding["edits"]))
+    return edit_clause(clause, edits)
@@ -0,0 +1,123 @@
+"""
+Single-flight coalescing of identical in-flight LLM calls
+
+When several sessions run the same demo case or template objective at the
+same time they send byte-identical prompts. Instead of paying for each, the
+first call for a fingerprint (model, parameters, messages, endpoint and key)
+becomes the leader and makes the request; identical calls arriving while it
+is in flight wait for it and share its response (or its error). Nothing is
+stored: once the leader finishes, the next identical call goes to the API
+again.
+
+Waiters still honour their own run's cancel button and deadline. If the
+leader's run is cancelled or runs out of time mid-call, its waiters do not
+inherit that abort; one of them repeats the call as the new leader.
+
+Enabled by default; set LLM_SINGLE_FLIGHT=0 to turn it off.
+"""
+
+import hashlib
+import json
+import os
+import threading
+
+# Leader errors that belong to the leader's run, not to the request
+ABORTED_ERRORS = ("RunCancelled", "DeadlineExceeded")
+
+
+def single_flight_enabled():
+    """Whether identical in-flight calls are coalesced (LLM_SINGLE_FLIGHT, default on; read per call)."""
+    return os.getenv("LLM_SINGLE_FLIGHT", "1") != "0"
+
+
+def fingerprint(request, base_url, api_key):
+    """
+    Key identifying identical requests
+
+    The key is part of it so sessions using different keys never share a
+    response their own key would not have produced.
+    """
+    payload = json.dumps(
+        {k: v for k, v in request.items() if k != "timeout"}, sort_keys=True, ensure_ascii=False
+    )
+    return hashlib.sha256(f"{base_url}\0{api_key}\0{payload}".encode("utf-8")).hexdigest()
+
+
+class _Flight:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+        self.waiters = 0
+
+
+class SingleFlight:
+    """
+    Registry of in-flight calls by fingerprint
+
+    Args:
+        poll_seconds: How often a waiter checks its own cancel signal / deadline
+    """
+
+    def __init__(self, poll_seconds=0.1):
+        self.poll_seconds = poll_seconds
+        self._flights = {}
+        self._stats = {"calls": 0, "coalesced": 0, "retried": 0}
+        self._lock = threading.Lock()
+
+    def do(self, key, fn, budget=None):
+        """
+        Run ``fn()`` unless an identical call is in flight; then wait for and share its outcome
+
+        Args:
+            key: Request fingerprint
+            fn: Function making the call
+            budget: backend.budget.RunBudget of the caller (waiting is aborted with it)
+
+        Returns:
+            tuple: (result, shared) - shared is True when another caller's response was used
+        """
+        while True:
+            with self._lock:
+                flight = self._flights.get(key)
+                leader = flight is None
+                if leader:
+                    flight = self._flights[key] = _Flight()
+                    self._stats["calls"] += 1
+                else:
+                    flight.waiters += 1
+
+            if leader:
+                try:
+                    flight.result = fn()
+                except BaseException as e:
+                    flight.error = e
+                    raise
+                finally:
+                    with self._lock:
+                        del self._flights[key]
+                    flight.done.set()
+                return flight.result, False
+
+            while not flight.done.wait(self.poll_seconds if budget is not None else None):
+                if budget.cancelled or budget.remaining() == 0:
+                    budget.check()
+            if flight.error is None:
+                with self._lock:
+                    self._stats["coalesced"] += 1
+                return flight.result, True
+            if type(flight.error).__name__ in ABORTED_ERRORS:
+                # The leader's run stopped, not the request: try again
+                with self._lock:
+                    self._stats["retried"] += 1
+                continue
+            raise flight.error
+
+    def stats(self):
+        """Calls made, calls answered by sharing an in-flight call, and repeats after a leader abort."""
+        with self._lock:
+            return dict(self._stats, in_flight=len(self._flights))
+
+
+# Shared by all sessions in the process
+single_flight = SingleFlight()
@@ -0,0 +1,316 @@
+"""
+Opt-in tracing spans and per-run profiling
+
+A run traced from the page ("Trace this run" under Diagnostics) records
+nested spans for every pipeline step, every model call and the helpers
+around them (document extraction, deduplication, retrieval, Word export),
+plus the page's rendering of each event. The trace is written as a Chrome
+trace file (open it in chrome://tracing or https://ui.perfetto.dev) to
+TRACE_DIR (default: a "clause-traces" folder in the temp directory), so
+time spent in Python can be told apart from time spent waiting on the
+network. With "Profile with cProfile" the run's threads are also profiled
+and the stats saved next to the trace (``python -m pstats <file>.prof``).
+
+Spans are cheap to leave in place: the current tracer lives in a context
+variable, and when no run is being traced ``span`` / ``traced`` cost one
+lookup and return without recording anything.
+
+Categories used: "step" (pipeline steps), "llm" (model calls, i.e. network
+wait), "python" (local helpers) and "render" (page rendering).
+"""
+
+import contextvars
+import cProfile
+import io
+import json
+import os
+import pstats
+import tempfile
+import threading
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+from functools import wraps
+
+# Spans kept per trace; later ones are counted but dropped
+MAX_EVENTS = 200_000
+
+_current = contextvars.ContextVar("tracer", default=None)
+
+
+def default_trace_dir():
+    """Directory traces are written to (TRACE_DIR)."""
+    return os.getenv("TRACE_DIR") or os.path.join(tempfile.gettempdir(), "clause-traces")
+
+
+class _NoSpan:
+    """Stand-in returned while nothing is traced."""
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def set(self, **args):
+        pass
+
+
+_NO_SPAN = _NoSpan()
+
+
+class _Span:
+    def __init__(self, tracer, name, category, args):
+        self.tracer = tracer
+        self.name = name
+        self.category = category
+        self.args = args
+
+    def __enter__(self):
+        self.start = time.perf_counter_ns()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is not None:
+            self.args["error"] = exc_type.__name__
+        self.tracer.record(self.name, self.category, self.start, time.perf_counter_ns(), self.args)
+        return False
+
+    def set(self, **args):
+        """Attach values known only once the span is running (e.g. response size)."""
+        self.args.update(args)
+
+
+def span(name, category="python", **args):
+    """
+    Context manager timing a block as a span of the current trace
+
+    Does nothing unless a tracer is active on this thread (see Tracer.activate).
+    """
+    tracer = _current.get()
+    if tracer is None:
+        return _NO_SPAN
+    return _Span(tracer, name, category, args)
+
+
+def traced(name=None, category="python"):
+    """Decorator recording every call of a function as a span."""
+    def decorate(func):
+        span_name = name or f"{func.__module__.rsplit('.', 1)[-1]}.{func.__name__}"
+
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            tracer = _current.get()
+            if tracer is None:
+                return func(*args, **kwargs)
+            with _Span(tracer, span_name, category, {}):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorate
+
+
+def step(name):
+    """End the calling thread's current step span (if any) and start a new one."""
+    tracer = _current.get()
+    if tracer is not None:
+        tracer.step(name)
+
+
+def propagate(func):
+    """
+    Wrap ``func`` so it runs under the caller's tracer on another thread
+
+    Context variables do not follow work handed to a thread pool.
+    """
+    tracer = _current.get()
+    if tracer is None:
+        return func
+
+    @wraps(func)
+    def wrapper(*args, **kwargs):
+        with tracer.activate(profile=tracer.profile):
+            return func(*args, **kwargs)
+    return wrapper
+
+
+class Tracer:
+    """
+    Spans (and optionally cProfile stats) of one run
+
+    Args:
+        label: Name of the run, used in the file names
+        profile: Also profile the run's threads with cProfile
+        trace_dir: Output directory (default TRACE_DIR)
+    """
+
+    def __init__(self, label="run", profile=False, trace_dir=None):
+        self.label = label
+        self.profile = profile
+        self.trace_dir = trace_dir or default_trace_dir()
+        self.origin = time.perf_counter_ns()
+        stamp = time.strftime("%Y%m%d-%H%M%S")
+        self.path = os.path.join(self.trace_dir, f"{stamp}-{label}.trace.json")
+        self.profile_path = os.path.join(self.trace_dir, f"{stamp}-{label}.prof") if profile else None
+        self.finished = False
+        self._events = []
+        self._dropped = 0
+        self._threads = {}
+        self._steps = {}  # thread id -> (name, start) of the open step span
+        self._profilers = []
+        self._lock = threading.Lock()
+
+    def span(self, name, category="python", **args):
+        """Context manager timing a block as a span of this trace."""
+        return _Span(self, name, category, args)
+
+    def record(self, name, category, start_ns, end_ns, args=None):
+        thread = threading.current_thread()
+        with self._lock:
+            if thread.ident not in self._threads:
+                self._threads[thread.ident] = thread.name
+            if len(self._events) >= MAX_EVENTS:
+                self._dropped += 1
+                return
+            self._events.append({
+                "name": name,
+                "cat": category,
+                "ph": "X",
+                "ts": (start_ns - self.origin) / 1000,
+                "dur": (end_ns - start_ns) / 1000,
+                "pid": os.getpid(),
+                "tid": thread.ident,
+                "args": args or {},
+            })
+
+    def step(self, name):
+        """End this thread's open step span and start one called ``name``."""
+        now = time.perf_counter_ns()
+        self.end_step(now)
+        self._steps[threading.get_ident()] = (name, now)
+
+    def end_step(self, now=None):
+        open_step = self._steps.pop(threading.get_ident(), None)
+        if open_step is not None:
+            self.record(open_step[0], "step", open_step[1], now or time.perf_counter_ns())
+
+    @contextmanager
+    def activate(self, profile=False):
+        """Make this the current tracer for the calling thread, optionally profiling it."""
+        token = _current.set(self)
+        profiler = None
+        if profile:
+            profiler = cProfile.Profile()
+            profiler.enable()
+        try:
+            yield self
+        finally:
+            if profiler is not None:
+                profiler.disable()
+                with self._lock:
+                    self._profilers.append(profiler)
+            self.end_step()
+            _current.reset(token)
+
+    def bind(self, target):
+        """
+        Wrap a job target so the whole run is traced
+
+        After the run (also when it fails or is cancelled) the trace is saved
+        and published as a "trace" event.
+        """
+        @wraps(target)
+        def run(emit, **kwargs):
+            try:
+                with self.activate(profile=self.profile), self.span(self.label, "run"):
+                    return target(emit, **kwargs)
+            finally:
+                self.finished = True
+                emit({"type": "trace", **self.save()})
+        return run
+
+    def save(self):
+        """
+        Write the trace (and profile) files
+
+        May be called again later to include spans recorded since (the page's
+        rendering); the files are overwritten.
+
+        Returns:
+            dict: path, profile_path and summary
+        """
+        os.makedirs(self.trace_dir, exist_ok=True)
+        with self._lock:
+            events = list(self._events)
+            threads = dict(self._threads)
+            profilers = list(self._profilers)
+            dropped = self._dropped
+        pid = os.getpid()
+        metadata = [
+            {"name": "thread_name", "ph": "M", "pid": pid, "tid": tid, "args": {"name": name}}
+            for tid, name in threads.items()
+        ]
+        with open(self.path, "w", encoding="utf-8") as f:
+            json.dump({
+                "traceEvents": metadata + events,
+                "displayTimeUnit": "ms",
+                "otherData": {"label": self.label, "dropped_events": dropped},
+            }, f)
+
+        profile_top = []
+        if profilers:
+            stats = pstats.Stats(profilers[0], stream=io.StringIO())
+            for profiler in profilers[1:]:
+                stats.add(profiler)
+            stats.dump_stats(self.profile_path)
+            profile_top = profile_summary(stats)
+
+        return {
+            "path": self.path,
+            "profile_path": self.profile_path if profilers else None,
+            "summary": summarize(events),
+            "profile_top": profile_top,
+        }
+
+
+def summarize(events, limit=15):
+    """
+    Time per category and the spans with the most total time
+
+    Args:
+        events: Chrome trace "X" events
+        limit: Number of span names to list
+
+    Returns:
+        dict: wall_ms, categories ({category: ms}), top ([{name, category, count, total_ms, max_ms}])
+    """
+    categories = defaultdict(float)
+    spans = {}
+    wall = 0.0
+    for event in events:
+        ms = event["dur"] / 1000
+        if event["cat"] == "run":
+            wall = max(wall, ms)
+            continue
+        categories[event["cat"]] += ms
+        entry = spans.setdefault(event["name"], {
+            "name": event["name"], "category": event["cat"], "count": 0, "total_ms": 0.0, "max_ms": 0.0
+        })
+        entry["count"] += 1
+        entry["total_ms"] += ms
+        entry["max_ms"] = max(entry["max_ms"], ms)
+    top = sorted(spans.values(), key=lambda s: s["total_ms"], reverse=True)[:limit]
+    return {"wall_ms": wall, "categories": dict(categories), "top": top}
+
+
+def profile_summary(stats, limit=15):
+    """Functions with the most own time in profile stats: [{function, calls, own_ms, cumulative_ms}]."""
+    rows = []
+    for (filename, line, function), (_, calls, own, cumulative, _) in stats.stats.items():
+        rows.append({
+            "function": f"{function} ({os.path.basename(filename)}:{line})",
+            "calls": calls,
+            "own_ms": own * 1000,
+            "cumulative_ms": cumulative * 1000,
+        })
+    rows.sort(key=lambda r: r["own_ms"], reverse=True)
+    return rows[:limit]
@@ -0,0 +1,71 @@
+"""
+Shared fixtures for the offline regression tests
+
+Pipeline runs use the synthetic and replay backends (backend/offline.py),
+so no API key or network access is needed:
+
+    python -m pytest -q
+"""
+
+import sys
+from pathlib import Path
+
+import pytest
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+sys.path.insert(0, str(ROOT / "tools"))
+
+import backend.llm as llm  # noqa: E402
+from backend.offline import OfflineBackend  # noqa: E402
+from backend.output_budget import OutputBudgets  # noqa: E402
+from backend.pipeline import run_clause_pipeline  # noqa: E402
+
+CLAUSE_PARAMS = {
+    "objective": "Limit liability for indirect damages to 20% of contract value",
+    "jurisdiction": "",
+    "firm_style": "Formal",
+    "num_refinements": 2,
+    "documents": [],
+}
+
+
+@pytest.fixture(autouse=True)
+def fresh_output_budgets(monkeypatch):
+    """Give each test its own adaptive output budgets instead of the process-wide ones."""
+    budgets = OutputBudgets()
+    monkeypatch.setattr(llm, "output_budgets", budgets)
+    return budgets
+
+
+@pytest.fixture
+def use_backend(monkeypatch):
+    """Route call_openai_chat through the given OfflineBackend for one test."""
+    def install(backend):
+        monkeypatch.setattr(llm, "_offline", backend)
+        monkeypatch.setattr(llm, "_offline_loaded", True)
+        monkeypatch.setenv("LLM_SINGLE_FLIGHT", "0")
+        return backend
+    return install
+
+
+@pytest.fixture
+def synthetic(use_backend):
+    """Answer every call of the test with the synthetic backend."""
+    return use_backend(OfflineBackend("synthetic"))
+
+
+@pytest.fixture
+def run_clause():
+    """
+    Run one clause through the pipeline
+
+    Returns a function taking parameter overrides (merged into
+    CLAUSE_PARAMS) and run_clause_pipeline keyword arguments, which returns
+    (result, events).
+    """
+    def run(params=None, **kwargs):
+        events = []
+        result = run_clause_pipeline(dict(CLAUSE_PARAMS, **(params or {})), "offline", events.append, **kwargs)
+        return result, events
+    return run
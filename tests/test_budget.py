@@ -0,0 +1,84 @@
+"""
+Run time budgets: call timeouts, the Steps 1-4 reserve and deadlines
+"""
+
+import threading
+
+import pytest
+
+from backend.budget import DeadlineExceeded, RunBudget, RunCancelled
+from backend.offline import OfflineBackend, wait
+
+
+def test_call_timeout_reserves_time_for_later_calls():
+    budget = RunBudget(100)
+    budget.record_call(10)
+
+    assert budget.call_timeout() == 60.0
+    assert 59 < budget.call_timeout(reserved_calls=4) <= 60
+    assert 19 < budget.call_timeout(reserved_calls=8) <= 20
+    assert budget.can_afford(2, reserved_calls=7) and not budget.can_afford(3, reserved_calls=8)
+
+
+def test_check_raises_on_cancel_and_deadline():
+    cancel = threading.Event()
+    budget = RunBudget(None, cancel)
+    budget.check()
+    cancel.set()
+    with pytest.raises(RunCancelled):
+        budget.check()
+
+    budget = RunBudget(0.01)
+    wait(0.02)
+    with pytest.raises(DeadlineExceeded):
+        budget.check()
+
+
+@pytest.mark.parametrize("params, reserves", [
+    # Objective, research, constraints, draft
+    ({}, [3, 2, 1, 0]),
+    # Objective, constraints, draft: a knowledge pack replaces the research call
+    ({"objective": "Confidentiality obligations for trade secrets", "jurisdiction": "Singapore"}, [2, 1, 0]),
+    # Objective, summary, retrieval, constraints, draft
+    ({"documents": [{"name": "notes.txt", "data": b"The supplier's liability is capped at the fees paid."}]},
+     [4, 3, 2, 1, 0]),
+])
+def test_reserve_follows_the_runs_steps(synthetic, run_clause, monkeypatch, params, reserves):
+    reserved = []
+    call_timeout = RunBudget.call_timeout
+
+    def recording(self, reserved_calls=0):
+        reserved.append(reserved_calls)
+        return call_timeout(self, reserved_calls)
+
+    monkeypatch.setattr(RunBudget, "call_timeout", recording)
+    run_clause(dict(params, num_refinements=1, review_mode="full"))
+
+    # Then one review round and the assessment
+    assert reserved == reserves + [0, 0]
+
+
+class SlowAssessment(OfflineBackend):
+    """Synthetic backend whose quality assessment outlasts the run's deadline."""
+
+    def complete(self, request, send, budget=None):
+        if "Please assess the quality" in request["messages"][-1]["content"]:
+            wait(budget.remaining() + 1, budget)
+        return super().complete(request, send, budget)
+
+
+def test_deadline_during_assessment_keeps_the_clause(use_backend, run_clause):
+    use_backend(SlowAssessment("synthetic"))
+    saved = []
+
+    class Library:
+        def add(self, objective, *args, **kwargs):
+            saved.append(objective)
+
+    result, events = run_clause({"num_refinements": 1, "deadline_seconds": 1}, library=Library())
+
+    kinds = [e["type"] for e in events]
+    assert "final" in kinds and "evaluation" not in kinds
+    assert {"type": "budget", "skipped": "the quality assessment"} in events
+    assert kinds[-1] == "complete" and len(saved) == 1
+    assert result["evaluation"] == ""
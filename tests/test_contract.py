@@ -0,0 +1,100 @@
+"""
+Full-contract mode: assembly checks, shared knowledge and parallel clause drafting
+"""
+
+import threading
+import time
+
+import pytest
+
+from backend.budget import RunCancelled
+from backend.contract import check_contract, lookup_agreement_knowledge, renumber_clause, run_contract_pipeline
+from backend.offline import OfflineBackend, wait
+
+OBJECTIVES = [
+    "Payment of invoices within thirty days",
+    "Intellectual property in deliverables stays with the supplier",
+    "Termination for convenience on ninety days notice",
+]
+
+
+def run_contract(params=None, events=None, **kwargs):
+    events = [] if events is None else events
+    params = dict({"objectives": OBJECTIVES, "jurisdiction": "", "firm_style": "Formal",
+                   "num_refinements": 1, "documents": []}, **(params or {}))
+    return run_contract_pipeline(params, "offline", events.append, **kwargs), events
+
+
+def test_renumber_clause_shapes():
+    assert renumber_clause("1. Payment\n1.1 Pay in 30 days.\n1.2 See Clause 1.1.", 4) == (
+        "4. Payment\n4.1 Pay in 30 days.\n4.2 See Clause 4.1."
+    )
+    assert renumber_clause("Payment\n1. Pay in 30 days.\n2. Interest accrues.", 3) == (
+        "3. Payment\n3.1 Pay in 30 days.\n3.2 Interest accrues."
+    )
+
+
+def test_check_contract_reports_issues():
+    clauses = [
+        '1. Definitions\n1.1 "Contract Price" means the fees.',
+        '2. Payment\n2.1 The Contract Price is due as set out in Clause 7.\n2.2 "Contract Price" means the price.',
+        "3. Delay\n3.1 After the Completion Date, see Clause 2.1.",
+    ]
+    issues = {(issue["clause"], issue["kind"]) for issue in check_contract(clauses)}
+
+    assert issues == {(2, "cross_reference"), (2, "duplicate_definition"), (3, "undefined_term")}
+
+
+def test_packs_replace_research_only_when_they_cover_every_clause():
+    confidentiality = "Confidentiality of trade secrets and confidential information"
+    damages = "Liquidated damages for delay in completion"
+
+    covered = lookup_agreement_knowledge([confidentiality, damages])
+    assert covered and set(covered["packs"]) >= {"Liquidated Damages", "Confidentiality Drafting Guide"}
+    assert lookup_agreement_knowledge([confidentiality, OBJECTIVES[0]]) is None
+
+
+def test_synthetic_contract_run(synthetic):
+    result, events = run_contract()
+
+    assert len(result["clauses"]) == 3 and result["clauses"][2].startswith("3. ")
+    kinds = [e["type"] for e in events]
+    assert kinds[0] == "contract_start" and kinds[-1] == "complete"
+    assert {e["clause_index"] for e in events if e["type"] == "initial_clause"} == {0, 1, 2}
+
+
+class SlowToAbort(OfflineBackend):
+    """Synthetic backend whose calls for one objective take a while to notice a cancel."""
+
+    def __init__(self, slow_objective):
+        super().__init__("synthetic", synthetic_latency=0.05)
+        self.slow_objective = slow_objective
+        self.active = 0
+        self._lock = threading.Lock()
+
+    def complete(self, request, send, budget=None):
+        with self._lock:
+            self.active += 1
+        try:
+            prompt = request["messages"][-1]["content"]
+            if self.slow_objective in prompt and "Draft an agreement" not in prompt:
+                wait(0.5)
+            return super().complete(request, send, budget)
+        finally:
+            with self._lock:
+                self.active -= 1
+
+
+def test_cancel_stops_every_clause_before_the_run_ends(use_backend):
+    backend = use_backend(SlowToAbort(OBJECTIVES[1]))
+    cancel = threading.Event()
+    threading.Timer(0.3, cancel.set).start()
+    events = []
+
+    with pytest.raises(RunCancelled):
+        run_contract({"num_refinements": 2, "max_parallel": 2}, events, cancel_event=cancel)
+    assert backend.active == 0
+
+    emitted = len(events)
+    time.sleep(0.3)
+    assert len(events) == emitted
@@ -0,0 +1,70 @@
+"""
+Passage deduplication across uploads, and its use in the pipeline
+"""
+
+from backend.dedup import deduplicate_passages, passage_spans, split_passages
+
+CONFIDENTIALITY = (
+    "The Receiving Party shall keep all Confidential Information strictly confidential "
+    "and shall not disclose it to any third party without prior written consent."
+)
+CAP = "Each party's aggregate liability under this Agreement shall not exceed the fees paid in the preceding twelve months."
+
+
+def test_dedup_removes_repeated_docx_paragraphs():
+    # .docx text is extracted one paragraph per line, without blank lines
+    texts = [
+        {"filename": "a.docx", "text": f"NDA\n{CONFIDENTIALITY}\n{CAP}"},
+        {"filename": "b.docx", "text": f"Services\nPayment is due within thirty days of the invoice date by transfer.\n{CAP}"},
+    ]
+    result, report = deduplicate_passages(texts)
+
+    assert report["removed"] == 1
+    assert report["duplicates"][0]["files"] == ["a.docx", "b.docx"]
+    assert CAP not in result[1]["text"] and CAP in result[0]["text"]
+
+
+def test_passage_spans_locate_paragraphs_and_docx_lines():
+    text = f"  Title\r\n\r\n{CONFIDENTIALITY}  \n \n{CAP}\n"
+    assert split_passages(text) == ["Title", CONFIDENTIALITY, CAP]
+    assert [text[start:end] for start, end in passage_spans(text)] == split_passages(text)
+    assert split_passages(f"NDA\r\n {CAP}\n\n") == ["NDA", CAP]
+
+
+def test_dedup_uses_given_spans_and_returns_spans_of_the_result():
+    text = f"{CONFIDENTIALITY}\n\n{CAP}"
+    # Precomputed spans (as the document store returns them) are not recomputed
+    (only,), _ = deduplicate_passages([{"filename": "a.txt", "text": text, "passages": [(0, 3)]}])
+    assert only["passages"] == [(0, 3)]
+
+    texts = [{"filename": "a.txt", "text": CAP}, {"filename": "b.txt", "text": f"Services\n\n{CAP}\n\n{CONFIDENTIALITY}"}]
+    result, _ = deduplicate_passages(texts)
+    assert [result[1]["text"][start:end] for start, end in result[1]["passages"]] == ["Services", CONFIDENTIALITY]
+
+
+def test_dedup_catches_near_duplicates_only():
+    passage = f"{CONFIDENTIALITY} {CAP} Nothing in this clause limits liability for fraud, death or personal injury."
+    near = passage.replace("twelve", "12")
+    other = "Payment is due within thirty days of the invoice date by bank transfer to the supplier's account."
+    texts = [
+        {"filename": "a.txt", "text": f"{passage}\n\n{other}"},
+        {"filename": "b.txt", "text": f"{near}\n\nA different paragraph about governing law and the courts of Singapore."},
+    ]
+    _, report = deduplicate_passages(texts)
+
+    assert report["removed"] == 1 and report["passages"] == 4
+
+
+def test_versions_sharing_a_filename_stay_separate(synthetic, run_clause):
+    first = f"{CONFIDENTIALITY}\n\n{CAP}"
+    second = f"{first}\n\nThe cap does not apply to a breach of the confidentiality obligations above."
+    texts = [{"filename": "terms.txt", "text": first}, {"filename": "terms.txt", "text": second}]
+
+    result, report = deduplicate_passages(texts)
+    assert [t["source"] for t in result] == [0, 1] and report["removed"] == 2
+
+    documents = [{"name": t["filename"], "data": t["text"].encode("utf-8")} for t in texts]
+    _, events = run_clause({"num_refinements": 1, "documents": documents})
+    (complete,) = [e for e in events if e["type"] == "complete"]
+    # Both versions count as originals: the saving is the repeated passages
+    assert complete["tokens_saved"] >= report["tokens_removed"] > 0
@@ -0,0 +1,71 @@
+"""
+Edits-only review rounds: parsing and applying subclause edits
+"""
+
+import pytest
+
+from backend.diff_review import apply_edits, edit_clause, parse_edits, use_edits_mode
+
+
+@pytest.mark.parametrize("marker", ["[Revision Notes]", "Revision Notes:", "**[Revision Notes]**", "**Revision Notes**"])
+def test_parse_edits_stops_at_any_notes_marker(marker):
+    edits, notes = parse_edits(f"[Edits]\nREPLACE S3: 1.2 New cap.\n\n{marker}\n- Clarified the cap")
+
+    assert edits == [("REPLACE", 3, "1.2 New cap.")]
+    assert notes == "- Clarified the cap"
+
+
+def test_parse_edits_multiline_none_and_unformatted():
+    edits, _ = parse_edits("[Edits]\nINSERT AFTER S2: 1.3 First line\ncontinued\nDELETE S4\n")
+    assert edits == [("INSERT AFTER", 2, "1.3 First line\ncontinued"), ("DELETE", 4, "")]
+
+    assert parse_edits("[Edits]\nNONE\n\n[Revision Notes]\n- Fine") == ([], "- Fine")
+    assert parse_edits("[Revised Clause]\nWhole clause") == (None, "")
+
+
+def test_apply_edits_uses_original_numbering():
+    subclauses = ["1. Title", "1.1 a", "1.2 b", "1.3 c"]
+    edits = [("DELETE", 2, ""), ("REPLACE", 3, "1.2 B"), ("INSERT BEFORE", 4, "1.2A x"), ("REPLACE", 9, "ignored")]
+
+    assert apply_edits(subclauses, edits) == (["1. Title", "1.2 B", "1.2A x", "1.3 c"], 3)
+
+
+def test_edit_clause_keeps_paragraph_spacing():
+    clause = "1. Title\n\n1.1 a\n\n1.2 b\n\n1.3 c"
+
+    assert edit_clause(clause, [("REPLACE", 3, "1.2 B")]) == ("1. Title\n\n1.1 a\n\n1.2 B\n\n1.3 c", 1)
+    assert edit_clause(clause, [("DELETE", 3, "")]) == ("1. Title\n\n1.1 a\n\n1.3 c", 1)
+    assert edit_clause(clause, [("DELETE", 4, "")]) == ("1. Title\n\n1.1 a\n\n1.2 b", 1)
+    assert edit_clause(clause, [("REPLACE", 7, "x")]) == (clause, 0)
+
+
+def test_notes_words_inside_an_edit_do_not_end_the_edits():
+    response = (
+        "[Edits]\nREPLACE S2: 1.1 Fees are payable as set out in the revision notes of Schedule 2.\n"
+        "DELETE S4\n\n[Revision Notes]\n- Pointed to the schedule"
+    )
+
+    assert parse_edits(response) == (
+        [("REPLACE", 2, "1.1 Fees are payable as set out in the revision notes of Schedule 2."), ("DELETE", 4, "")],
+        "- Pointed to the schedule",
+    )
+
+
+def test_auto_mode_threshold(monkeypatch):
+    clause = "1. Title\n1.1 a"
+    assert use_edits_mode(clause, "auto", min_chars=0)
+    assert not use_edits_mode(clause, "full", min_chars=0)
+
+    monkeypatch.setenv("DIFF_REVIEW_MIN_CHARS", "5")
+    assert use_edits_mode(clause, "auto")
+    assert not use_edits_mode("1. Title", "auto", min_chars=0)
+
+
+def test_synthetic_edits_review_run(synthetic, run_clause):
+    result, events = run_clause({"review_mode": "edits"})
+
+    reviews = [e for e in events if e["type"] == "review"]
+    assert [r["mode"] for r in reviews] == ["edits", "edits"]
+    assert reviews[0]["edits"] == 1 and "Revision Notes" not in result["final_clause"]
+    assert "under this Contract" in result["final_clause"]
+    assert events[-1]["type"] == "complete"
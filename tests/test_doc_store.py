@@ -0,0 +1,50 @@
+"""
+Document store: quotas, spill-to-disk, run holds and stored passage offsets
+"""
+
+import pytest
+
+from backend.doc_store import DocumentQuotaExceeded, DocumentStore
+
+PARAGRAPHS = "Clause one applies.\r\n\r\nClause two applies.\n\n  Clause three.\n"
+
+
+def upload(name, text):
+    return {"name": name, "data": text.encode("utf-8")}
+
+
+def test_identical_uploads_are_stored_once_and_over_quota_refused(tmp_path):
+    store = DocumentStore(session_quota=2000, spill_dir=str(tmp_path))
+    (a,) = store.put_session_documents("a", [upload("terms.txt", PARAGRAPHS)])
+    (b,) = store.put_session_documents("b", [upload("copy.txt", PARAGRAPHS)])
+
+    assert a["id"] == b["id"] and store.stats()["documents"] == 1
+    with pytest.raises(DocumentQuotaExceeded):
+        store.put_session_documents("a", [upload("big.txt", "x" * 4000)])
+    assert store.session_bytes("a") == a["size"]  # The refused set did not replace the old one
+
+
+def test_spilled_documents_read_back_with_their_offsets(tmp_path):
+    store = DocumentStore(memory_quota=1, spill_dir=str(tmp_path))
+    refs = store.put_session_documents("a", [upload("terms.txt", PARAGRAPHS), upload("other.txt", "Other.")])
+
+    stats = store.stats()
+    assert stats["spilled_documents"] == 2 and stats["memory_bytes"] == 0
+    texts, failed = store.load_texts(refs)
+    assert not failed and texts[0]["text"] == PARAGRAPHS
+    assert [PARAGRAPHS[start:end] for start, end in texts[0]["passages"]] == [
+        "Clause one applies.", "Clause two applies.", "Clause three."
+    ]
+
+
+def test_runs_hold_documents_after_the_session_lets_go(tmp_path):
+    store = DocumentStore(spill_dir=str(tmp_path))
+    refs = store.put_session_documents("session", [upload("terms.txt", PARAGRAPHS)])
+    store.hold_documents("run", refs)
+
+    store.put_session_documents("session", [])
+    assert store.load_texts(refs)[0][0]["text"] == PARAGRAPHS
+    store.release_session("run")
+    texts, failed = store.load_texts(refs)
+    assert texts == [] and "expired" in failed[0]
+    assert store.stats()["documents"] == 0
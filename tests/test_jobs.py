@@ -0,0 +1,106 @@
+"""
+Job queue: admission control, run order, cancellation
+"""
+
+import threading
+import time
+
+import pytest
+
+import backend.jobs as jobs
+from backend.budget import RunCancelled
+from backend.jobs import CANCELLED, DONE, FAILED, AdmissionError, JobQueue
+
+
+def wait_finished(job_queue, job_id, timeout=5):
+    deadline = time.monotonic() + timeout
+    while not job_queue.get(job_id).finished:
+        assert time.monotonic() < deadline, "job did not finish"
+        time.sleep(0.01)
+    return job_queue.get(job_id)
+
+
+def test_admission_limits():
+    job_queue = JobQueue(max_workers=0, max_queued=2, max_per_session=1)
+    job_queue.submit(lambda emit, cancel_event: None, session_id="a")
+
+    with pytest.raises(AdmissionError, match="already being generated"):
+        job_queue.submit(lambda emit, cancel_event: None, session_id="a")
+    job_queue.submit(lambda emit, cancel_event: None, session_id="b")
+    with pytest.raises(AdmissionError, match="busy"):
+        job_queue.submit(lambda emit, cancel_event: None, session_id="c")
+
+
+def test_positions_follow_the_run_order_within_one_clock_tick(monkeypatch):
+    monkeypatch.setattr(jobs.time, "time", lambda: 1000.0)
+    job_queue = JobQueue(max_workers=0)
+    first, second, third = (job_queue.submit(lambda emit, cancel_event: None, priority=5) for _ in range(3))
+    urgent = job_queue.submit(lambda emit, cancel_event: None, priority=1)
+
+    assert [job_queue.position(j) for j in (urgent, first, second, third)] == [1, 2, 3, 4]
+    job_queue.cancel(first)
+    assert [job_queue.position(j) for j in (first, second, third)] == [0, 2, 3]
+
+
+def test_jobs_run_publish_and_finish():
+    job_queue = JobQueue(max_workers=1)
+    finished = []
+
+    def target(emit, cancel_event):
+        emit({"type": "progress"})
+        return "clause"
+
+    job = wait_finished(job_queue, job_queue.submit(target, on_finished=finished.append))
+    assert (job.status, job.result, job.events_since(0)) == (DONE, "clause", [{"type": "progress"}])
+    assert finished == [job]
+
+    def failing(emit, cancel_event):
+        raise ValueError("bad response")
+
+    job = wait_finished(job_queue, job_queue.submit(failing))
+    assert job.status == FAILED and job.error["type"] == "ValueError"
+
+
+def test_cancel_queued_and_running_jobs():
+    job_queue = JobQueue(max_workers=1)
+    started = threading.Event()
+    finished = []
+
+    def target(emit, cancel_event):
+        started.set()
+        if cancel_event.wait(5):
+            raise RunCancelled("Run cancelled")
+
+    running = job_queue.submit(target, on_finished=finished.append)
+    started.wait(5)
+    queued = job_queue.submit(target, on_finished=finished.append)
+
+    assert job_queue.cancel(queued) and job_queue.get(queued).status == CANCELLED
+    assert job_queue.cancel(running)
+    assert wait_finished(job_queue, running).status == CANCELLED
+    assert [job.id for job in finished] == [queued, running]
+    assert not job_queue.cancel(running)
+
+
+def test_trim_hands_over_bulky_payloads_once_finished():
+    job_queue = JobQueue(max_workers=1)
+    release = threading.Event()
+
+    def target(emit, cancel_event):
+        emit({"type": "docs_summary", "preview": "document text", "summary": "summary"})
+        release.wait(5)
+        emit({"type": "final", "clause": "1. Cap", "docx": b"PK"})
+
+    job_id = job_queue.submit(target)
+    assert job_queue.trim(job_id) == {}  # Still running: nothing is taken away
+
+    release.set()
+    job = wait_finished(job_queue, job_id)
+    held = job.events_since(0)
+    assert job_queue.trim(job_id) == {0: {"preview": "document text"}, 1: {"docx": b"PK"}}
+    assert job.events_since(0) == [
+        {"type": "docs_summary", "summary": "summary"},
+        {"type": "final", "clause": "1. Cap"},
+    ]
+    assert held[1]["docx"] == b"PK"  # Snapshots taken before the trim are left alone
+    assert job_queue.trim(job_id) == {}
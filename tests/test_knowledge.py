@@ -0,0 +1,53 @@
+"""
+Knowledge packs: bundle building and which requests they cover
+"""
+
+import threading
+
+import pytest
+
+from backend.knowledge import KnowledgeBase, build_bundle
+
+
+@pytest.fixture(scope="module")
+def knowledge_base(tmp_path_factory):
+    path = tmp_path_factory.mktemp("packs") / "packs.kpk"
+    assert build_bundle(output_path=path) > 0
+    return KnowledgeBase(path)
+
+
+def test_lookup_returns_passages_of_covering_packs(knowledge_base):
+    result = knowledge_base.lookup("Confidentiality obligations for trade secrets", "Singapore")
+
+    assert "Singapore - Confidentiality" in result["packs"]
+    assert 0 < len(result["passages"]) <= 4
+    assert all(p["pack"] in result["packs"] and p["text"] for p in result["passages"])
+
+
+def test_coverage_rules(knowledge_base):
+    # General material alone does not replace research for a named jurisdiction
+    assert knowledge_base.lookup("Confidentiality obligations", "England") is None
+    assert knowledge_base.lookup("Liquidated damages for late completion")["packs"] == ["Liquidated Damages"]
+    # "penalty" on its own is not a liquidated damages request
+    assert knowledge_base.lookup("Interest on late payment, with no penalty for early repayment") is None
+
+
+def test_concurrent_builds_leave_one_valid_bundle(tmp_path):
+    path = tmp_path / "packs.kpk"
+    errors = []
+
+    def build():
+        try:
+            build_bundle(output_path=path)
+        except Exception as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=build) for _ in range(8)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    assert not errors
+    assert [p.name for p in tmp_path.iterdir()] == ["packs.kpk"]
+    assert KnowledgeBase(path).lookup("Liquidated damages for late completion")
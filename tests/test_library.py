@@ -0,0 +1,37 @@
+"""
+Clause library: similarity lookup and what gets saved
+"""
+
+from backend.library import ClauseLibrary, library_enabled, parse_total_score
+
+
+def test_find_similar_ranks_close_objectives(tmp_path):
+    library = ClauseLibrary(tmp_path / "library.db")
+    cap = library.add("Limit liability for indirect damages to 20% of the contract value", "Singapore", "Formal", "1. Cap")
+    library.add("Limit liability for indirect damages to 20% of the fees", "England", "Plain", "1. Other cap", score=90)
+    library.add("Confidentiality obligations for three years after termination", "Singapore", "Formal", "1. NDA")
+
+    matches = library.find_similar("Limit liability for indirect damages to 20% of contract value", "singapore", "Formal")
+
+    assert [m["id"] for m in matches][:1] == [cap] and len(matches) == 2
+    assert library.find_similar("Governing law and jurisdiction of the courts") == []
+
+
+def test_library_switch_and_score_parsing(monkeypatch):
+    monkeypatch.delenv("CLAUSE_LIBRARY", raising=False)
+    assert library_enabled()
+    monkeypatch.setenv("CLAUSE_LIBRARY", "0")
+    assert not library_enabled()
+
+    assert parse_total_score("[Scoring]\nTotal Score: 82 / 100") == 82
+    assert parse_total_score("no score") is None
+
+
+def test_runs_from_a_library_clause_are_not_saved_again(synthetic, run_clause, tmp_path):
+    library = ClauseLibrary(tmp_path / "library.db")
+    result, _ = run_clause({"num_refinements": 1}, library=library)
+    (entry,) = library.find_similar(result["metadata"]["objective"])
+    assert entry["score"] == 80
+
+    run_clause({"num_refinements": 1, "start_from": {"id": entry["id"], "clause": entry["clause"]}}, library=library)
+    assert library.count() == 1
@@ -0,0 +1,55 @@
+"""
+Offline backends: synthetic responses, recording and replaying cassettes
+"""
+
+import pytest
+
+from backend.llm import CONTINUE_PROMPT
+from backend.offline import CassetteMiss, OfflineBackend, completion, limit_reply, synthetic_reply
+
+
+def test_synthetic_replies_stop_on_max_tokens_and_continue():
+    messages = [{"role": "system", "content": "You are an experienced contract lawyer."},
+                {"role": "user", "content": "Draft the clause"}]
+    full = synthetic_reply(messages)
+    cut, finish_reason = limit_reply(full, 10)
+    assert (cut, finish_reason) == (full[:40], "length")
+    assert limit_reply(full, None) == (full, "stop")
+
+    continuation = messages + [{"role": "assistant", "content": cut},
+                               {"role": "user", "content": CONTINUE_PROMPT}]
+    assert cut + synthetic_reply(continuation) == full
+
+
+def test_record_then_replay(use_backend, run_clause, tmp_path):
+    from mock_llm_server import MockLLMServer
+
+    cassette = tmp_path / "run.jsonl.gz"
+    server = MockLLMServer().start()
+    try:
+        use_backend(OfflineBackend("record", cassette))
+        with pytest.MonkeyPatch.context() as mp:
+            mp.setenv("OPENAI_BASE_URL", server.url)
+            recorded, _ = run_clause({"review_mode": "full"})
+    finally:
+        server.stop()
+
+    use_backend(OfflineBackend("replay", cassette))
+    replayed, _ = run_clause({"review_mode": "full"})
+    assert replayed["final_clause"] == recorded["final_clause"]
+    assert replayed["evaluation"] == recorded["evaluation"]
+
+    with pytest.raises(CassetteMiss):
+        run_clause({"objective": "An objective that was never recorded", "review_mode": "full"})
+
+
+def test_replay_serves_repeated_requests_in_order(tmp_path):
+    request = {"model": "m", "temperature": 0.2, "messages": [{"role": "user", "content": "hi"}], "max_tokens": 10}
+    recorder = OfflineBackend("record", tmp_path / "c.jsonl")
+    for content in ("first", "second"):
+        recorder.complete(request, lambda: completion(content, "stop", 1, 1))
+
+    replay = OfflineBackend("replay", tmp_path / "c.jsonl")
+    # max_tokens adapts between runs and is not part of the key
+    answers = [replay.complete(dict(request, max_tokens=99), None).choices[0].message.content for _ in range(3)]
+    assert answers == ["first", "second", "second"]
@@ -0,0 +1,57 @@
+"""
+Adaptive output budgets and continuation of cut-off responses
+"""
+
+from backend.llm import call_openai_chat
+from backend.offline import completion
+from backend.output_budget import DEFAULT_BUDGETS, OutputBudgets
+
+
+class ScriptedBackend:
+    """Offline backend answering with the given (content, finish_reason) replies in turn."""
+
+    needs_network = False
+
+    def __init__(self, *replies):
+        self.replies = list(replies)
+        self.requests = []
+
+    def complete(self, request, send, budget=None):
+        self.requests.append(dict(request, messages=list(request["messages"])))
+        content, finish_reason = self.replies.pop(0)
+        return completion(content, finish_reason, 10, len(content) // 4)
+
+
+def test_output_budgets_adapt_within_bounds():
+    budgets = OutputBudgets(window=10, min_samples=3, headroom=1.25, floor=256, ceiling=4096)
+    assert budgets.budget("draft") == DEFAULT_BUDGETS["draft"]
+
+    for tokens in (100, 120, 400):
+        budgets.record("draft", tokens)
+    assert budgets.budget("draft") == int(400 * 1.25) + 32
+
+    for tokens in (10, 10, 10):
+        budgets.record("objective", tokens)
+    assert budgets.budget("objective") == 256
+
+    budgets.record("review", 9000, truncated=True)
+    for tokens in (9000, 9000):
+        budgets.record("review", tokens)
+    stats = {s["step"]: s for s in budgets.stats()}
+    assert budgets.budget("review") == 4096 and stats["review"]["truncated"] == 1
+
+
+def test_cut_off_responses_are_continued_and_recorded(use_backend, fresh_output_budgets):
+    backend = use_backend(ScriptedBackend(("1. Liability ", "length"), ("is capped.", "stop")))
+    truncated = []
+
+    content = call_openai_chat(
+        [{"role": "user", "content": "Draft"}], "key", step="draft", on_truncated=truncated.append
+    )
+
+    assert content == "1. Liability is capped."
+    assert backend.requests[0]["max_tokens"] == DEFAULT_BUDGETS["draft"]
+    assert backend.requests[1]["messages"][1] == {"role": "assistant", "content": "1. Liability "}
+    assert truncated == [{"step": "draft", "max_tokens": DEFAULT_BUDGETS["draft"], "continuations": 1, "complete": True}]
+    (stats,) = fresh_output_budgets.stats()
+    assert (stats["step"], stats["responses"], stats["truncated"]) == ("draft", 1, 1)
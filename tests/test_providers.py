@@ -0,0 +1,90 @@
+"""
+Provider pool: failover, circuit breaking and which errors count against an endpoint
+"""
+
+from types import SimpleNamespace
+
+import pytest
+
+import backend.providers as providers
+from backend.providers import CLOSED, HALF_OPEN, OPEN, Endpoint, NoEndpointAvailable, ProviderPool, parse_reset
+
+
+class APIConnectionError(Exception):
+    pass
+
+
+class RateLimitError(Exception):
+    status_code = 429
+
+    def __init__(self, reset):
+        super().__init__("rate limited")
+        self.response = SimpleNamespace(headers={"x-ratelimit-reset-requests": reset})
+
+
+class BadRequestError(Exception):
+    status_code = 400
+
+
+def make_pool(*names, **kwargs):
+    return ProviderPool([Endpoint(f"http://{name}/v1", f"key-{name}", name=name) for name in names], **kwargs)
+
+
+def failing_on(*names, error=APIConnectionError):
+    def send(endpoint):
+        if endpoint.name in names:
+            raise error("endpoint down")
+        return endpoint.name, {"x-ratelimit-remaining-requests": "99"}
+    return send
+
+
+def test_failed_calls_fail_over_to_the_next_endpoint():
+    pool = make_pool("a", "b")
+    a, b = pool.endpoints
+    a.ewma_latency, b.ewma_latency = 0.1, 0.5  # a is preferred
+
+    assert pool.call(failing_on("a")) == "b"
+    assert (a.failures, a.state, a.in_flight) == (1, CLOSED, 0)
+    assert (b.consecutive_failures, b.remaining_requests) == (0, 99)
+
+
+def test_circuit_opens_then_admits_one_trial_call(monkeypatch):
+    clock = [1000.0]
+    monkeypatch.setattr(providers.time, "monotonic", lambda: clock[0])
+    pool = make_pool("a", "b", failure_threshold=2, cooldown_seconds=30)
+    a, b = pool.endpoints
+
+    for _ in range(2):
+        pool.record_failure(pool.acquire(exclude=[b]), "APIConnectionError")
+    assert a.state == OPEN
+    assert pool.acquire().name == "b"  # a is out of rotation
+
+    clock[0] += 31
+    trial = pool.acquire(exclude=[b])
+    assert trial is a and a.state == HALF_OPEN
+    with pytest.raises(NoEndpointAvailable):
+        pool.acquire(exclude=[b])  # Only one trial at a time
+    pool.record_success(a, 0.2)
+    assert a.state == CLOSED and a.consecutive_failures == 0
+
+
+def test_rate_limits_open_the_circuit_until_the_reset():
+    pool = make_pool("a")
+    (a,) = pool.endpoints
+
+    with pytest.raises(RateLimitError):
+        pool.call(failing_on("a", error=lambda _: RateLimitError("6m0s")))
+    assert a.state == OPEN and a.remaining_requests == 0
+    assert 359 < a.opened_until - providers.time.monotonic() <= 360
+    with pytest.raises(NoEndpointAvailable):
+        pool.acquire()
+    assert parse_reset("1m30s") == 90 and parse_reset("120ms") == pytest.approx(0.12) and parse_reset("") is None
+
+
+def test_client_errors_do_not_count_against_the_endpoint():
+    pool = make_pool("a", "b", failure_threshold=1)
+
+    with pytest.raises(BadRequestError):
+        pool.call(failing_on("a", "b", error=BadRequestError))
+    assert [(e.state, e.failures, e.in_flight) for e in pool.endpoints] == [(CLOSED, 0, 0), (CLOSED, 0, 0)]
+    assert sum(e.requests for e in pool.endpoints) == 1  # Not retried elsewhere either
@@ -0,0 +1,40 @@
+"""
+Specialist review panel: conflicts, local merging and the panel run
+"""
+
+from backend.diff_review import split_subclauses
+from backend.review_panel import find_conflicts, merge_locally, run_specialists
+
+
+def test_panel_conflicts_and_local_merge():
+    findings = [
+        {"reviewer": "A", "edits": [("REPLACE", 2, "1.1 x")], "notes": ""},
+        {"reviewer": "B", "edits": [("REPLACE", 2, "1.1 x"), ("INSERT AFTER", 3, "1.3 y")], "notes": ""},
+    ]
+    assert find_conflicts(findings) == []
+    assert merge_locally("1. T\n1.1 a\n1.2 b", findings) == ("1. T\n1.1 x\n1.2 b\n1.3 y", 2)
+
+    findings.append({"reviewer": "C", "edits": [("DELETE", 2, "")], "notes": ""})
+    assert find_conflicts(findings) == [2]
+
+
+def test_a_failing_reviewer_does_not_sink_the_panel():
+    def call(messages, **kwargs):
+        if "Ambiguous wording" in messages[-1]["content"]:
+            raise ValueError("bad response")
+        return "[Edits]\nREPLACE S2: 1.1 x\n\n[Revision Notes]\n- Tightened 1.1"
+
+    findings = run_specialists(call, "Cap liability", "England", "Formal", "", split_subclauses("1. T\n1.1 a"))
+
+    # No constraints: the consistency reviewer sits this one out
+    assert [f["reviewer"] for f in findings] == ["Enforceability", "Clarity and Style", "Risk and Exceptions"]
+    assert findings[1] == {"reviewer": "Clarity and Style", "edits": [], "notes": "- Reviewer unavailable (ValueError)"}
+    assert findings[0]["edits"] == [("REPLACE", 2, "1.1 x")]
+
+
+def test_synthetic_panel_run(synthetic, run_clause):
+    result, events = run_clause({"review_mode": "panel"})
+
+    (review,) = [e for e in events if e["type"] == "review"]
+    assert not review["merged_by_model"] and len(review["findings"]) == 4
+    assert "1.4 This clause survives termination" in result["final_clause"]
@@ -0,0 +1,103 @@
+"""
+Single-flight: identical in-flight calls share one request
+"""
+
+import threading
+import time
+
+import pytest
+
+from backend.budget import RunBudget, RunCancelled
+from backend.singleflight import SingleFlight, fingerprint, single_flight_enabled
+
+
+def call_in_thread(flight, fn, budget=None, joins=True):
+    """
+    Start ``flight.do("key", fn, budget)`` in a thread
+
+    Waits until the call is the leader (``joins=False``) or a waiter on the
+    leader's flight. Returns (thread, outcome dict with "value" or "error").
+    """
+    outcome = {}
+
+    def do():
+        try:
+            outcome["value"] = flight.do("key", fn, budget)
+        except Exception as e:
+            outcome["error"] = e
+
+    thread = threading.Thread(target=do)
+    thread.start()
+    deadline = time.monotonic() + 5
+    while not ("key" in flight._flights and (flight._flights["key"].waiters or not joins)):
+        assert time.monotonic() < deadline, "call did not start"
+        time.sleep(0.005)
+    return thread, outcome
+
+
+def blocked_until(release, result=None, error=None):
+    def fn():
+        release.wait(5)
+        if error is not None:
+            raise error
+        return result
+    return fn
+
+
+def run_leader_and_waiter(leader_fn, waiter_fn, release):
+    flight = SingleFlight(poll_seconds=0.01)
+    leader, leader_outcome = call_in_thread(flight, leader_fn, joins=False)
+    waiter, waiter_outcome = call_in_thread(flight, waiter_fn)
+    release.set()
+    leader.join(5)
+    waiter.join(5)
+    return flight, leader_outcome, waiter_outcome
+
+
+def test_identical_calls_share_the_leaders_response():
+    release = threading.Event()
+    flight, leader, waiter = run_leader_and_waiter(
+        blocked_until(release, "reply"), lambda: pytest.fail("the waiter must not call"), release
+    )
+
+    assert leader["value"] == ("reply", False) and waiter["value"] == ("reply", True)
+    assert flight.stats() == {"calls": 1, "coalesced": 1, "retried": 0, "in_flight": 0}
+
+
+def test_waiters_share_errors_but_repeat_calls_whose_leader_was_cancelled():
+    release = threading.Event()
+    error = ValueError("bad request")
+    _, leader, waiter = run_leader_and_waiter(blocked_until(release, error=error), lambda: "own", release)
+    assert leader["error"] is error and waiter["error"] is error
+
+    release = threading.Event()
+    flight, leader, waiter = run_leader_and_waiter(
+        blocked_until(release, error=RunCancelled("Run cancelled")), lambda: "own", release
+    )
+    assert isinstance(leader["error"], RunCancelled)
+    assert waiter["value"] == ("own", False) and flight.stats()["retried"] == 1
+
+
+def test_waiters_honour_their_own_cancel_button():
+    flight = SingleFlight(poll_seconds=0.01)
+    release = threading.Event()
+    leader, _ = call_in_thread(flight, blocked_until(release, "reply"), joins=False)
+    cancel_event = threading.Event()
+    waiter, outcome = call_in_thread(flight, lambda: "own", RunBudget(cancel_event=cancel_event))
+
+    cancel_event.set()
+    waiter.join(5)
+    assert isinstance(outcome["error"], RunCancelled)
+    release.set()
+    leader.join(5)
+
+
+def test_fingerprint_and_switch(monkeypatch):
+    request = {"model": "gpt-4o", "messages": [{"role": "user", "content": "Draft"}], "timeout": 30}
+    assert fingerprint(request, "url", "key") == fingerprint(dict(request, timeout=5), "url", "key")
+    assert fingerprint(request, "url", "key") != fingerprint(request, "url", "other key")
+
+    monkeypatch.delenv("LLM_SINGLE_FLIGHT", raising=False)
+    assert single_flight_enabled()
+    monkeypatch.setenv("LLM_SINGLE_FLIGHT", "0")
+    assert not single_flight_enabled()
@@ -0,0 +1,39 @@
+"""
+Tracing: spans of a traced pipeline run and the saved Chrome trace
+"""
+
+import json
+
+from backend.tracing import Tracer, span
+
+
+def test_spans_are_recorded_only_while_a_tracer_is_active(tmp_path):
+    tracer = Tracer("unit", trace_dir=str(tmp_path))
+    with span("before") as s:
+        s.set(ignored=True)
+    with tracer.activate():
+        with span("inside", answer=1):
+            pass
+    with span("after"):
+        pass
+
+    summary = tracer.save()["summary"]
+    assert [(t["name"], t["count"]) for t in summary["top"]] == [("inside", 1)]
+
+
+def test_traced_run_saves_step_llm_and_helper_spans(synthetic, run_clause, tmp_path):
+    tracer = Tracer("clause", trace_dir=str(tmp_path))
+    events = []
+
+    def target(emit, **kwargs):
+        return run_clause({"num_refinements": 1})[0]
+
+    tracer.bind(target)(events.append)
+
+    (trace_event,) = [e for e in events if e["type"] == "trace"]
+    with open(trace_event["path"], encoding="utf-8") as f:
+        trace = json.load(f)
+    spans = [e for e in trace["traceEvents"] if e["ph"] == "X"]
+    assert {"run", "step", "llm"} <= {e["cat"] for e in spans}
+    assert any(e["name"] == "llm.chat" and e["args"]["finish_reason"] for e in spans)
+    assert trace_event["summary"]["wall_ms"] > 0 and trace_event["profile_path"] is None
@@ -0,0 +1,51 @@
+"""
+Compile the knowledge packs listed in backend/knowledge/manifest.json
+
+The app rebuilds a stale bundle on startup; run this after editing the
+manifest or a source file to check the result, or to build ahead of deploy.
+
+Usage:
+    python tools/build_knowledge_packs.py
+"""
+
+import argparse
+import os
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from backend.knowledge import DEFAULT_PACK_PATH, KnowledgeBase, build_bundle  # noqa: E402
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build the knowledge pack bundle")
+    parser.add_argument("--output", default=os.getenv("KNOWLEDGE_PACK_PATH") or str(DEFAULT_PACK_PATH))
+    parser.add_argument("--query", help="Objective to look up after building")
+    parser.add_argument("--jurisdiction", default="")
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    passages = build_bundle(output_path=args.output)
+    print(f"Wrote {passages} passages to {args.output} in {(time.perf_counter() - start) * 1000:.1f} ms")
+
+    knowledge_base = KnowledgeBase(args.output)
+    for pack in knowledge_base.packs:
+        scope = ", ".join(pack["jurisdictions"]) or "general"
+        print(f"  {pack['name']} ({scope}) <- {pack['source']}")
+
+    if args.query:
+        start = time.perf_counter()
+        result = knowledge_base.lookup(args.query, args.jurisdiction)
+        elapsed = (time.perf_counter() - start) * 1000
+        if result is None:
+            print(f"Not covered ({elapsed:.2f} ms): Step 2 would call the model")
+        else:
+            print(f"Covered by {', '.join(result['packs'])} ({elapsed:.2f} ms):")
+            for passage in result["passages"]:
+                print(f"  [{passage['pack']}] {passage['heading']}")
+
+
+if __name__ == "__main__":
+    main()
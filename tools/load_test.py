@@ -0,0 +1,265 @@
+"""
+Concurrent-session load test for Home.py
+
+Drives N simulated browser sessions through the page with Streamlit's
+AppTest against a local mock LLM endpoint (tools/mock_llm_server.py) and
+reports, for each N:
+
+    - rerun latency percentiles (one script execution of Home.py)
+    - resident memory added per session
+    - throughput in finished clauses per minute
+    - error rate (sessions whose run failed, raised or timed out)
+
+The page's own polling is disabled (JOB_POLL_SECONDS=0) so every rerun is
+driven and timed by the harness, and the clause library is turned off
+(CLAUSE_LIBRARY=0) so repeated objectives are drafted every time. AppTest
+keeps process-global runtime state and cannot execute two scripts at the
+same moment, so reruns from all sessions go through one lock - much like
+script threads contending for the GIL in a real server. Rerun latency therefore includes the time a session
+waits for its turn; the job workers generating clauses run fully in
+parallel. Uploads are not simulated: AppTest cannot drive
+st.file_uploader, so every session takes the no-document path.
+
+By default every session drafts its own objective (the sample objectives
+tagged with the session number) for a jurisdiction no knowledge pack
+covers, so each run makes all of its AI calls and the figures measure
+capacity. --shared-objectives gives sessions identical objectives and
+--jurisdiction Singapore lets knowledge packs answer the research step;
+single-flight coalescing and the packs then save calls, and the report
+shows how many calls were shared.
+
+Usage:
+    python tools/load_test.py --sessions 1 4 8 16 --latency 0.2 --reviews 2
+    python tools/load_test.py --sessions 8 --rpm-limit 120 --json results.json
+    python tools/load_test.py --sessions 8 --rpm-limit 60 --endpoints 3   # provider pool
+    python tools/load_test.py --sessions 8 --shared-objectives --jurisdiction Singapore
+"""
+
+import argparse
+import json
+import os
+import sys
+import threading
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+sys.path.insert(0, str(ROOT / "tools"))
+
+from mock_llm_server import MockLLMServer  # noqa: E402
+from backend.singleflight import single_flight  # noqa: E402
+
+HOME = str(ROOT / "Home.py")
+
+# AppTest is not safe to run concurrently (see module docstring)
+_script_lock = threading.Lock()
+
+OBJECTIVES = [
+    "Limit liability for indirect, special, or consequential damages to a maximum of 20% of the total contract amount, and specify exclusions from liability.",
+    "Establish a liquidated damages provision with daily calculation, capped at a 24% annual rate, and clear payment deadlines.",
+    "Define scope, obligations, exceptions, duration (3 years post-termination), and remedies (including injunctive relief).",
+    "Combine confidentiality and liquidated damages provisions - apply damages of up to 10% of contract value for breach of confidentiality.",
+]
+
+
+def rss_bytes():
+    """Current resident set size of this process (Linux /proc, else peak RSS)."""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except OSError:
+        import resource
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+def percentile(values, pct):
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+def session_objective(level, index, args):
+    """Objective drafted by session ``index`` of the concurrency level ``level``."""
+    objective = OBJECTIVES[index % len(OBJECTIVES)]
+    if args.shared_objectives:
+        return objective
+    # A unique objective keeps single-flight from merging sessions' calls
+    return f"{objective} (load test session {level}-{index + 1})"
+
+
+def run_session(level, index, args, record):
+    """
+    Drive one session from first page load to a finished clause
+
+    Args:
+        level: Concurrency level the session belongs to
+        index: Session number (picks the objective)
+        args: Parsed CLI arguments
+        record: dict collecting latencies / outcome for this session
+    """
+    from streamlit.testing.v1 import AppTest
+
+    def timed_run(at):
+        start = time.perf_counter()
+        with _script_lock:
+            exec_start = time.perf_counter()
+            at.run()
+            end = time.perf_counter()
+        record["latencies"].append(end - start)
+        record["exec_times"].append(end - exec_start)
+        if at.exception:
+            raise RuntimeError(at.exception[0].message)
+
+    try:
+        at = AppTest.from_file(HOME, default_timeout=args.timeout)
+        at.session_state["backend_verified"] = True
+        timed_run(at)
+
+        at.text_area(key="objective_input").input(session_objective(level, index, args))
+        at.text_input(key="jurisdiction_input").input(args.jurisdiction)
+        at.slider(key="refinement_slider").set_value(args.reviews)
+        at.button(key="run_button").click()
+        timed_run(at)
+
+        deadline = time.monotonic() + args.timeout
+        while time.monotonic() < deadline:
+            if any("Generation Statistics" in m.value for m in at.markdown):
+                record["status"] = "ok"
+                break
+            if at.error:
+                record["status"] = "error"
+                record["detail"] = at.error[0].value
+                break
+            time.sleep(args.poll)
+            timed_run(at)
+        else:
+            record["status"] = "timeout"
+        record["app"] = at  # keep the session alive until memory is measured
+    except Exception as e:
+        record["status"] = "error"
+        record["detail"] = f"{type(e).__name__}: {e}"
+
+
+def run_level(n, args):
+    """Run ``n`` concurrent sessions and summarise them."""
+    records = [{"latencies": [], "exec_times": [], "status": None} for _ in range(n)]
+    rss_before = rss_bytes()
+    start = time.perf_counter()
+    threads = [
+        threading.Thread(target=run_session, args=(n, i, args, records[i]), name=f"session-{i}")
+        for i in range(n)
+    ]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    wall = time.perf_counter() - start
+    rss_after = rss_bytes()
+
+    latencies = [x for r in records for x in r["latencies"]]
+    exec_times = [x for r in records for x in r["exec_times"]]
+    ok = sum(1 for r in records if r["status"] == "ok")
+    errors = [r.get("detail") or r["status"] for r in records if r["status"] != "ok"]
+    for r in records:
+        r.pop("app", None)
+    return {
+        "sessions": n,
+        "completed": ok,
+        "error_rate": len(errors) / n,
+        "errors": errors[:5],
+        "reruns": len(latencies),
+        "rerun_p50_ms": percentile(latencies, 50) * 1000,
+        "rerun_p95_ms": percentile(latencies, 95) * 1000,
+        "rerun_p99_ms": percentile(latencies, 99) * 1000,
+        "exec_p50_ms": percentile(exec_times, 50) * 1000,
+        "wall_seconds": wall,
+        "clauses_per_minute": ok / wall * 60 if wall else 0.0,
+        "rss_per_session_mb": (rss_after - rss_before) / n / 2**20,
+        "rss_total_mb": rss_after / 2**20,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Concurrent-session load test for Home.py")
+    parser.add_argument("--sessions", type=int, nargs="+", default=[1, 2, 4, 8], help="Concurrency levels to test")
+    parser.add_argument("--reviews", type=int, default=2, help="Number of Automated Reviews per run (1-4)")
+    parser.add_argument("--workers", type=int, default=None, help="JOB_WORKERS for the job queue")
+    parser.add_argument("--latency", type=float, default=0.2, help="Mock LLM mean latency in seconds")
+    parser.add_argument("--jitter", type=float, default=0.05, help="Mock LLM latency jitter in seconds")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Fraction of mock LLM calls failing")
+    parser.add_argument("--rpm-limit", type=int, default=0, help="Mock LLM requests per minute (0 = unlimited)")
+    parser.add_argument("--endpoints", type=int, default=1, help="Mock endpoints (each with its own key/RPM limit) balanced via LLM_ENDPOINTS")
+    parser.add_argument("--jurisdiction", default="England and Wales",
+                        help="Jurisdiction of every run (Singapore lets knowledge packs skip research)")
+    parser.add_argument("--shared-objectives", action="store_true",
+                        help="Give sessions identical objectives so single-flight can merge their calls")
+    parser.add_argument("--poll", type=float, default=0.5, help="Seconds between polling reruns per session")
+    parser.add_argument("--timeout", type=float, default=300, help="Per-session timeout in seconds")
+    parser.add_argument("--json", help="Write results to this JSON file")
+    args = parser.parse_args()
+
+    servers = [
+        MockLLMServer(latency=args.latency, jitter=args.jitter, error_rate=args.error_rate, rpm_limit=args.rpm_limit).start()
+        for _ in range(args.endpoints)
+    ]
+    os.environ["OPENAI_BASE_URL"] = servers[0].url
+    os.environ["OPENAI_API_KEY"] = "sk-load-test"
+    os.environ["JOB_POLL_SECONDS"] = "0"
+    # Saved clauses would stop later sessions at the library-match prompt
+    # (and the runs would write into the real library)
+    os.environ["CLAUSE_LIBRARY"] = "0"
+    os.environ["JOB_QUEUE_LIMIT"] = str(max(args.sessions) * 2)
+    if args.workers:
+        os.environ["JOB_WORKERS"] = str(args.workers)
+    if args.endpoints > 1:
+        os.environ["LLM_ENDPOINTS"] = ",".join(f"{srv.url}|sk-load-test-{i}" for i, srv in enumerate(servers))
+
+    print(
+        f"{args.endpoints} mock LLM endpoint(s) at {', '.join(srv.url for srv in servers)} "
+        f"(latency {args.latency}s, error rate {args.error_rate}, rpm limit {args.rpm_limit or 'none'} each)"
+    )
+    mode = {
+        "objectives": "shared" if args.shared_objectives else "unique",
+        "jurisdiction": args.jurisdiction,
+        "single_flight": os.getenv("LLM_SINGLE_FLIGHT", "1") != "0",
+    }
+    print(
+        f"Mode: {mode['objectives']} objective per session, jurisdiction {mode['jurisdiction'] or 'none'}, "
+        f"single-flight {'on' if mode['single_flight'] else 'off'}"
+    )
+    header = f"{'sessions':>8} {'ok':>4} {'err%':>6} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'exec p50':>9} {'clauses/min':>12} {'MB/session':>11} {'AI calls':>9} {'shared':>7}"
+    print(header)
+    print("-" * len(header))
+
+    results = []
+    for n in args.sessions:
+        before = [dict(srv.stats) for srv in servers]
+        shared_before = single_flight.stats()["coalesced"]
+        result = run_level(n, args)
+        result["mode"] = mode
+        result["llm_requests"] = sum(srv.stats["requests"] - b["requests"] for srv, b in zip(servers, before))
+        result["llm_throttled"] = sum(srv.stats["throttled"] - b["throttled"] for srv, b in zip(servers, before))
+        result["llm_shared"] = single_flight.stats()["coalesced"] - shared_before
+        results.append(result)
+        print(
+            f"{n:>8} {result['completed']:>4} {result['error_rate'] * 100:>5.1f}% "
+            f"{result['rerun_p50_ms']:>8.1f} {result['rerun_p95_ms']:>8.1f} {result['rerun_p99_ms']:>8.1f} {result['exec_p50_ms']:>9.1f} "
+            f"{result['clauses_per_minute']:>12.1f} {result['rss_per_session_mb']:>11.2f} "
+            f"{result['llm_requests']:>9} {result['llm_shared']:>7}"
+        )
+        for detail in result["errors"]:
+            print(f"         ! {detail}")
+
+    for srv in servers:
+        srv.stop()
+
+    if args.json:
+        Path(args.json).write_text(json.dumps(results, indent=2))
+        print(f"Results written to {args.json}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,172 @@
+"""
+Local mock of the OpenAI Chat Completions endpoint
+
+Returns format-correct responses for every prompt the pipeline sends, with
+configurable latency, injected errors and a requests-per-minute limit, so
+the app can be exercised without a real API key or network access.
+Responses longer than the request's max_tokens are cut off with
+finish_reason "length", and continuation requests get the rest.
+
+Usage:
+    python tools/mock_llm_server.py --port 8800 --latency 0.5
+    OPENAI_BASE_URL=http://127.0.0.1:8800/v1 streamlit run Home.py
+"""
+
+import argparse
+import json
+import random
+import sys
+import threading
+import time
+from collections import deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+# The replies are shared with the in-process synthetic backend (LLM_BACKEND=synthetic)
+from backend.offline import limit_reply, synthetic_reply  # noqa: E402
+
+
+class MockLLMServer:
+    """
+    Threaded HTTP server answering POST /v1/chat/completions
+
+    Args:
+        host, port: Bind address (port 0 picks a free port)
+        latency: Mean seconds to wait before answering
+        jitter: Uniform +/- seconds added to ``latency``
+        error_rate: Fraction of requests answered with HTTP 500
+        rpm_limit: Requests per minute before answering HTTP 429 (0 = unlimited)
+    """
+
+    def __init__(self, host="127.0.0.1", port=0, latency=0.0, jitter=0.0, error_rate=0.0, rpm_limit=0):
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.rpm_limit = rpm_limit
+        self.stats = {"requests": 0, "errors": 0, "throttled": 0}
+        self._recent = deque()
+        self._lock = threading.Lock()
+        self._httpd = ThreadingHTTPServer((host, port), self._handler())
+        self._httpd.daemon_threads = True
+        self._thread = None
+
+    @property
+    def url(self):
+        host, port = self._httpd.server_address[:2]
+        return f"http://{host}:{port}/v1"
+
+    def start(self):
+        self._thread = threading.Thread(target=self._httpd.serve_forever, name="mock-llm", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._httpd.shutdown()
+        self._httpd.server_close()
+
+    def _admit(self):
+        """
+        Decide how to answer the next request
+
+        Returns:
+            tuple: (HTTP status 200/429/500, rate-limit headers)
+        """
+        with self._lock:
+            self.stats["requests"] += 1
+            headers = {}
+            now = time.monotonic()
+            if self.rpm_limit:
+                while self._recent and now - self._recent[0] > 60:
+                    self._recent.popleft()
+                if len(self._recent) >= self.rpm_limit:
+                    self.stats["throttled"] += 1
+                    reset = max(0.0, 60 - (now - self._recent[0]))
+                    return 429, {
+                        "x-ratelimit-remaining-requests": "0",
+                        "x-ratelimit-reset-requests": f"{reset:.3f}s",
+                        "retry-after": str(int(reset) + 1),
+                    }
+                self._recent.append(now)
+                headers["x-ratelimit-limit-requests"] = str(self.rpm_limit)
+                headers["x-ratelimit-remaining-requests"] = str(self.rpm_limit - len(self._recent))
+            if self.error_rate and random.random() < self.error_rate:
+                self.stats["errors"] += 1
+                return 500, headers
+        return 200, headers
+
+    def _handler(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, *args):
+                pass
+
+            def _send(self, status, body, headers=None):
+                data = json.dumps(body).encode("utf-8")
+                self.send_response(status)
+                for name, value in (headers or {}).items():
+                    self.send_header(name, value)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def do_POST(self):
+                length = int(self.headers.get("Content-Length") or 0)
+                request = json.loads(self.rfile.read(length) or b"{}")
+                status, headers = server._admit()
+                if status != 200:
+                    message = "Rate limit reached" if status == 429 else "Injected server error"
+                    self._send(status, {"error": {"message": message, "type": "mock_error"}}, headers)
+                    return
+
+                delay = server.latency + random.uniform(-server.jitter, server.jitter)
+                if delay > 0:
+                    time.sleep(delay)
+
+                content, finish_reason = limit_reply(
+                    synthetic_reply(request.get("messages") or []), request.get("max_tokens")
+                )
+                prompt_tokens = sum(len(m.get("content", "")) for m in request.get("messages") or []) // 4
+                self._send(200, {
+                    "id": f"chatcmpl-mock-{int(time.time() * 1000)}",
+                    "object": "chat.completion",
+                    "created": int(time.time()),
+                    "model": request.get("model", "mock"),
+                    "choices": [{
+                        "index": 0,
+                        "message": {"role": "assistant", "content": content},
+                        "finish_reason": finish_reason,
+                    }],
+                    "usage": {
+                        "prompt_tokens": prompt_tokens,
+                        "completion_tokens": len(content) // 4,
+                        "total_tokens": prompt_tokens + len(content) // 4,
+                    },
+                }, headers)
+
+        return Handler
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Mock OpenAI chat completions endpoint")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8800)
+    parser.add_argument("--latency", type=float, default=0.0, help="Mean response delay in seconds")
+    parser.add_argument("--jitter", type=float, default=0.0, help="Uniform +/- delay in seconds")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Fraction of requests failing with 500")
+    parser.add_argument("--rpm-limit", type=int, default=0, help="Requests per minute before 429 (0 = unlimited)")
+    args = parser.parse_args()
+
+    server = MockLLMServer(args.host, args.port, args.latency, args.jitter, args.error_rate, args.rpm_limit)
+    print(f"Mock LLM endpoint listening on {server.url}")
+    try:
+        server._httpd.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,350 @@
+"""
+Retrieval quality vs. speed benchmark
+
+Builds a labeled dataset from the repository's reference documents
+(confidentiality_guide.txt, liquidated_damages_reference.txt,
+singapore_law_notes.txt): every section becomes one document, and each
+benchmark query (a clause objective) is labeled with the sections that
+answer it. The corpus is then padded with synthetic distractor documents
+- boilerplate for other clause types, some of it reusing the queries'
+vocabulary - up to each requested corpus size, and every retriever is run
+on every query.
+
+Reported per retriever and corpus size:
+
+    - recall@k: share of a query's relevant sections found in the top k
+    - MRR: mean reciprocal rank of the first relevant section
+    - per-query latency (p50 / p95)
+    - index build time (retrievers that index the corpus up front)
+
+Retrievers:
+
+    simple   backend.retrieval.simple_retrieve (keyword overlap, no index)
+    bm25     local BM25 inverted index over backend.library.tokenize terms
+    ai       backend.retrieval.ai_enhanced_retrieve with a mock model standing
+             in for the LLM. The mock is an oracle - it answers with the
+             labeled sections it can see in the prompt - so its recall is an
+             upper bound for a real model; what it measures is the cost of
+             the approach (prompt size, modelled latency, context limit) and
+             the parsing of the answer. Modelled model time is added to the
+             measured local time: --llm-latency seconds per call plus prompt
+             prefill at --prefill-tps tokens per second. Prompts over
+             --context-tokens fail like a real context-length error, and the
+             retriever falls back to simple_retrieve.
+
+Usage:
+    python tools/retrieval_benchmark.py
+    python tools/retrieval_benchmark.py --sizes 100 1000 5000 --k 1 3 5 --json retrieval.json
+"""
+
+import argparse
+import json
+import math
+import random
+import re
+import sys
+import time
+from collections import Counter
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+from backend.dedup import estimate_tokens  # noqa: E402
+from backend.knowledge import section_passages  # noqa: E402
+from backend.library import tokenize  # noqa: E402
+from backend.retrieval import ai_enhanced_retrieve, simple_retrieve  # noqa: E402
+
+SOURCES = ["confidentiality_guide.txt", "liquidated_damages_reference.txt", "singapore_law_notes.txt"]
+
+# Clause objective -> relevant sections, as (source file, heading the section starts with)
+QUERIES = [
+    ("Define confidential information to cover business, technical and financial information",
+     [("confidentiality_guide.txt", "I. DEFINITION")]),
+    ("Oblige the receiving party not to disclose to third parties and to implement security measures",
+     [("confidentiality_guide.txt", "II. OBLIGATIONS")]),
+    ("List the standard exceptions for information that is publicly available or independently developed",
+     [("confidentiality_guide.txt", "III. STANDARD EXCEPTIONS")]),
+    ("Set how many years confidentiality lasts for trade secrets and technical information",
+     [("confidentiality_guide.txt", "IV. DURATION")]),
+    ("Provide injunctive relief, return of materials and indemnification for breach of confidentiality",
+     [("confidentiality_guide.txt", "V. REMEDIES"), ("singapore_law_notes.txt", "4. REMEDIES AVAILABLE"),
+      ("singapore_law_notes.txt", "3. INJUNCTIVE RELIEF")]),
+    ("Confidentiality obligation that survives termination of the agreement for a period of years",
+     [("confidentiality_guide.txt", "VI. SAMPLE CLAUSE")]),
+    ("Liquidated damages must be a genuine pre-estimate of loss and not a penalty",
+     [("liquidated_damages_reference.txt", "1. LEGAL BASIS"), ("liquidated_damages_reference.txt", "2. KEY PRINCIPLES")]),
+    ("Calculate liquidated damages as a daily rate or a percentage of contract value",
+     [("liquidated_damages_reference.txt", "3. CALCULATION METHODS")]),
+    ("Factors courts consider when deciding whether liquidated damages are enforceable",
+     [("liquidated_damages_reference.txt", "4. ENFORCEABILITY FACTORS")]),
+    ("Contractor pays liquidated damages per day of delay after the completion date, capped at a percentage of the contract price",
+     [("liquidated_damages_reference.txt", "5. SAMPLE CLAUSE")]),
+    ("State triggering events, include maximum caps and address mitigation duties for liquidated damages",
+     [("liquidated_damages_reference.txt", "6. BEST PRACTICES")]),
+    ("Legal basis for confidentiality obligations under Singapore law in contract and equity",
+     [("singapore_law_notes.txt", "1. LEGAL FRAMEWORK")]),
+    ("Make a confidentiality clause enforceable in Singapore with a reasonable duration and scope",
+     [("singapore_law_notes.txt", "2. ENFORCEABILITY REQUIREMENTS")]),
+    ("Confidentiality duties of employees that continue after employment ends",
+     [("singapore_law_notes.txt", "6. POST-EMPLOYMENT RESTRICTIONS")]),
+]
+
+# Vocabulary of the synthetic distractors
+DISTRACTOR_TOPICS = {
+    "FORCE MAJEURE": ["event beyond reasonable control", "suspension of performance", "notice of the event",
+                      "flood, fire or epidemic", "termination after prolonged delay"],
+    "GOVERNING LAW": ["laws of the chosen jurisdiction", "exclusive jurisdiction of the courts",
+                      "submission to arbitration", "seat of arbitration", "service of process"],
+    "PAYMENT TERMS": ["invoices payable within thirty days", "late payment interest", "disputed invoices",
+                      "currency of payment", "set-off against amounts due"],
+    "WARRANTIES": ["services performed with reasonable skill and care", "fitness for purpose",
+                   "remedy of defects", "warranty period", "exclusive remedy for breach of warranty"],
+    "ASSIGNMENT": ["no assignment without prior written consent", "assignment to affiliates",
+                   "change of control", "subcontracting of obligations", "successors and permitted assigns"],
+    "TERMINATION": ["termination for material breach", "termination for convenience", "insolvency events",
+                    "consequences of termination", "accrued rights and remedies"],
+    "INTELLECTUAL PROPERTY": ["ownership of background IP", "licence to use deliverables",
+                              "moral rights waiver", "third-party infringement claims", "improvements and feedback"],
+    "INSURANCE": ["public liability insurance", "professional indemnity cover", "evidence of insurance",
+                  "minimum insured amount", "notification of claims"],
+    "AUDIT": ["access to records", "audit on reasonable notice", "retention of books",
+              "cost of the audit", "correction of overcharges"],
+    "NOTICES": ["notices in writing", "delivery by hand or courier", "deemed receipt",
+                "email notices", "change of address"],
+}
+FILLER = ["the Parties", "this Agreement", "the Supplier", "the Customer", "in accordance with",
+          "subject to clause", "without prejudice to", "as soon as reasonably practicable",
+          "save as otherwise provided", "for the avoidance of doubt"]
+# Query vocabulary sprinkled into a share of the distractors so keyword matching is not trivial
+HARD_TERMS = ["confidential", "damages", "liquidated", "breach", "injunctive relief", "penalty",
+              "enforceable", "disclosure", "trade secrets", "contract price", "termination", "Singapore"]
+
+
+def labeled_documents():
+    """
+    Sections of the reference files as documents, keyed by "file#heading"
+
+    Returns:
+        list: [{"filename", "text", "heading"}, ...]
+    """
+    documents = []
+    for name in SOURCES:
+        text = (ROOT / name).read_text(encoding="utf-8", errors="ignore")
+        for passage in section_passages(text):
+            # Numbered section heading ("III. STANDARD EXCEPTIONS"), else the first line
+            lines = passage.splitlines()
+            heading = next((line for line in lines if re.match(r"^([IVX]+|\d+)\.\s+[A-Z]", line)), lines[0]).strip()
+            documents.append({"filename": f"{name}#{heading}", "text": passage, "heading": heading})
+    return documents
+
+
+def distractor_documents(count, seed=7, hard_share=0.3):
+    """Synthetic clause-boilerplate documents; ``hard_share`` of them reuse query vocabulary."""
+    rng = random.Random(seed)
+    topics = list(DISTRACTOR_TOPICS)
+    documents = []
+    for i in range(count):
+        topic = rng.choice(topics)
+        sentences = []
+        for _ in range(rng.randint(3, 7)):
+            phrase = rng.choice(DISTRACTOR_TOPICS[topic])
+            sentence = f"{rng.choice(FILLER).capitalize()}, {phrase} {rng.choice(FILLER)} {rng.choice(FILLER)}"
+            if rng.random() < hard_share:
+                sentence += f", including {rng.choice(HARD_TERMS)}"
+            sentences.append(sentence + ".")
+        documents.append({"filename": f"synthetic-{i:05d}.txt", "text": f"{i % 9 + 1}. {topic}\n" + " ".join(sentences)})
+    return documents
+
+
+def build_corpus(size, seed=7):
+    """
+    Labeled sections plus distractors up to ``size`` documents, shuffled
+
+    Returns:
+        tuple: (corpus, queries) - queries are [{"query", "relevant": set of filenames}]
+    """
+    labeled = labeled_documents()
+    queries = []
+    for query, labels in QUERIES:
+        relevant = set()
+        for source, heading in labels:
+            matches = [d["filename"] for d in labeled
+                       if d["filename"].startswith(f"{source}#") and d["heading"].startswith(heading)]
+            if not matches:
+                raise SystemExit(f"Benchmark label not found in the reference files: {source} / {heading}")
+            relevant.update(matches)
+        queries.append({"query": query, "relevant": relevant})
+    corpus = labeled + distractor_documents(max(0, size - len(labeled)), seed)
+    random.Random(seed).shuffle(corpus)
+    return corpus, queries
+
+
+class BM25Index:
+    """
+    In-memory BM25 inverted index (the scoring used by backend/knowledge.py)
+
+    Args:
+        texts: [{"filename", "text"}, ...]
+    """
+
+    def __init__(self, texts, k1=1.2, b=0.75):
+        self.texts = texts
+        self.k1 = k1
+        self.b = b
+        self.postings = {}
+        self.lengths = []
+        for i, item in enumerate(texts):
+            terms = Counter(tokenize(item["text"]))
+            self.lengths.append(sum(terms.values()))
+            for term, tf in terms.items():
+                self.postings.setdefault(term, []).append((i, tf))
+        self.average_length = sum(self.lengths) / len(self.lengths) if self.lengths else 0
+
+    def search(self, query, top_k=3):
+        scores = Counter()
+        n = len(self.texts)
+        for term in set(tokenize(query)):
+            postings = self.postings.get(term)
+            if not postings:
+                continue
+            idf = math.log(1 + (n - len(postings) + 0.5) / (len(postings) + 0.5))
+            for i, tf in postings:
+                norm = self.k1 * (1 - self.b + self.b * self.lengths[i] / (self.average_length or 1))
+                scores[i] += idf * tf * (self.k1 + 1) / (tf + norm)
+        return [self.texts[i] for i, _ in scores.most_common(top_k)]
+
+
+class OracleModel:
+    """
+    Mock of the retrieval model call used by ai_enhanced_retrieve
+
+    Answers with the "[i]" labels of the relevant documents shown in the
+    prompt and accounts modelled latency instead of sleeping.
+    """
+
+    def __init__(self, corpus, latency, prefill_tps, context_tokens):
+        self.index_of = {d["filename"]: i for i, d in enumerate(corpus)}
+        self.latency = latency
+        self.prefill_tps = prefill_tps
+        self.context_tokens = context_tokens
+        self.relevant = set()
+        self.modelled_seconds = 0.0
+        self.context_errors = 0
+
+    def __call__(self, messages, **kwargs):
+        prompt = messages[-1]["content"]
+        tokens = estimate_tokens(prompt)
+        if tokens > self.context_tokens:
+            self.context_errors += 1
+            raise ValueError(f"Prompt of {tokens} tokens exceeds the {self.context_tokens}-token context")
+        self.modelled_seconds += self.latency + tokens / self.prefill_tps
+        return "\n".join(f"[{self.index_of[name]}]: relevant" for name in sorted(self.relevant))
+
+
+def evaluate(name, retrieve, queries, ks, build_seconds=0.0, extra_seconds=None):
+    """
+    Run ``retrieve(query, top_k)`` for every query and score it
+
+    Args:
+        name: Retriever name
+        retrieve: Function (query, top_k) -> list of documents
+        queries: [{"query", "relevant"}]
+        ks: Cut-offs for recall@k
+        build_seconds: Index build time to report
+        extra_seconds: Function returning modelled seconds to add to a query's latency
+
+    Returns:
+        dict: retriever, recall ({k: value}), mrr, latency_p50_ms, latency_p95_ms, build_ms
+    """
+    top_k = max(ks)
+    recalls = {k: [] for k in ks}
+    reciprocal_ranks = []
+    latencies = []
+    for item in queries:
+        before = extra_seconds() if extra_seconds else 0.0
+        started = time.perf_counter()
+        results = retrieve(item, top_k)
+        elapsed = time.perf_counter() - started + ((extra_seconds() - before) if extra_seconds else 0.0)
+        latencies.append(elapsed)
+        names = [r["filename"] for r in results]
+        for k in ks:
+            recalls[k].append(len(item["relevant"] & set(names[:k])) / len(item["relevant"]))
+        rank = next((i for i, n in enumerate(names, start=1) if n in item["relevant"]), None)
+        reciprocal_ranks.append(1 / rank if rank else 0.0)
+    latencies.sort()
+    return {
+        "retriever": name,
+        "recall": {k: sum(v) / len(v) for k, v in recalls.items()},
+        "mrr": sum(reciprocal_ranks) / len(reciprocal_ranks),
+        "latency_p50_ms": latencies[len(latencies) // 2] * 1000,
+        "latency_p95_ms": latencies[min(len(latencies) - 1, math.ceil(0.95 * len(latencies)) - 1)] * 1000,
+        "build_ms": build_seconds * 1000,
+    }
+
+
+def benchmark(size, args):
+    """All retrievers on a corpus of ``size`` documents."""
+    corpus, queries = build_corpus(size, args.seed)
+    results = []
+
+    if "simple" in args.retrievers:
+        results.append(evaluate("simple", lambda q, k: simple_retrieve(corpus, q["query"], k), queries, args.k))
+
+    if "bm25" in args.retrievers:
+        started = time.perf_counter()
+        index = BM25Index(corpus)
+        build = time.perf_counter() - started
+        results.append(evaluate("bm25", lambda q, k: index.search(q["query"], k), queries, args.k, build))
+
+    if "ai" in args.retrievers:
+        model = OracleModel(corpus, args.llm_latency, args.prefill_tps, args.context_tokens)
+
+        def ai(item, k):
+            model.relevant = item["relevant"]
+            return ai_enhanced_retrieve(corpus, item["query"], model, top_k=k)
+
+        result = evaluate("ai (mock)", ai, queries, args.k, extra_seconds=lambda: model.modelled_seconds)
+        result["context_errors"] = model.context_errors
+        results.append(result)
+
+    return {"documents": len(corpus), "queries": len(queries), "results": results}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Retrieval quality vs. speed benchmark")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[50, 500, 5000], help="Corpus sizes (documents)")
+    parser.add_argument("--k", type=int, nargs="+", default=[1, 3, 5], help="Cut-offs for recall@k")
+    parser.add_argument("--retrievers", nargs="+", default=["simple", "bm25", "ai"], choices=["simple", "bm25", "ai"])
+    parser.add_argument("--llm-latency", type=float, default=0.8, help="Modelled seconds per retrieval model call")
+    parser.add_argument("--prefill-tps", type=float, default=10000, help="Modelled prompt tokens processed per second")
+    parser.add_argument("--context-tokens", type=int, default=128000, help="Model context window in tokens")
+    parser.add_argument("--seed", type=int, default=7, help="Seed for the synthetic distractors")
+    parser.add_argument("--json", help="Write results to this JSON file")
+    args = parser.parse_args()
+    args.k = sorted(set(args.k))
+
+    runs = []
+    for size in args.sizes:
+        run = benchmark(size, args)
+        runs.append(run)
+        print(f"\n{run['documents']} documents, {run['queries']} labeled queries")
+        header = f"  {'retriever':<11}" + "".join(f"{f'R@{k}':>7}" for k in args.k)
+        header += f"{'MRR':>7}{'p50 ms':>10}{'p95 ms':>10}{'build ms':>10}"
+        print(header)
+        print("  " + "-" * (len(header) - 2))
+        for r in run["results"]:
+            line = f"  {r['retriever']:<11}" + "".join(f"{r['recall'][k]:>7.2f}" for k in args.k)
+            line += f"{r['mrr']:>7.2f}{r['latency_p50_ms']:>10.1f}{r['latency_p95_ms']:>10.1f}{r['build_ms']:>10.1f}"
+            if r.get("context_errors"):
+                line += f"   ({r['context_errors']} prompt(s) over the context window, fell back to simple)"
+            print(line)
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(runs, f, indent=2)
+        print(f"\nResults written to {args.json}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,129 @@
+"""
+Cold-start and rerun timing for Home.py
+
+Runs the page in a fresh interpreter with Streamlit's AppTest and reports:
+
+    - import time of the heavy third-party modules (streamlit, openai, docx, dotenv)
+    - cold start: first script run, including every import Home.py triggers
+    - which heavy modules the first run actually loaded
+    - warm rerun time (no input changed)
+    - widget-change rerun time (typing in the objective box; inside the
+      sidebar form a browser does not rerun on typing at all, AppTest does)
+
+Pass --rev to time another git revision of the repo (exported with
+``git archive`` into a temporary directory), e.g. to compare before/after:
+
+    python tools/timing.py
+    python tools/timing.py --rev HEAD~1
+"""
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+HEAVY_MODULES = ["streamlit", "openai", "docx", "dotenv"]
+
+
+def time_imports():
+    """Import time of each heavy module, each in a fresh interpreter."""
+    timings = {}
+    for module in HEAVY_MODULES:
+        code = f"import time; t = time.perf_counter(); import {module}; print(time.perf_counter() - t)"
+        out = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True)
+        timings[module] = float(out.stdout.strip()) * 1000 if out.returncode == 0 else None
+    return timings
+
+
+def child(app_dir, reruns):
+    """Measure runs of ``app_dir``/Home.py in this (fresh) interpreter and print JSON."""
+    os.environ.setdefault("OPENAI_API_KEY", "sk-timing")
+    os.environ["JOB_POLL_SECONDS"] = "0"
+    sys.path.insert(0, app_dir)
+
+    start = time.perf_counter()
+    from streamlit.testing.v1 import AppTest
+    streamlit_import = time.perf_counter() - start
+
+    at = AppTest.from_file(str(Path(app_dir) / "Home.py"), default_timeout=60)
+    at.session_state["backend_verified"] = True
+    start = time.perf_counter()
+    at.run()
+    cold = time.perf_counter() - start
+    loaded = [m for m in HEAVY_MODULES if m in sys.modules]
+
+    warm = []
+    for _ in range(reruns):
+        start = time.perf_counter()
+        at.run()
+        warm.append(time.perf_counter() - start)
+
+    typed = []
+    for i in range(reruns):
+        at.text_area(key="objective_input").input(f"Limit liability for indirect damages, draft {i}")
+        start = time.perf_counter()
+        at.run()
+        typed.append(time.perf_counter() - start)
+
+    print(json.dumps({
+        "apptest_import_ms": streamlit_import * 1000,
+        "cold_start_ms": cold * 1000,
+        "loaded_on_first_run": loaded,
+        "warm_rerun_ms": statistics.median(warm) * 1000,
+        "typing_rerun_ms": statistics.median(typed) * 1000,
+        "exceptions": [e.message for e in at.exception],
+    }))
+
+
+def measure(app_dir, reruns):
+    out = subprocess.run(
+        [sys.executable, __file__, "--child", app_dir, "--reruns", str(reruns)],
+        capture_output=True, text=True
+    )
+    lines = [line for line in out.stdout.splitlines() if line.startswith("{")]
+    if out.returncode != 0 or not lines:
+        raise SystemExit(f"Timing run failed:\n{out.stderr[-2000:]}")
+    return json.loads(lines[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Cold-start and rerun timing for Home.py")
+    parser.add_argument("--rev", help="Git revision to time instead of the working tree")
+    parser.add_argument("--reruns", type=int, default=10, help="Reruns per measurement")
+    parser.add_argument("--child", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        child(args.child, args.reruns)
+        return
+
+    with tempfile.TemporaryDirectory() as tmp:
+        app_dir = str(ROOT)
+        if args.rev:
+            archive = subprocess.run(["git", "-C", str(ROOT), "archive", args.rev], capture_output=True, check=True)
+            subprocess.run(["tar", "-x", "-C", tmp], input=archive.stdout, check=True)
+            app_dir = tmp
+
+        print(f"Timing {args.rev or 'working tree'}")
+        print("\nImport time (fresh interpreter):")
+        for module, ms in time_imports().items():
+            print(f"  {module:<10} {'not installed' if ms is None else f'{ms:8.1f} ms'}")
+
+        result = measure(app_dir, args.reruns)
+        print("\nHome.py:")
+        print(f"  cold start (first run)     {result['cold_start_ms']:8.1f} ms")
+        print(f"  heavy modules loaded       {', '.join(result['loaded_on_first_run']) or 'none'}")
+        print(f"  warm rerun (median)        {result['warm_rerun_ms']:8.1f} ms")
+        print(f"  typing rerun (median)      {result['typing_rerun_ms']:8.1f} ms")
+        if result["exceptions"]:
+            print(f"  exceptions: {result['exceptions']}")
+
+
+if __name__ == "__main__":
+    main()